@@ -19,9 +19,22 @@ Core Services:
 Functions:
     - set_client_and_app(): Initialize module with Gemini client and Flask app
     - ensure_file_search_store(): Create or reuse RAG file search store
-    - upload_file_to_store(): Upload documents with deduplication
-    - initialize_knowledge_base(): Bulk upload knowledge base on startup
+    - generate_rag_answer(): Grounded answer with single-flight coalescing of
+      identical in-flight requests
+    - build_local_rag_contents(): Inject locally retrieved passages (BM25 +
+      vector, see retrieval.py) into a prompt instead of using File Search,
+      packed under a token budget (see context_packer.py)
+    - stream_rag_answer(): Stream a File Search grounded answer chunk by chunk
+    - agenerate_rag_answer() / astream_rag_answer() / agenerate_infographic_image():
+      Async variants on the client's `aio` surface for the native ASGI app
+    - knowledge_base_version(): Identifier used to key the answer cache
+    - upload_file_to_store(): Upload documents with deduplication, recorded in
+      the transactional upload manifest (see upload_manifest.py)
+    - initialize_knowledge_base(): Bulk upload knowledge base (run in the
+      background by kb_warmup.py, once per deployment)
     - classify_query_type(): Determine if query needs visual or text response
+    - start_query_classification() / collect_query_classification(): Run the
+      classifier concurrently with answer generation and join it only if ready
     - generate_infographic_image(): Create infographics using Gemini 3 Pro Image
     - decide_make_infographic(): Logic to determine if infographic is needed
     - parse_json_from_text(): Robust JSON parsing from LLM output
@@ -29,32 +42,60 @@ Functions:
 Configuration:
     The module uses environment variables and module-level constants:
     - INFOGRAPHIC_COOLDOWN_SECONDS: Rate limiting for infographic generation
+      (kept in a shared TTL store, see ttl_store.py)
+    - ANSWER_CACHE_*: Semantic answer cache tuning (see answer_cache.py)
+    - SCAN_CACHE_*: Perceptual-hash image analysis cache tuning (see scan_cache.py)
+    - PLANT_CLASSIFIER_*: Local /classify-plant pre-classifier (see plant_classifier.py)
+    - RETRIEVAL_MODE: 'file_search' (default) or 'local' retrieval for RAG
+    - STORE_STAT_INTERVAL_SECONDS: How often the cached store handle re-checks
+      .file_search_store.json for changes (default 5)
+    - CONTEXT_*: Token budget and MMR tuning for local passages (see context_packer.py)
     - UPLOAD_FOLDER: Directory for file uploads and generated content
+    - DATA_FOLDER: Private state (SQLite databases, locks), kept out of the
+      publicly served UPLOAD_FOLDER (default 'data')
 
 Author: Shashank Tamaskar
 Version: 2.0
 """
 # Standard library imports
+import asyncio
+import atexit
 import concurrent.futures
-import glob
+import contextlib
 import hashlib
-import io
 import json
 import logging
+import mmap
 import os
 import re
+import threading
 import time
-from datetime import datetime
-from io import BytesIO
-from typing import Any, Dict, List, Optional
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional
 
-# Third-party imports
-from PIL import Image
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
 
 # Google Gemini AI imports
 from google import genai
+from google.genai import errors as genai_errors
 from google.genai import types
 
+# Local application imports
+from answer_cache import AnswerCache, normalize_question
+from context_packer import CANDIDATES as CONTEXT_CANDIDATES, ContextPacker
+from gemini_client import operation_config
+import image_variants
+from infographic_cache import InfographicCache, infographic_cache_key
+from intent_matcher import INFOGRAPHIC_INTENTS, VISUAL_INTENTS, match_intents
+from plant_classifier import PlantClassifier
+from reference_images import ReferenceImageSet
+from retrieval import HybridRetriever
+from scan_cache import ScanCache
+from ttl_store import TTLStore
+from upload_manifest import LEGACY_CACHE_NAME, MANIFEST_NAME, UploadManifest
+
 # ============================================================================
 # MODULE-LEVEL CONFIGURATION
 # ============================================================================
@@ -63,12 +104,17 @@ logger = logging.getLogger(__name__)
 
 # These will be set by the Flask app on startup
 UPLOAD_FOLDER = 'uploads'
+# Private state (SQLite databases, lock files). Never inside UPLOAD_FOLDER:
+# /uploads/<path> serves that folder publicly.
+DATA_FOLDER = os.getenv('DATA_FOLDER', 'data')
 FLASK_APP = None  # Will be set to Flask app instance
 CLIENT = None  # Will be set to genai.Client instance
 
 # File search store persistence
 _STORE_INFO_PATH = '.file_search_store.json'
-_UPLOAD_CACHE_NAME = 'upload_cache.json'
+_STORE_LOCK_PATH = '.file_search_store.lock'
+# How often the cached store handle re-checks the persisted file's mtime
+STORE_STAT_INTERVAL_SECONDS = float(os.getenv('STORE_STAT_INTERVAL_SECONDS', '5'))
 
 # Language names for infographic generation
 LANGUAGE_NAMES = {
@@ -99,8 +145,53 @@ TRIGGER_WORDS = {
 # Default 24 hours; override with env INFOGRAPHIC_COOLDOWN_SECONDS
 COOLDOWN_SECONDS = int(os.getenv('INFOGRAPHIC_COOLDOWN_SECONDS', '86400'))
 
-# File to persist last-generation timestamps (simple rate-limiter)
-_INFOGRAPHIC_COOLDOWN_FILE = os.path.join(UPLOAD_FOLDER, 'infographic_cooldown.json')
+# Shared TTL store of recently generated topics (see ttl_store.py); opened
+# lazily in DATA_FOLDER. A legacy JSON map is imported once.
+_INFOGRAPHIC_COOLDOWN_DB = 'infographic_cooldown.sqlite3'
+_INFOGRAPHIC_COOLDOWN_LEGACY = 'infographic_cooldown.json'
+_COOLDOWN_STORE: Optional[TTLStore] = None
+_COOLDOWN_STORE_LOCK = threading.Lock()
+
+# Content-addressed index of generated infographics (see infographic_cache.py);
+# opened lazily in DATA_FOLDER so repeat requests reuse the saved image
+_INFOGRAPHIC_CACHE_DB = 'infographic_cache.sqlite3'
+_INFOGRAPHIC_CACHE: Optional[InfographicCache] = None
+_INFOGRAPHIC_CACHE_LOCK = threading.Lock()
+
+# Compact, hot-reloading reference photos for /classify-plant (see reference_images.py)
+REFERENCE_IMAGES = ReferenceImageSet(os.path.join('knowledge_base', 'plant_images'), client_getter=lambda: CLIENT)
+
+# Optional local pre-classifier answering obvious /classify-plant cases (see plant_classifier.py)
+PLANT_CLASSIFIER = PlantClassifier(os.path.join('knowledge_base', 'plant_images'))
+
+# Semantic cache for RAG answers (see answer_cache.py for configuration)
+ANSWER_CACHE = AnswerCache()
+
+# Perceptual-hash cache for image analysis results (see scan_cache.py)
+SCAN_CACHE = ScanCache()
+
+# Bounded pool for query classification, which runs alongside the RAG call.
+# Submissions beyond the queue limit are skipped: the answer never waits on it.
+_CLASSIFY_WORKERS = int(os.getenv('CLASSIFY_WORKERS', '4'))
+_CLASSIFY_EXECUTOR = concurrent.futures.ThreadPoolExecutor(
+    max_workers=_CLASSIFY_WORKERS, thread_name_prefix='classify'
+)
+_CLASSIFY_SLOTS = threading.BoundedSemaphore(_CLASSIFY_WORKERS * 2)
+
+# Followers of a coalesced (single-flight) RAG call give up after this long
+SINGLE_FLIGHT_TIMEOUT_SECONDS = float(os.getenv('SINGLE_FLIGHT_TIMEOUT_SECONDS', '90'))
+
+# Retrieval backend for RAG answers: 'file_search' (remote Gemini store) or
+# 'local' (in-process BM25 + vector index, passages injected into the prompt).
+# Requests can override it per call.
+RETRIEVAL_MODE = os.getenv('RETRIEVAL_MODE', 'file_search').lower()
+RETRIEVAL_MODES = ('file_search', 'local')
+LOCAL_RETRIEVAL_TOP_K = int(os.getenv('LOCAL_RETRIEVAL_TOP_K', '5'))
+_LOCAL_RETRIEVER: Optional[HybridRetriever] = None
+_LOCAL_RETRIEVER_LOCK = threading.Lock()
+
+# Token-budgeted selection of local passages (MMR + truncation, see context_packer.py)
+CONTEXT_PACKER = ContextPacker()
 
 
 
@@ -119,33 +210,24 @@ def classify_query_type(question: str) -> Dict[str, Any]:
         - confidence (float): 0.0 to 1.0
         - reason (str): Brief explanation
     """
+    # Quick keyword-based classification for obvious cases (one precompiled pass)
+    intents = match_intents(question)
+
+    # Explicit visual requests - always visual (checked first: "hi, how to ..." is a real question)
+    if intents.any(VISUAL_INTENTS):
+        keyword = next(k for i, k in intents.keywords.items() if i in VISUAL_INTENTS)
+        logger.info(f"🎨 Query classified as VISUAL (explicit request: '{keyword}')")
+        return {'format': 'visual', 'confidence': 0.95, 'reason': 'Visual content keywords detected'}
+
+    # Pleasantries and greetings - text, unless a real question follows the greeting
+    if 'pleasantry' in intents.intents and len(question.split()) <= 6:
+        logger.info("📝 Query classified as TEXT (pleasantry detected)")
+        return {'format': 'text', 'confidence': 0.95, 'reason': 'Greeting or pleasantry detected'}
+
     if CLIENT is None:
         logger.warning("⚠️ AI client not available for query classification")
         return {'format': 'text', 'confidence': 0.5, 'reason': 'AI unavailable, defaulting to text'}
-    
-    # Quick keyword-based classification for obvious cases
-    question_lower = question.lower().strip()
-    
-    # Pleasantries and greetings - always text
-    pleasantry_patterns = [
-        'hello', 'hi', 'namaste', 'namaskar', 'good morning', 'good evening',
-        'thank you', 'thanks', 'dhanyawad', 'shukriya', 'bye', 'goodbye',
-        'how are you', 'what is your name', 'who are you', 'who made you'
-    ]
-    if any(pattern in question_lower for pattern in pleasantry_patterns):
-        logger.info("📝 Query classified as TEXT (pleasantry detected)")
-        return {'format': 'text', 'confidence': 0.95, 'reason': 'Greeting or pleasantry detected'}
-    
-    # Explicit visual requests - always visual
-    visual_explicit = [
-        'show me', 'diagram', 'chart', 'infographic', 'picture', 'image', 'visual',
-        'steps', 'step by step', 'how to', 'how do i', 'schedule', 'calendar',
-        'process', 'procedure', 'symptoms', 'identify', 'comparison', 'compare'
-    ]
-    if any(pattern in question_lower for pattern in visual_explicit):
-        logger.info("🎨 Query classified as VISUAL (explicit request)")
-        return {'format': 'visual', 'confidence': 0.95, 'reason': 'Visual content keywords detected'}
-    
+
     # Use LLM for nuanced classification
     prompt = """You are a query classifier for a farmer-focused agricultural chatbot.
 Classify whether this query would benefit MORE from a VISUAL response (infographic, diagram, chart) 
@@ -173,7 +255,8 @@ Respond ONLY with JSON:
     try:
         resp = CLIENT.models.generate_content(
             model='gemini-2.5-flash-lite',
-            contents=prompt.format(question=question)
+            contents=prompt.format(question=question),
+            config=operation_config('classify')
         )
         
         raw = resp.text or ''
@@ -196,6 +279,53 @@ Respond ONLY with JSON:
     return {'format': 'text', 'confidence': 0.5, 'reason': 'Classification failed, defaulting to text'}
 
 
+def start_query_classification(question: str) -> Optional[concurrent.futures.Future]:
+    """
+    Run classify_query_type() in the background so it overlaps the RAG call.
+    
+    Args:
+        question: The user's question
+    
+    Returns:
+        Future resolving to the classification dict, or None when the
+        classification pool is saturated (classification is then skipped)
+    """
+    if not _CLASSIFY_SLOTS.acquire(blocking=False):
+        logger.info("⏭️ Classification pool saturated; skipping query classification")
+        return None
+    try:
+        future = _CLASSIFY_EXECUTOR.submit(classify_query_type, question)
+    except Exception:
+        _CLASSIFY_SLOTS.release()
+        raise
+    future.add_done_callback(lambda _f: _CLASSIFY_SLOTS.release())
+    return future
+
+
+def collect_query_classification(future: Optional[concurrent.futures.Future],
+                                 wait_seconds: float = 0.0) -> Optional[Dict[str, Any]]:
+    """
+    Join a background classification only if it is ready.
+    
+    Waits at most `wait_seconds`. If the result is still pending the future is
+    cancelled (queued work never starts; an in-flight model call finishes in
+    the background and its result is discarded).
+    
+    Returns:
+        Classification dict, or None if it was skipped, unfinished or failed
+    """
+    if future is None:
+        return None
+    try:
+        return future.result(timeout=wait_seconds)
+    except concurrent.futures.TimeoutError:
+        future.cancel()
+        logger.info("⏭️ Answer ready before classification; classification dropped")
+    except Exception as e:
+        logger.warning(f'⚠️ Background classification failed: {e}')
+    return None
+
+
 # ============================================================================
 # RAG & FILE MANAGEMENT FUNCTIONS
 # ============================================================================
@@ -212,109 +342,555 @@ def set_client_and_app(client: genai.Client, app=None, upload_folder: str = 'upl
     logger.info("✅ AI services module initialized with Gemini client and Flask app")
 
 
-def ensure_file_search_store():
+def state_path(name: str) -> str:
+    """
+    Path of a private state file in DATA_FOLDER.
+
+    A database that earlier versions kept in UPLOAD_FOLDER (with its WAL
+    and shared-memory files) is moved over on first use, so its state is
+    kept and it is no longer served under /uploads/.
+    """
+    path = os.path.join(DATA_FOLDER, name)
+    legacy = os.path.join(UPLOAD_FOLDER, name)
+    if not os.path.exists(path) and os.path.exists(legacy):
+        os.makedirs(DATA_FOLDER, exist_ok=True)
+        for suffix in ('', '-wal', '-shm'):
+            try:
+                os.replace(legacy + suffix, path + suffix)
+            except FileNotFoundError:
+                pass  # no such sidecar, or another worker moved it first
+        logger.info(f"📦 Moved {name} from {UPLOAD_FOLDER}/ to {DATA_FOLDER}/")
+    return path
+
+
+class _StoreHandle:
+    """
+    Process-wide, thread-safe handle to the persisted file search store.
+    
+    The store name is read from _STORE_INFO_PATH once and cached; the file's
+    mtime is re-checked at most every STORE_STAT_INTERVAL_SECONDS so a store
+    created or replaced by another worker is picked up. Each newly loaded
+    name is validated against the API on a background thread, and a store the
+    API reports as missing is dropped so the next call recreates it.
+    
+    Creating a store holds an exclusive lock on _STORE_LOCK_PATH (flock), so
+    gunicorn workers starting together create one store, not one each.
+    """
+
+    def __init__(self, info_path: str, lock_path: str):
+        self.info_path = info_path
+        self.lock_path = lock_path
+        self._lock = threading.Lock()
+        self._store: Optional[types.FileSearchStore] = None
+        self._mtime_ns: Optional[int] = None
+        self._checked_at = 0.0
+        self._validated: set = set()
+
+    def _read_persisted(self) -> Optional[str]:
+        """Read the store name from disk (caller holds self._lock)."""
+        try:
+            st = os.stat(self.info_path)
+        except FileNotFoundError:
+            self._store, self._mtime_ns = None, None
+            return None
+        if self._store is not None and st.st_mtime_ns == self._mtime_ns:
+            return self._store.name
+        try:
+            with open(self.info_path, 'r', encoding='utf-8') as fh:
+                name = json.load(fh).get('name')
+        except Exception as e:
+            logger.warning(f'⚠️ Failed to read persisted store info: {e}')
+            return None
+        self._mtime_ns = st.st_mtime_ns
+        self._store = types.FileSearchStore(name=name) if name else None
+        if name:
+            logger.info(f'✅ Reusing persisted file search store: {name}')
+            self._validate_in_background(name)
+        return name
+
+    def _validate_in_background(self, name: str):
+        if name in self._validated:
+            return
+        self._validated.add(name)
+        threading.Thread(target=self._validate, args=(name,), name='store-validate', daemon=True).start()
+
+    def _validate(self, name: str):
+        try:
+            CLIENT.file_search_stores.get(name=name)
+        except genai_errors.ClientError as e:
+            if e.code in (403, 404):
+                logger.warning(f'⚠️ Persisted file search store {name} is not usable ({e.code}); it will be recreated')
+                self.invalidate(name)
+        except Exception as e:
+            # Transient failures keep the store; the next upload/query will surface real problems
+            logger.debug(f'Store validation skipped for {name}: {e}')
+
+    def invalidate(self, name: str):
+        """Forget a store and remove its persisted record, if it still names that store."""
+        with self._lock:
+            with _exclusive_file_lock(self.lock_path):
+                try:
+                    with open(self.info_path, 'r', encoding='utf-8') as fh:
+                        if json.load(fh).get('name') == name:
+                            os.remove(self.info_path)
+                except (FileNotFoundError, ValueError):
+                    pass
+            if self._store is not None and self._store.name == name:
+                self._store, self._mtime_ns = None, None
+            self._checked_at = 0.0
+
+    def get(self) -> types.FileSearchStore:
+        store = self._store
+        if store is not None and time.monotonic() - self._checked_at < STORE_STAT_INTERVAL_SECONDS:
+            return store
+        with self._lock:
+            self._checked_at = time.monotonic()
+            if self._read_persisted():
+                return self._store
+            with _exclusive_file_lock(self.lock_path):
+                # Another worker may have created the store while we waited
+                if self._read_persisted():
+                    return self._store
+                logger.info("🔄 Creating new file search store...")
+                created = CLIENT.file_search_stores.create()
+                tmp = f'{self.info_path}.tmp.{os.getpid()}'
+                try:
+                    with open(tmp, 'w', encoding='utf-8') as fh:
+                        json.dump({'name': created.name, 'created_at': int(time.time())}, fh)
+                    os.replace(tmp, self.info_path)
+                    self._mtime_ns = os.stat(self.info_path).st_mtime_ns
+                    logger.info(f'✅ Created and persisted new file search store: {created.name}')
+                except Exception as e:
+                    logger.warning(f'⚠️ Failed to persist store info (will recreate on restart): {e}')
+                self._validated.add(created.name)
+                self._store = types.FileSearchStore(name=created.name)
+                return self._store
+
+
+@contextlib.contextmanager
+def _exclusive_file_lock(path: str):
+    """Hold an exclusive cross-process lock on `path` (no-op where flock is unavailable)."""
+    if fcntl is None:
+        yield
+        return
+    with open(path, 'a') as fh:
+        fcntl.flock(fh, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(fh, fcntl.LOCK_UN)
+
+
+_STORE_HANDLE = _StoreHandle(_STORE_INFO_PATH, _STORE_LOCK_PATH)
+
+
+def ensure_file_search_store() -> types.FileSearchStore:
     """
-    Ensure a Gemini file-search store exists. Reuses persisted store on disk
-    to avoid creating new stores on every startup.
+    Ensure a Gemini file-search store exists. Reuses the persisted store
+    (cached in memory, see _StoreHandle) to avoid creating new stores on
+    every startup.
     
     Returns: Store object with .name attribute
     Raises: RuntimeError if client not initialized
     """
     if CLIENT is None:
         raise RuntimeError('Gemini client not initialized. Call set_client_and_app() first.')
+    return _STORE_HANDLE.get()
+
+
+class _SingleFlight:
+    """
+    Coalesce concurrent identical calls into one upstream request.
     
-    # Try to read persisted store name from disk
-    try:
-        if os.path.exists(_STORE_INFO_PATH):
-            with open(_STORE_INFO_PATH, 'r', encoding='utf-8') as fh:
-                data = json.load(fh)
-                name = data.get('name')
-                if name:
-                    # Minimal holder for store.name
-                    class _Store:
-                        def __init__(self, store_name):
-                            self.name = store_name
-                    
-                    store = _Store(name)
-                    logger.info(f'✅ Reusing persisted file search store: {name}')
-                    return store
-    except Exception as e:
-        logger.warning(f'⚠️ Failed to read persisted store info: {e}')
+    The first caller for a key (the leader) runs the function; callers that
+    arrive while it is in flight (followers) block until it finishes and get
+    the same result, or the same exception re-raised. Entries are removed as
+    soon as the leader finishes, so nothing is cached beyond the flight.
+    Thread-safe, which is what gunicorn's threaded workers need; separate
+    worker processes each coalesce their own traffic.
+    """
+
+    class _Call:
+        __slots__ = ('done', 'result', 'error')
+
+        def __init__(self):
+            self.done = threading.Event()
+            self.result = None
+            self.error = None
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Any, '_SingleFlight._Call'] = {}
+        self._stats = {'leaders': 0, 'followers': 0, 'timeouts': 0, 'errors': 0}
+
+    def do(self, key, fn, timeout: float):
+        with self._lock:
+            call = self._calls.get(key)
+            is_leader = call is None
+            if is_leader:
+                call = self._calls[key] = self._Call()
+                self._stats['leaders'] += 1
+            else:
+                self._stats['followers'] += 1
+
+        if not is_leader:
+            if not call.done.wait(timeout):
+                with self._lock:
+                    self._stats['timeouts'] += 1
+                raise TimeoutError(f'Timed out after {timeout:.0f}s waiting for an identical in-flight request')
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            with self._lock:
+                self._stats['errors'] += 1
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {**self._stats, 'in_flight': len(self._calls)}
+
+
+_RAG_FLIGHTS = _SingleFlight()
+
+
+def single_flight_stats() -> Dict[str, int]:
+    """Return single-flight counters (leaders, followers, timeouts, errors, in_flight)."""
+    return _RAG_FLIGHTS.stats()
+
+
+def _file_search_config(store_name: str) -> types.GenerateContentConfig:
+    """Generation config that grounds answers in the given File Search store."""
+    return types.GenerateContentConfig(
+        tools=[types.Tool(file_search=types.FileSearch(file_search_store_names=[store_name]))]
+    )
+
+
+def get_local_retriever() -> HybridRetriever:
+    """Return the process-wide local retriever, building it on first use."""
+    global _LOCAL_RETRIEVER
+    if _LOCAL_RETRIEVER is None:
+        with _LOCAL_RETRIEVER_LOCK:
+            if _LOCAL_RETRIEVER is None:
+                _LOCAL_RETRIEVER = HybridRetriever.from_directory('knowledge_base')
+    return _LOCAL_RETRIEVER
+
+
+def retrieval_stats() -> Dict[str, Any]:
+    """Retrieval mode plus local index stats (if the index has been built)."""
+    stats: Dict[str, Any] = {'mode': RETRIEVAL_MODE}
+    if _LOCAL_RETRIEVER is not None:
+        stats['local'] = _LOCAL_RETRIEVER.stats()
+        stats['context_packing'] = CONTEXT_PACKER.stats()
+    return stats
+
+
+def build_local_rag_contents(contents: str, question: str, k: int = LOCAL_RETRIEVAL_TOP_K) -> str:
+    """
+    Append locally retrieved passages, packed under the token budget, to a prompt.
     
-    # Create a new store and persist its name
-    logger.info("🔄 Creating new file search store...")
-    store = CLIENT.file_search_stores.create()
+    Retrieves CONTEXT_CANDIDATES passages, then lets CONTEXT_PACKER pick at
+    most k of them (relevance order, redundancy removal, truncation).
     
-    try:
-        with open(_STORE_INFO_PATH, 'w', encoding='utf-8') as fh:
-            json.dump({'name': store.name, 'created_at': int(time.time())}, fh)
-        logger.info(f'✅ Created and persisted new file search store: {store.name}')
-    except Exception as e:
-        logger.warning(f'⚠️ Failed to persist store info (will recreate on restart): {e}')
+    Args:
+        contents: Base prompt (instruction + user question)
+        question: Query used for retrieval
+        k: Maximum number of passages to inject
     
-    return store
+    Returns:
+        Prompt with a numbered reference-passage section
+    """
+    start = time.perf_counter()
+    retriever = get_local_retriever()
+    candidates = retriever.search(question, k=max(k, CONTEXT_CANDIDATES))
+    vectors = retriever.dense.matrix[[h['doc_id'] for h in candidates]] if candidates else None
+    packed = CONTEXT_PACKER.pack(question, candidates, max_passages=k, vectors=vectors)
+    hits, metrics = packed['passages'], packed['metrics']
+    logger.info(
+        f"🔎 Local retrieval: {metrics['passages_packed']}/{metrics['passages_in']} passage(s), "
+        f"{metrics['packed_tokens']} tokens (saved {metrics['tokens_saved']}) "
+        f"in {1000 * (time.perf_counter() - start):.1f} ms"
+    )
+    if not hits:
+        return contents
+    blocks = []
+    for i, h in enumerate(hits, start=1):
+        citation = f"{h['source']}, page {h['page']}" if h.get('page') else h['source']
+        blocks.append(f"[{i}] (source: {citation})\n{h['text']}")
+    passages = '\n\n'.join(blocks)
+    return (
+        f"{contents}\n\n"
+        "Use the following reference passages from the knowledge base when they are relevant. "
+        "If they do not cover the question, answer from general agricultural knowledge.\n\n"
+        f"{passages}"
+    )
+
+
+def retrieval_mode(retrieval: Optional[str] = None) -> str:
+    """Effective retrieval mode of a request: the override if given, else RETRIEVAL_MODE."""
+    return (retrieval or RETRIEVAL_MODE).lower()
 
 
-def upload_file_to_store(path: str) -> bool:
+def _resolve_rag_request(question: str, contents: str, retrieval: Optional[str]) -> tuple:
+    """
+    Apply the retrieval mode to a RAG request.
+    
+    Returns:
+        (contents, store_name, config) - local mode injects passages and calls
+        the model without tools; file_search mode attaches the store tool.
+        Either config carries the 'chat' timeout.
+    """
+    if retrieval_mode(retrieval) == 'local':
+        return build_local_rag_contents(contents, question or contents), 'local', operation_config('chat')
+    store = ensure_file_search_store()
+    return contents, store.name, operation_config('chat', _file_search_config(store.name))
+
+
+def _rag_flight_key(question: str, contents: str, language: str, store_name: str, model: str) -> tuple:
+    """Coalescing key for identical RAG requests."""
+    return (
+        normalize_question(question),
+        language,
+        store_name,
+        model,
+        hashlib.sha1(contents.encode('utf-8')).hexdigest(),
+    )
+
+
+def generate_rag_answer(question: str, contents: str, language: str = 'english',
+                        model: str = 'gemini-2.5-flash-lite', retrieval: Optional[str] = None):
+    """
+    Generate a grounded answer, sharing one upstream call among concurrent
+    identical requests.
+    
+    Requests are coalesced on (normalized question, language, store name,
+    model, prompt digest); the digest keeps routes with different prompt
+    templates apart.
+    
+    Args:
+        question: The user's question (used for the coalescing key)
+        contents: Full prompt (instruction + user question)
+        language: Response language
+        model: Gemini model name
+        retrieval: 'file_search' or 'local'; defaults to RETRIEVAL_MODE
+    
+    Returns:
+        The SDK GenerateContentResponse (shared read-only between callers)
+    
+    Raises:
+        RuntimeError if client not initialized; TimeoutError if an identical
+        in-flight request does not finish within SINGLE_FLIGHT_TIMEOUT_SECONDS;
+        SDK errors from the shared call propagate to every waiting caller
+    """
+    if CLIENT is None:
+        raise RuntimeError('Gemini client not initialized. Call set_client_and_app() first.')
+    contents, store_name, config = _resolve_rag_request(question, contents, retrieval)
+    key = _rag_flight_key(question, contents, language, store_name, model)
+
+    def _call():
+        return CLIENT.models.generate_content(model=model, contents=contents, config=config)
+
+    return _RAG_FLIGHTS.do(key, _call, SINGLE_FLIGHT_TIMEOUT_SECONDS)
+
+
+# In-flight async RAG calls, keyed by (event loop, flight key)
+_ASYNC_RAG_FLIGHTS: Dict[Any, 'asyncio.Task'] = {}
+
+
+async def agenerate_rag_answer(question: str, contents: str, language: str = 'english',
+                               model: str = 'gemini-2.5-flash-lite', retrieval: Optional[str] = None):
+    """
+    Async variant of generate_rag_answer() using the async client surface.
+    
+    Identical concurrent requests on the same event loop await one shared
+    task; a waiter timing out or being cancelled never cancels the shared call.
+    """
+    if CLIENT is None:
+        raise RuntimeError('Gemini client not initialized. Call set_client_and_app() first.')
+    # Local retrieval (first call ingests the knowledge base) and the store lookup block
+    contents, store_name, config = await asyncio.to_thread(_resolve_rag_request, question, contents, retrieval)
+    key = (asyncio.get_running_loop(), _rag_flight_key(question, contents, language, store_name, model))
+    task = _ASYNC_RAG_FLIGHTS.get(key)
+    if task is None:
+        task = asyncio.ensure_future(CLIENT.aio.models.generate_content(
+            model=model, contents=contents, config=config
+        ))
+        _ASYNC_RAG_FLIGHTS[key] = task
+
+        def _landed(t: 'asyncio.Task') -> None:
+            _ASYNC_RAG_FLIGHTS.pop(key, None)
+            # Retrieve the exception even when every waiter has already timed out,
+            # so asyncio does not log "Task exception was never retrieved"
+            if not t.cancelled():
+                t.exception()
+
+        task.add_done_callback(_landed)
+    return await asyncio.wait_for(asyncio.shield(task), SINGLE_FLIGHT_TIMEOUT_SECONDS)
+
+
+def stream_rag_answer(contents: str, model: str = 'gemini-2.5-flash-lite',
+                      question: str = '', retrieval: Optional[str] = None) -> Iterator[str]:
+    """
+    Stream a grounded answer as text chunks.
+    
+    Uses the SDK's streaming generation so callers can forward tokens to the
+    browser as they arrive instead of waiting for the full answer.
+    
+    Args:
+        contents: Full prompt (instruction + user question)
+        model: Gemini model name
+        question: The user's question (query for local retrieval)
+        retrieval: 'file_search' or 'local'; defaults to RETRIEVAL_MODE
+    
+    Yields:
+        Non-empty text chunks in generation order
+    
+    Raises:
+        RuntimeError if client not initialized; SDK errors propagate to the caller
+    """
+    if CLIENT is None:
+        raise RuntimeError('Gemini client not initialized. Call set_client_and_app() first.')
+    contents, _store_name, config = _resolve_rag_request(question, contents, retrieval)
+    stream = CLIENT.models.generate_content_stream(model=model, contents=contents, config=config)
+    for chunk in stream:
+        text = chunk.text
+        if text:
+            yield text
+
+
+async def astream_rag_answer(contents: str, model: str = 'gemini-2.5-flash-lite',
+                             question: str = '', retrieval: Optional[str] = None) -> AsyncIterator[str]:
+    """Async variant of stream_rag_answer() using the async client surface."""
+    if CLIENT is None:
+        raise RuntimeError('Gemini client not initialized. Call set_client_and_app() first.')
+    contents, _store_name, config = await asyncio.to_thread(_resolve_rag_request, question, contents, retrieval)
+    stream = await CLIENT.aio.models.generate_content_stream(model=model, contents=contents, config=config)
+    async for chunk in stream:
+        text = chunk.text
+        if text:
+            yield text
+
+
+def knowledge_base_version() -> str:
+    """
+    Return an identifier for the current knowledge-base contents.
+
+    Combines the file search store name with the upload manifest's content
+    version (see UploadManifest.content_version()), which every worker reads
+    from the shared database, so cached answers never outlive the documents
+    they were generated from, whichever process uploaded them.
+    """
+    store = ensure_file_search_store()
+    return f'{store.name}#{get_upload_manifest().content_version(store.name)}'
+
+
+_UPLOAD_MANIFEST: Optional[UploadManifest] = None
+_UPLOAD_MANIFEST_LOCK = threading.Lock()
+
+_HASH_BUFFER_BYTES = 1024 * 1024
+_HASH_MMAP_MIN_BYTES = 8 * 1024 * 1024
+
+
+def get_upload_manifest() -> UploadManifest:
+    """Return the process-wide upload manifest in DATA_FOLDER, opening it on first use."""
+    global _UPLOAD_MANIFEST
+    db_path = os.path.join(DATA_FOLDER, MANIFEST_NAME)
+    if _UPLOAD_MANIFEST is None or _UPLOAD_MANIFEST.db_path != db_path:
+        with _UPLOAD_MANIFEST_LOCK:
+            if _UPLOAD_MANIFEST is None or _UPLOAD_MANIFEST.db_path != db_path:
+                _UPLOAD_MANIFEST = UploadManifest(
+                    state_path(MANIFEST_NAME), legacy_cache_path=os.path.join(UPLOAD_FOLDER, LEGACY_CACHE_NAME))
+                atexit.register(_UPLOAD_MANIFEST.flush)
+    return _UPLOAD_MANIFEST
+
+
+def upload_manifest_stats() -> Dict[str, Any]:
+    """Manifest record counts per state (empty until the manifest is opened)."""
+    return _UPLOAD_MANIFEST.stats() if _UPLOAD_MANIFEST is not None else {}
+
+
+def _compute_hash(file_path: str) -> str:
+    """
+    SHA-256 of a file's content.
+    
+    Large files are hashed from an mmap, smaller ones in 1 MB reads; hashlib
+    releases the GIL while hashing, so the upload pool hashes in parallel.
+    """
+    h = hashlib.sha256()
+    with open(file_path, 'rb') as fh:
+        if os.fstat(fh.fileno()).st_size >= _HASH_MMAP_MIN_BYTES:
+            with mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                h.update(mm)
+        else:
+            for chunk in iter(lambda: fh.read(_HASH_BUFFER_BYTES), b''):
+                h.update(chunk)
+    return h.hexdigest()
+
+
+def upload_file_to_store(path: str, flush: bool = True) -> bool:
     """
     Upload a file to the Gemini file-search store with hash-based deduplication.
     
+    Uploads are recorded in the transactional upload manifest (see
+    upload_manifest.py); a file is only uploaded by the worker that claims it.
+    A file whose (inode, size, mtime_ns) matches its uploaded record is
+    skipped without being hashed.
+    
     Args:
         path: File path to upload
+        flush: Commit the manifest record now; bulk callers pass False and
+            call get_upload_manifest().flush() once at the end
     
     Returns:
-        True if upload successful or already uploaded, False otherwise
+        True if upload successful, already uploaded or being uploaded by
+        another worker, False otherwise
     """
     try:
         store = ensure_file_search_store()
-        os.makedirs(UPLOAD_FOLDER, exist_ok=True)
-        cache_path = os.path.join(UPLOAD_FOLDER, _UPLOAD_CACHE_NAME)
+        manifest = get_upload_manifest()
+        st = os.stat(path)
         
-        # Compute SHA256 hash of file content
-        def _compute_hash(file_path: str) -> str:
-            h = hashlib.sha256()
-            with open(file_path, 'rb') as fh:
-                for chunk in iter(lambda: fh.read(8192), b''):
-                    h.update(chunk)
-            return h.hexdigest()
+        # Fast path: unchanged since it was uploaded, no need to hash
+        if manifest.match_signature(store.name, path, st):
+            logger.info(f"✅ Skipping upload for {path}; unchanged since upload to {store.name}")
+            return True
         
         file_hash = _compute_hash(path)
         
-        # Load upload cache
-        cache = {}
-        try:
-            if os.path.exists(cache_path):
-                with open(cache_path, 'r', encoding='utf-8') as ch:
-                    cache = json.load(ch)
-        except Exception:
-            cache = {}
-        
-        # Check if already uploaded to this store
-        if file_hash in cache and cache[file_hash].get('uploaded') and cache[file_hash].get('store_name') == store.name:
+        # Check if already uploaded to this store (or claimed by another worker)
+        manifest.record_signature(path, st, file_hash)
+        if not manifest.claim(file_hash, store.name, path, st.st_size, st.st_mtime_ns):
             logger.info(f"✅ Skipping upload for {path}; already in store {store.name}")
             return True
         
         # Upload the file
         logger.info(f"📤 Uploading {os.path.basename(path)} to file search store...")
-        CLIENT.file_search_stores.upload_to_file_search_store(
-            file_search_store_name=store.name,
-            file=path
-        )
+        try:
+            operation = CLIENT.file_search_stores.upload_to_file_search_store(
+                file_search_store_name=store.name,
+                file=path,
+                config=operation_config('upload')
+            )
+        except Exception as e:
+            manifest.mark_failed(file_hash, store.name, path, st.st_size, st.st_mtime_ns, str(e))
+            raise
         
         # The above call is blocking and will raise on error. Polling is not required.
-        
-        # Update cache
-        try:
-            cache[file_hash] = {
-                'filename': os.path.basename(path),
-                'uploaded': True,
-                'timestamp': int(time.time()),
-                'store_name': store.name
-            }
-            with open(cache_path, 'w', encoding='utf-8') as ch:
-                json.dump(cache, ch)
-        except Exception:
-            logger.warning('⚠️ Failed to update upload cache')
+        response = getattr(operation, 'response', None)
+        manifest.mark_uploaded(
+            file_hash, store.name, path, st.st_size, st.st_mtime_ns,
+            document_name=getattr(response, 'document_name', None),
+            operation_name=getattr(operation, 'name', None),
+        )
         
         logger.info(f"✅ Successfully uploaded: {os.path.basename(path)}")
         return True
@@ -322,97 +898,111 @@ def upload_file_to_store(path: str) -> bool:
     except Exception as e:
         logger.error(f'❌ Upload to store failed for {path}: {e}')
         return False
+    finally:
+        if flush and _UPLOAD_MANIFEST is not None:
+            try:
+                _UPLOAD_MANIFEST.flush()
+            except Exception as e:
+                logger.warning(f'⚠️ Failed to commit upload manifest: {e}')
+
+
+KB_DIR = 'knowledge_base'
+KB_EXTENSIONS = ('.pdf', '.txt', '.json', '.doc', '.docx')
+
+
+def knowledge_base_files(kb_dir: str = KB_DIR) -> List[str]:
+    """All knowledge base files with a supported extension, sorted."""
+    file_paths: List[str] = []
+    for root, dirs, files in os.walk(kb_dir):
+        for filename in files:
+            if filename.lower().endswith(KB_EXTENSIONS):
+                file_paths.append(os.path.join(root, filename))
+    return sorted(file_paths)
 
 
-def initialize_knowledge_base():
+def initialize_knowledge_base(progress: Optional[Callable[[int, int, int], None]] = None) -> Dict[str, Any]:
     """
-    Automatically upload all knowledge base files to the file search store on startup.
-    Called on first HTTP request to avoid blocking app initialization.
+    Upload all knowledge base files to the file search store.
+    Run in the background by kb_warmup.py, once per deployment.
+    
+    Args:
+        progress: Optional callback(done, failed, total), called as files finish
+    
+    Returns:
+        Dict with 'total', 'uploaded' (including already-present files), 'failed'
+        and 'failed_files' (paths of the files that failed)
     """
+    result = {'total': 0, 'uploaded': 0, 'failed': 0, 'failed_files': []}
     if CLIENT is None:
         logger.warning("⚠️ Gemini client not initialized; skipping knowledge base upload")
-        return
+        return result
     
-    kb_dir = 'knowledge_base'
-    if not os.path.isdir(kb_dir):
-        logger.warning(f"⚠️ Knowledge base directory '{kb_dir}' not found")
-        return
+    if not os.path.isdir(KB_DIR):
+        logger.warning(f"⚠️ Knowledge base directory '{KB_DIR}' not found")
+        return result
     
     logger.info("📚 Starting knowledge base initialization...")
 
-    # Supported file extensions for RAG
-    supported_extensions = ('.pdf', '.txt', '.json', '.doc', '.docx')
-
     # Collect all candidate files first
-    file_paths: List[str] = []
-    for root, dirs, files in os.walk(kb_dir):
-        for filename in files:
-            if filename.lower().endswith(supported_extensions):
-                file_paths.append(os.path.join(root, filename))
+    file_paths = knowledge_base_files(KB_DIR)
+    result['total'] = len(file_paths)
 
     if not file_paths:
         logger.info("📚 No knowledge base files found to upload.")
-        return
+        return result
 
     logger.info(f"📚 Found {len(file_paths)} file(s) to upload. Using parallel uploader...")
-
-    uploaded_count = 0
+    if progress:
+        progress(0, 0, len(file_paths))
 
     # Use a ThreadPoolExecutor to upload files concurrently. Upload function is IO-bound.
     max_workers = min(8, (os.cpu_count() or 2) * 2)
     with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as exe:
-        future_to_path = {exe.submit(upload_file_to_store, p): p for p in file_paths}
+        future_to_path = {exe.submit(upload_file_to_store, p, False): p for p in file_paths}
 
         for fut in concurrent.futures.as_completed(future_to_path):
             path = future_to_path[fut]
             try:
                 success = fut.result()
                 if success:
-                    uploaded_count += 1
+                    result['uploaded'] += 1
                     logger.info(f"✅ Uploaded: {path}")
                 else:
+                    result['failed'] += 1
+                    result['failed_files'].append(path)
                     logger.warning(f"⚠️ Failed to upload: {path}")
             except Exception as e:
+                result['failed'] += 1
+                result['failed_files'].append(path)
                 logger.error(f"❌ Error uploading {path}: {e}")
+            if progress:
+                progress(result['uploaded'] + result['failed'], result['failed'], len(file_paths))
+
+    try:
+        get_upload_manifest().flush()
+    except Exception as e:
+        logger.warning(f'⚠️ Failed to commit upload manifest: {e}')
 
-    logger.info(f"📚 Knowledge base initialization complete! Uploaded {uploaded_count}/{len(file_paths)} files.")
+    logger.info(f"📚 Knowledge base initialization complete! Uploaded {result['uploaded']}/{len(file_paths)} files.")
+    return result
 
 
 def load_reference_images(category: str, max_images: int = 2) -> List[Dict[str, Any]]:
     """
     Load reference plant images for a given category (e.g., 'sugarcane', 'weeds').
     
+    Served from the in-memory REFERENCE_IMAGES set (see reference_images.py):
+    compact JPEGs that are loaded once and reloaded when the folder changes.
+    
     Args:
         category: Category folder name (e.g., 'sugarcane', 'weeds')
-        max_images: Maximum number of images to load (default 2)
+        max_images: Maximum number of images to return (default 2)
     
     Returns:
-        List of dicts with 'data' (bytes) and 'filename' keys
+        List of dicts with 'data' (bytes), 'filename' and 'mime_type' keys
+        (plus 'file_uri' when reference uploads are enabled)
     """
-    folder = os.path.join('knowledge_base', 'plant_images', category)
-    if not os.path.isdir(folder):
-        logger.debug(f"Reference image folder not found: {folder}")
-        return []
-    
-    # Find all image files
-    paths: List[str] = []
-    for ext in ('*.jpg', '*.jpeg', '*.png'):
-        paths.extend(glob.glob(os.path.join(folder, ext)))
-    
-    # Limit to max_images
-    paths = paths[:max_images]
-    
-    # Load image data
-    images = []
-    for p in paths:
-        try:
-            with open(p, 'rb') as f:
-                images.append({'data': f.read(), 'filename': os.path.basename(p)})
-                logger.debug(f"Loaded reference image: {os.path.basename(p)}")
-        except Exception as e:
-            logger.warning(f'⚠️ Failed to read reference image {p}: {e}')
-    
-    return images
+    return REFERENCE_IMAGES.get(category)[:max_images]
 
 
 # ============================================================================
@@ -513,39 +1103,26 @@ def decide_make_infographic(content: str, original_question: str = '') -> Dict[s
     oq = (original_question or '').lower()
     logger.info(f"   Question preview: '{oq[:100]}...'")
     
-    # Trigger 1: User explicitly used the word 'create'
-    if re.search(r'\bcreate\b', oq, re.IGNORECASE):
-        logger.info("✅ TRIGGER FOUND: 'create' detected — will generate infographic.")
+    intents = match_intents(oq)
+
+    # Trigger 1: User explicitly asked to create something ('create', 'banao', 'बनाओ')
+    if 'create' in intents.intents:
+        logger.info(f"✅ TRIGGER FOUND: '{intents.keywords['create']}' detected — will generate infographic.")
         return {
             'make': True,
             'reason': "User requested 'create' in the question.",
             'style': 'detailed'
         }
-    
-    # Trigger 2: Visual keywords that benefit from infographics
-    visual_keywords = [
-        'steps', 'step by step', 'how to', 'how do i', 'procedure', 'process',
-        'schedule', 'calendar', 'timeline', 'when to',
-        'symptoms', 'identify', 'signs of', 'disease', 'pest',
-        'compare', 'comparison', 'difference between', 'vs',
-        'diagram', 'chart', 'infographic', 'visual', 'show me'
-    ]
-    
-    for keyword in visual_keywords:
-        if keyword in oq:
-            logger.info(f"✅ TRIGGER FOUND: Visual keyword '{keyword}' detected — will generate infographic.")
-            # Determine style based on keyword
-            if keyword in ['schedule', 'calendar', 'timeline', 'when to']:
-                style = 'timeline'
-            elif keyword in ['compare', 'comparison', 'difference between', 'vs']:
-                style = 'chart'
-            else:
-                style = 'detailed'
-            return {
-                'make': True,
-                'reason': f"Visual keyword '{keyword}' detected.",
-                'style': style
-            }
+
+    # Trigger 2: Visual keywords that benefit from infographics (steps, schedules, symptoms, comparisons)
+    if intents.any(INFOGRAPHIC_INTENTS):
+        keyword = next(k for i, k in intents.keywords.items() if i in INFOGRAPHIC_INTENTS)
+        logger.info(f"✅ TRIGGER FOUND: Visual keyword '{keyword}' detected — will generate infographic.")
+        return {
+            'make': True,
+            'reason': f"Visual keyword '{keyword}' detected.",
+            'style': intents.style()
+        }
 
     # If no client, skip AI decision
     if CLIENT is None:
@@ -581,7 +1158,9 @@ def generate_svg_infographic(content: str, style: str = 'simple') -> Optional[st
     
     try:
         logger.info("🎨 Generating SVG infographic...")
-        resp = CLIENT.models.generate_content(model='gemini-2.5-flash-lite', contents=prompt)
+        resp = CLIENT.models.generate_content(
+            model='gemini-2.5-flash-lite', contents=prompt, config=operation_config('chat')
+        )
         raw = resp.text or ''
         
         # Try to extract fenced SVG first
@@ -614,71 +1193,94 @@ def generate_svg_infographic(content: str, style: str = 'simple') -> Optional[st
 # -----------------------------
 def _infographic_key_for_topic(topic: str) -> str:
     """Build a stable key for cooldown from topic string."""
-    import hashlib
     if not topic:
         topic = 'general'
     return hashlib.sha256(topic.encode('utf-8')).hexdigest()
 
 
-def _load_cooldown_map() -> Dict[str, int]:
+def _cooldown_store() -> TTLStore:
+    """Return the process-wide cooldown store, opening it (and importing the legacy map) on first use."""
+    global _COOLDOWN_STORE
+    if _COOLDOWN_STORE is None:
+        with _COOLDOWN_STORE_LOCK:
+            if _COOLDOWN_STORE is None:
+                store = TTLStore(state_path(_INFOGRAPHIC_COOLDOWN_DB), COOLDOWN_SECONDS)
+                _import_legacy_cooldowns(store)
+                _COOLDOWN_STORE = store
+    return _COOLDOWN_STORE
+
+
+def _import_legacy_cooldowns(store: TTLStore):
+    legacy_path = os.path.join(UPLOAD_FOLDER, _INFOGRAPHIC_COOLDOWN_LEGACY)
     try:
-        os.makedirs(UPLOAD_FOLDER, exist_ok=True)
-        if os.path.exists(_INFOGRAPHIC_COOLDOWN_FILE):
-            with open(_INFOGRAPHIC_COOLDOWN_FILE, 'r', encoding='utf-8') as fh:
-                return json.load(fh)
-    except Exception:
-        pass
-    return {}
+        with open(legacy_path, 'r', encoding='utf-8') as fh:
+            legacy = json.load(fh)
+        os.replace(legacy_path, legacy_path + '.imported')
+    except FileNotFoundError:
+        return
+    except Exception as e:
+        logger.debug(f'⚠️ Could not import legacy cooldown map: {e}')
+        return
+    now = time.time()
+    for key, ts in legacy.items():
+        remaining = float(ts) + COOLDOWN_SECONDS - now
+        if remaining > 0:
+            store.set(key, ttl_seconds=remaining)
+    store.flush()
+
+
+def cooldown_stats() -> Dict[str, Any]:
+    """Cooldown store counters (empty until the store is opened)."""
+    return _COOLDOWN_STORE.stats() if _COOLDOWN_STORE is not None else {}
+
 
+def _infographic_cache() -> InfographicCache:
+    """Return the process-wide infographic cache, opening it on first use."""
+    global _INFOGRAPHIC_CACHE
+    if _INFOGRAPHIC_CACHE is None:
+        with _INFOGRAPHIC_CACHE_LOCK:
+            if _INFOGRAPHIC_CACHE is None:
+                _INFOGRAPHIC_CACHE = InfographicCache(state_path(_INFOGRAPHIC_CACHE_DB), UPLOAD_FOLDER)
+    return _INFOGRAPHIC_CACHE
 
-def _save_cooldown_map(m: Dict[str, int]):
+
+def infographic_cache_stats() -> Dict[str, Any]:
+    """Infographic cache counters (empty until the cache is opened)."""
+    return _INFOGRAPHIC_CACHE.stats() if _INFOGRAPHIC_CACHE is not None else {}
+
+
+def cached_infographic(topic: str, content: str = '', language: str = 'english') -> Optional[str]:
+    """
+    Look up a previously generated infographic for an equivalent request.
+    
+    Returns:
+        Relative image path (as returned by generate_infographic_image()) or None
+    """
     try:
-        os.makedirs(UPLOAD_FOLDER, exist_ok=True)
-        with open(_INFOGRAPHIC_COOLDOWN_FILE, 'w', encoding='utf-8') as fh:
-            json.dump(m, fh)
-    except Exception:
-        logger.debug('⚠️ Failed to persist infographic cooldown map')
+        return _infographic_cache().lookup(infographic_cache_key(topic, language, content))
+    except Exception as e:
+        logger.debug(f'⚠️ Infographic cache lookup failed: {e}')
+        return None
 
 
 def _infographic_is_on_cooldown(topic: str) -> bool:
-    key = _infographic_key_for_topic(topic)
-    m = _load_cooldown_map()
-    ts = m.get(key)
-    if not ts:
-        return False
     try:
-        return (int(time.time()) - int(ts)) < COOLDOWN_SECONDS
+        return _cooldown_store().contains(_infographic_key_for_topic(topic))
     except Exception:
         return False
 
 
 def _infographic_update_cooldown(topic: str):
-    key = _infographic_key_for_topic(topic)
-    m = _load_cooldown_map()
-    m[key] = int(time.time())
-    _save_cooldown_map(m)
+    _cooldown_store().set(_infographic_key_for_topic(topic))
 
 
-def generate_infographic_image(content: str, topic: str, language: str = 'english', force: bool = False) -> Optional[str]:
+def _prepare_infographic_prompt(content: str, topic: str, language: str, force: bool) -> Optional[tuple]:
     """
-    Generate an infographic using Gemini 3 Pro Image with Google Search grounding.
-    
-    This is the primary image generation method, using state-of-the-art Gemini 3 Pro Image
-    with Google Search for real-time agricultural data and 4K resolution for clarity.
-    
-    Args:
-        content: Content to visualize (context for the infographic)
-        topic: Main topic for the infographic (used in prompt)
-        language: Language for text labels in the infographic (default: 'english')
+    Build the infographic prompt, or return None when the topic is on cooldown.
     
     Returns:
-        Relative file path to saved PNG ('generated_infographics/infographic_YYYYMMDD_HHMMSS.png')
-        or None if generation fails
+        (prompt, lang_name) tuple, or None if generation should be skipped
     """
-    if CLIENT is None:
-        logger.error("❌ AI client not available for image generation")
-        return None
-    
     # Get the full language name for the prompt
     lang_name = LANGUAGE_NAMES.get(language.lower(), 'English')
     
@@ -710,64 +1312,125 @@ def generate_infographic_image(content: str, topic: str, language: str = 'englis
     except Exception as e:
         logger.debug(f'⚠️ Cooldown check failed: {e}')
 
+    logger.info(f"📸 Calling Gemini 3 Pro Image to generate infographic for: {topic}")
+    logger.info(f"   ✓ Model: gemini-3-pro-image-preview")
+    logger.info(f"   ✓ Language: {lang_name}")
+    logger.info(f"   ✓ Resolution: 1080p (HD)")
+    logger.info(f"   ✓ Aspect Ratio: 16:9")
+    logger.info(f"   ✓ Tools: Google Search grounding")
+    return prompt, lang_name
+
+
+def _infographic_generation_config() -> types.GenerateContentConfig:
+    """Generation config for Gemini 3 Pro Image with Google Search grounding."""
+    return types.GenerateContentConfig(
+        # Use Google Search for real-time agricultural data
+        tools=[{"google_search": {}}],
+        # Configure image output quality and size (1080p for mobile-friendly output)
+        image_config=types.ImageConfig(
+            aspect_ratio="16:9",
+            image_size="1080p"  # HD resolution - optimized for mobile devices
+        )
+    )
+
+
+def _save_infographic_response(response, topic: str, language: str, lang_name: str,
+                               cache_key: str) -> Optional[str]:
+    """Save the first image in a generation response and index it under cache_key; returns its relative path or None."""
+    # Create output directory for generated infographics
+    output_dir = os.path.join(UPLOAD_FOLDER, 'generated_infographics')
+    os.makedirs(output_dir, exist_ok=True)
+    
+    # Extract image parts from response
+    image_parts = [part for part in response.parts if part.inline_data]
+    
+    if not image_parts:
+        logger.error("❌ API call succeeded but returned no images")
+        return None
+    
+    # Save the first generated image
+    image_data = image_parts[0].inline_data
+    image_bytes = image_data.data
+    
+    # Name the file by its content hash: the URL never changes meaning, so it
+    # can be cached as immutable (see static_delivery.py)
+    content_hash = hashlib.sha256(image_bytes).hexdigest()[:16]
+    extension = image_variants.image_extension(image_bytes, getattr(image_data, 'mime_type', None))
+    filename = f"infographic_{language}_{content_hash}{extension}"
+    filepath = os.path.join(output_dir, filename)
+    
+    # Keep the model's bytes as-is (no re-encode); smaller WebP/JPEG
+    # derivatives are built on the image variant process pool
+    with open(filepath, 'wb') as fh:
+        fh.write(image_bytes)
+    try:
+        image_variants.schedule(filepath)
+    except Exception as e:
+        logger.warning(f'⚠️ Could not schedule infographic variants: {e}')
+    
+    logger.info(f"✅ Infographic saved to: {filepath}")
+    logger.info(f"🎨 Generated using Gemini 3 Pro Image (4K resolution, {lang_name})")
+    
+    # Return relative path for URL
+    try:
+        # Update cooldown timestamp for this topic so we don't regen immediately
+        _infographic_update_cooldown(topic)
+    except Exception:
+        logger.debug('⚠️ Failed to update infographic cooldown')
+
+    relative_path = f"generated_infographics/{filename}"
+    try:
+        _infographic_cache().store(cache_key, relative_path, topic=topic, language=language)
+    except Exception as e:
+        logger.debug(f'⚠️ Failed to index infographic in cache: {e}')
+    return relative_path
+
+
+def generate_infographic_image(content: str, topic: str, language: str = 'english', force: bool = False) -> Optional[str]:
+    """
+    Generate an infographic using Gemini 3 Pro Image with Google Search grounding.
+    
+    This is the primary image generation method, using state-of-the-art Gemini 3 Pro Image
+    with Google Search for real-time agricultural data and 4K resolution for clarity.
+    An equivalent earlier request (same normalized topic, language and content) is
+    answered from the infographic cache without calling the model, unless forced.
+    
+    Args:
+        content: Content to visualize (context for the infographic)
+        topic: Main topic for the infographic (used in prompt)
+        language: Language for text labels in the infographic (default: 'english')
+        force: Regenerate even when cached or on cooldown; the new image replaces
+            the cached one
+    
+    Returns:
+        Relative file path to the saved original ('generated_infographics/infographic_<lang>_<content hash>.png')
+        or None if generation fails
+    """
+    # An equivalent request was answered before: reuse its image (a forced
+    # request regenerates it and re-indexes the key)
+    cache_key = infographic_cache_key(topic, language, content)
+    cached = None if force else cached_infographic(topic, content, language)
+    if cached:
+        logger.info(f"♻️ Reusing cached infographic for: {topic[:50]} ({cached})")
+        return cached
+
+    if CLIENT is None:
+        logger.error("❌ AI client not available for image generation")
+        return None
+    
+    prepared = _prepare_infographic_prompt(content, topic, language, force)
+    if prepared is None:
+        return None
+    prompt, lang_name = prepared
+
     try:
-        # Create output directory for generated infographics
-        output_dir = os.path.join(UPLOAD_FOLDER, 'generated_infographics')
-        os.makedirs(output_dir, exist_ok=True)
-        
-        logger.info(f"📸 Calling Gemini 3 Pro Image to generate infographic for: {topic}")
-        logger.info(f"   ✓ Model: gemini-3-pro-image-preview")
-        logger.info(f"   ✓ Language: {lang_name}")
-        logger.info(f"   ✓ Resolution: 1080p (HD)")
-        logger.info(f"   ✓ Aspect Ratio: 16:9")
-        logger.info(f"   ✓ Tools: Google Search grounding")
-        
         # Call Gemini 3 Pro Image with Google Search grounding
         response = CLIENT.models.generate_content(
             model="gemini-3-pro-image-preview",
             contents=prompt,
-            config=types.GenerateContentConfig(
-                # Use Google Search for real-time agricultural data
-                tools=[{"google_search": {}}],
-                # Configure image output quality and size (1080p for mobile-friendly output)
-                image_config=types.ImageConfig(
-                    aspect_ratio="16:9",
-                    image_size="1080p"  # HD resolution - optimized for mobile devices
-                )
-            )
+            config=operation_config('image', _infographic_generation_config())
         )
-        
-        # Extract image parts from response
-        image_parts = [part for part in response.parts if part.inline_data]
-        
-        if not image_parts:
-            logger.error("❌ API call succeeded but returned no images")
-            return None
-        
-        # Save the first generated image
-        image_data = image_parts[0].inline_data
-        image_bytes = image_data.data
-        
-        # Create unique filename with timestamp and language
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"infographic_{language}_{timestamp}.png"
-        filepath = os.path.join(output_dir, filename)
-        
-        # Save image using Pillow
-        with Image.open(BytesIO(image_bytes)) as img:
-            img.save(filepath, "PNG")
-        
-        logger.info(f"✅ Infographic saved to: {filepath}")
-        logger.info(f"🎨 Generated using Gemini 3 Pro Image (4K resolution, {lang_name})")
-        
-        # Return relative path for URL
-        try:
-            # Update cooldown timestamp for this topic so we don't regen immediately
-            _infographic_update_cooldown(topic)
-        except Exception:
-            logger.debug('⚠️ Failed to update infographic cooldown')
-
-        return f"generated_infographics/{filename}"
+        return _save_infographic_response(response, topic, language, lang_name, cache_key)
         
     except Exception as e:
         logger.error(f'❌ Image generation failed: {type(e).__name__}: {e}')
@@ -775,3 +1438,43 @@ def generate_infographic_image(content: str, topic: str, language: str = 'englis
         logger.error(traceback.format_exc())
     
     return None
+
+
+async def agenerate_infographic_image(content: str, topic: str, language: str = 'english', force: bool = False) -> Optional[str]:
+    """
+    Async variant of generate_infographic_image() for the native ASGI app.
+    
+    The model call uses the async client surface; decoding and saving the
+    image runs in a worker thread so the event loop stays responsive.
+    """
+    # An equivalent request was answered before: reuse its image (unless forced)
+    cache_key = infographic_cache_key(topic, language, content)
+    cached = None if force else await asyncio.to_thread(cached_infographic, topic, content, language)
+    if cached:
+        logger.info(f"♻️ Reusing cached infographic for: {topic[:50]} ({cached})")
+        return cached
+
+    if CLIENT is None:
+        logger.error("❌ AI client not available for image generation")
+        return None
+
+    # The cooldown check reads the shared SQLite store: run it off the loop
+    prepared = await asyncio.to_thread(_prepare_infographic_prompt, content, topic, language, force)
+    if prepared is None:
+        return None
+    prompt, lang_name = prepared
+
+    try:
+        response = await CLIENT.aio.models.generate_content(
+            model="gemini-3-pro-image-preview",
+            contents=prompt,
+            config=operation_config('image', _infographic_generation_config())
+        )
+        return await asyncio.to_thread(_save_infographic_response, response, topic, language, lang_name, cache_key)
+
+    except Exception as e:
+        logger.error(f'❌ Image generation failed: {type(e).__name__}: {e}')
+        import traceback
+        logger.error(traceback.format_exc())
+
+    return None
@@ -0,0 +1,254 @@
+"""
+Answer Cache - Semantic Cache for RAG Answers
+==============================================
+
+Farmers ask the same few hundred questions with small wording changes
+("when to apply urea?" / "When to apply Urea"), and every one of them used to
+cost a full File Search round trip. This module keeps recent answers in memory
+and serves repeats without calling the model.
+
+Lookup order:
+    1. **Exact match** on the normalized question + language + knowledge-base
+       version + retrieval mode ('file_search' and 'local' answer differently)
+    2. **Similar match** on the question's content words: the words left, in
+       order, after dropping stopwords (English, Hinglish and Hindi function
+       words). Questions that only differ in punctuation or function words
+       share an answer; questions that differ in any content word ("price of
+       sugarcane in UP" / "... in Punjab") or in its order ("convert acre to
+       hectare" / "convert hectare to acre") never do. Direction and
+       comparison words (to/from/than/vs) are content. Among the entries with
+       the same content words, the one with the highest character n-gram
+       cosine (hashed, sublinear TF, L2-normalized with NumPy) is served
+
+Similar candidates come from a dict index, so a lookup costs O(1) whatever
+the cache size. Eviction is LRU bounded by ``max_entries`` plus a per-entry
+TTL. Hit/miss counters are exposed through ``stats()``.
+
+Configuration (environment variables):
+    - ANSWER_CACHE_ENABLED: '0' disables the cache entirely (default '1')
+    - ANSWER_CACHE_MAX_ENTRIES: LRU capacity (default 2000)
+    - ANSWER_CACHE_TTL_SECONDS: entry lifetime (default 6 hours)
+"""
+# Standard library imports
+import hashlib
+import os
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+# Third-party imports
+import numpy as np
+
+# ============================================================================
+# CONFIGURATION
+# ============================================================================
+
+ENABLED = os.getenv('ANSWER_CACHE_ENABLED', '1') != '0'
+MAX_ENTRIES = int(os.getenv('ANSWER_CACHE_MAX_ENTRIES', '2000'))
+TTL_SECONDS = int(os.getenv('ANSWER_CACHE_TTL_SECONDS', str(6 * 3600)))
+
+# Function words ignored when comparing questions (English, Hinglish, Hindi).
+# Question words (what/when/how/kab/kaise...), negations and direction or
+# comparison words (to/from/than/vs, ko/se) are content: they change the answer.
+STOPWORDS = frozenset('''
+    a an the is are am was were be been do does did can could should would will shall may might must
+    of in on at for by with about as and or i me my we our you your it its this that
+    these those there please tell explain give know need want some any also
+    hai hain ha ho tha the thi ka ki ke me mein par aur ya bhi toh kya ye yeh wo woh
+    hamen hume mujhe mera meri mere apna apni batao bataye bataiye bataen
+    है हैं था थे थी का की के में पर और या भी तो यह ये वह वो मुझे मेरा मेरी मेरे हमें
+    बताओ बताएं बताइए बताये
+'''.split())
+
+# Hashed feature space for character n-grams; 2**12 keeps a vector at 16 KB
+_VECTOR_DIM = 4096
+_NGRAM_SIZES = (2, 3, 4)
+
+_PUNCT_RE = re.compile(r'[^\w\s]', re.UNICODE)
+_SPACE_RE = re.compile(r'\s+')
+
+
+def normalize_question(text: str) -> str:
+    """Normalize a question for cache keying (case, unicode form, punctuation, spacing)."""
+    text = unicodedata.normalize('NFKC', text or '').lower()
+    text = _PUNCT_RE.sub(' ', text)
+    return _SPACE_RE.sub(' ', text).strip()
+
+
+def content_words(normalized: str) -> Tuple[str, ...]:
+    """Words of a normalized question without stopwords, in order."""
+    return tuple(w for w in normalized.split() if w not in STOPWORDS)
+
+
+def vectorize(normalized: str) -> np.ndarray:
+    """
+    Build a hashed character n-gram vector for a normalized question.
+
+    Uses word-boundary padded n-grams with sublinear (1 + log tf) weighting and
+    L2 normalization, so the dot product of two vectors is their cosine similarity.
+    """
+    vec = np.zeros(_VECTOR_DIM, dtype=np.float32)
+    if not normalized:
+        return vec
+    padded = f' {normalized} '
+    counts: Dict[int, int] = {}
+    for n in _NGRAM_SIZES:
+        for i in range(len(padded) - n + 1):
+            gram = padded[i:i + n]
+            digest = hashlib.blake2b(gram.encode('utf-8'), digest_size=4).digest()
+            idx = int.from_bytes(digest, 'little') % _VECTOR_DIM
+            counts[idx] = counts.get(idx, 0) + 1
+    indices = np.fromiter(counts.keys(), dtype=np.int64, count=len(counts))
+    tf = np.fromiter(counts.values(), dtype=np.float32, count=len(counts))
+    vec[indices] = 1.0 + np.log(tf)
+    norm = float(np.linalg.norm(vec))
+    if norm > 0:
+        vec /= norm
+    return vec
+
+
+class AnswerCache:
+    """
+    Thread-safe LRU + TTL cache of model answers with semantic lookup.
+
+    Entries are stored in an ``OrderedDict`` keyed by
+    ``(normalized_question, language, kb_version, retrieval)``. A second dict maps
+    ``(content_words, language, kb_version, retrieval)`` to the keys of the entries that
+    share them; vectors are kept alongside each entry to rank those few
+    candidates.
+    """
+
+    def __init__(self, max_entries: int = MAX_ENTRIES, ttl_seconds: int = TTL_SECONDS,
+                 enabled: bool = ENABLED):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.enabled = enabled
+        self._entries: 'OrderedDict[Tuple[str, str, str, str], Dict[str, Any]]' = OrderedDict()
+        self._similar: Dict[Tuple[Tuple[str, ...], str, str, str], set] = {}
+        self._lock = threading.Lock()
+        self._stats = {'exact_hits': 0, 'similar_hits': 0, 'misses': 0,
+                       'bypassed': 0, 'stores': 0, 'evictions': 0, 'expired': 0}
+
+    # ------------------------------------------------------------------
+    # Internal helpers (caller holds the lock)
+    # ------------------------------------------------------------------
+    def _is_expired(self, entry: Dict[str, Any], now: float) -> bool:
+        return now - entry['stored_at'] > self.ttl_seconds
+
+    @staticmethod
+    def _similar_key(key: Tuple[str, str, str, str]) -> Tuple[Tuple[str, ...], str, str, str]:
+        return (content_words(key[0]),) + key[1:]
+
+    def _drop(self, key: Tuple[str, str, str, str]):
+        del self._entries[key]
+        similar_key = self._similar_key(key)
+        keys = self._similar.get(similar_key)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._similar[similar_key]
+
+    # ------------------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------------------
+    def get(self, question: str, language: str, kb_version: str,
+            bypass: bool = False, retrieval: str = '') -> Optional[Dict[str, Any]]:
+        """
+        Look up a cached answer.
+
+        Args:
+            question: The user's question as asked
+            language: Answer language
+            kb_version: Knowledge-base version the answer must come from
+            bypass: Skip the lookup (counted as 'bypassed')
+            retrieval: Retrieval mode that produced the answer ('file_search' or 'local')
+
+        Returns:
+            Dict with 'value', 'match' ('exact' or 'similar') and 'similarity',
+            or None on a miss (or when bypassed/disabled).
+        """
+        if not self.enabled or bypass:
+            with self._lock:
+                self._stats['bypassed'] += 1
+            return None
+
+        normalized = normalize_question(question)
+        key = (normalized, language, kb_version, retrieval)
+        now = time.time()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if self._is_expired(entry, now):
+                    self._drop(key)
+                    self._stats['expired'] += 1
+                else:
+                    self._entries.move_to_end(key)
+                    self._stats['exact_hits'] += 1
+                    return {'value': entry['value'], 'match': 'exact', 'similarity': 1.0}
+
+            candidates = []
+            for candidate_key in list(self._similar.get(self._similar_key(key), ())):
+                candidate = self._entries[candidate_key]
+                if self._is_expired(candidate, now):
+                    self._drop(candidate_key)
+                    self._stats['expired'] += 1
+                else:
+                    candidates.append((candidate_key, candidate))
+            if candidates:
+                query_vec = vectorize(normalized)
+                score, best_key, best_entry = max(
+                    (float(e['vector'] @ query_vec), k, e) for k, e in candidates)
+                self._entries.move_to_end(best_key)
+                self._stats['similar_hits'] += 1
+                return {'value': best_entry['value'], 'match': 'similar', 'similarity': score}
+
+            self._stats['misses'] += 1
+            return None
+
+    def put(self, question: str, language: str, kb_version: str, value: Dict[str, Any],
+            retrieval: str = ''):
+        """Store an answer, evicting expired and least recently used entries past capacity."""
+        if not self.enabled:
+            return
+        normalized = normalize_question(question)
+        if not normalized:
+            return
+        entry = {'value': value, 'vector': vectorize(normalized), 'stored_at': time.time()}
+        key = (normalized, language, kb_version, retrieval)
+        now = entry['stored_at']
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            similar_key = self._similar_key(key)
+            if similar_key[0]:  # all-stopword questions only match exactly
+                self._similar.setdefault(similar_key, set()).add(key)
+            self._stats['stores'] += 1
+            while self._entries:
+                oldest_key, oldest = next(iter(self._entries.items()))
+                if self._is_expired(oldest, now):
+                    self._stats['expired'] += 1
+                elif len(self._entries) > self.max_entries:
+                    self._stats['evictions'] += 1
+                else:
+                    break
+                self._drop(oldest_key)
+
+    def clear(self):
+        """Drop every cached entry (counters are kept)."""
+        with self._lock:
+            self._entries.clear()
+            self._similar.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit/miss counters and current size."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['size'] = len(self._entries)
+        lookups = stats['exact_hits'] + stats['similar_hits'] + stats['misses']
+        stats['hit_rate'] = round((stats['exact_hits'] + stats['similar_hits']) / lookups, 4) if lookups else 0.0
+        stats['enabled'] = self.enabled
+        return stats
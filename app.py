@@ -20,12 +20,17 @@ Architecture:
 
 Routes:
     - / : Main application UI
-    - /ask : RAG-powered Q&A endpoint
+    - /ask : RAG-powered Q&A endpoint (JSON, or SSE with `stream: true`)
     - /upload : Document upload for knowledge base
-    - /scan-image : Crop disease analysis
-    - /classify-plant : Plant classification (sugarcane/weed)
-    - /generate-infographic : Async infographic generation
+    - /analyze-image : Plant classification and crop disease analysis in one model call
+    - /scan-image : Crop disease analysis (view of /analyze-image)
+    - /classify-plant : Plant classification, sugarcane/weed (view of /analyze-image)
+    - /generate-infographic : Queue an infographic job (202 with job id)
+    - /infographic-jobs/<id> : Infographic job status (JSON; SSE at /events, capped
+      at a few seconds per connection here, long-lived in the async app)
     - /webhook : Alternative chat endpoint for webhooks
+    - /health : Liveness (process up) plus stats
+    - /ready : Readiness (503 until the background knowledge base sync is done)
 
 Author: Shashank Tamaskar
 Version: 2.0
@@ -36,23 +41,29 @@ from __future__ import annotations
 import json
 import logging
 import os
+import posixpath
 import re
-from io import BytesIO
-from typing import Optional
+from typing import Any, NamedTuple, Optional, Tuple
 
 # Third-party imports
 from dotenv import load_dotenv
-from flask import Flask, jsonify, request, send_from_directory
+from flask import Flask, Response, jsonify, request, stream_with_context
 from flask_cors import CORS
-from PIL import Image
+from werkzeug.security import safe_join
 from werkzeug.utils import secure_filename
 
 # Google Gemini AI imports
-from google import genai
 from google.genai import types
 
 # Local application imports
 import ai_services
+import image_preprocess
+import image_variants
+from kb_warmup import WARMUP
+from static_delivery import IMMUTABLE, send_fingerprinted, send_html, send_static
+from uploads_retention import RETENTION
+from infographic_jobs import JOBS, QueueFullError
+from gemini_client import create_client, operation_config, pool_stats
 
 # Load environment variables from .env file
 load_dotenv()
@@ -70,7 +81,9 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-app = Flask(__name__)
+# Static assets are served by static_asset() with fingerprinted caching
+app = Flask(__name__, static_folder=None)
+STATIC_FOLDER = os.path.join(app.root_path, 'static')
 CORS(app)
 
 # ============================================================================
@@ -79,7 +92,6 @@ CORS(app)
 app.config['UPLOAD_FOLDER'] = 'uploads'
 app.config['MAX_CONTENT_LENGTH'] = 50 * 1024 * 1024  # 50MB
 ALLOWED_EXTENSIONS = {'pdf', 'txt', 'doc', 'docx', 'jpg', 'jpeg', 'png'}
-IMAGE_EXTENSIONS = {'jpg', 'jpeg', 'png'}
 
 AGRICULTURAL_INSTRUCTIONS = {
     'english': (
@@ -98,7 +110,7 @@ client = None
 # Initialize Gemini client
 if api_key:
     try:
-        client = genai.Client(api_key=api_key)
+        client = create_client(api_key)
         logger.info('✅ Initialized Gemini client')
         # Initialize ai_services with client and app
         ai_services.set_client_and_app(client, app, app.config['UPLOAD_FOLDER'])
@@ -118,14 +130,408 @@ def allowed_file(filename: str) -> bool:
     """Check if file extension is allowed for upload."""
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+# ----------------------------------------------------------------------------
+# Image analysis prompt/parse helpers (shared with the native ASGI app in asgi.py)
+# ----------------------------------------------------------------------------
+
+SCAN_RETRY_SUFFIX = '\nRe-check subtle early-stage issues; add at least one recommendation if appropriate. Do NOT invent diseases.'
+
+def build_analysis_prompt(instruction: str, user_prompt: str) -> str:
+    """Build the combined classification + crop-disease prompt for /analyze-image."""
+    guidance = f"User focus: '{user_prompt}'\n" if user_prompt else ''
+    return (
+        f"{instruction}\n\n"
+        "Labelled reference images are followed by the QUERY IMAGE. Analyze ONLY the query image "
+        "and output ONLY JSON.\n"
+        f"{guidance}"
+        "Schema: {\n"
+        "  \"classification\": {\n"
+        "    \"classification\": \"sugarcane|weed|unknown\",\n"
+        "    \"confidence\": <float 0-1>,\n"
+        "    \"plant_type\": \"specific name if identifiable\",\n"
+        "    \"details\": \"brief classification reasoning\",\n"
+        "    \"characteristics\": \"key visual traits\",\n"
+        "    \"recommendation\": \"weed removal or sugarcane care advice\"\n"
+        "  },\n"
+        "  \"scan\": {\n"
+        "    \"summary\": \"1-2 sentence overview\",\n"
+        "    \"diagnosis\": [\"diseases/pests or 'None detected'\"],\n"
+        "    \"severity\": \"mild|moderate|severe|unknown\",\n"
+        "    \"recommendations\": [\"actionable treatment steps\"],\n"
+        "    \"preventive_measures\": [\"future prevention\"],\n"
+        "    \"confidence\": \"high|medium|low\",\n"
+        "    \"uncertainty_notes\": \"explain uncertainty\"\n"
+        "  }\n"
+        "}\nRules: no markdown, target language, use 'None detected' if healthy. "
+        "Classify strictly as ONE of sugarcane, weed, unknown: stalk with segmented joints + long leaves -> "
+        "sugarcane; any other plant growth among cane -> weed; unclear -> unknown."
+    )
+
+def analysis_contents(prompt: str, image_bytes: bytes, mime_type: str) -> list:
+    """Model contents for an image analysis: prompt, reference images, then the query image."""
+    parts = [types.Part(text=prompt)]
+    for r in ai_services.load_reference_images('sugarcane'):
+        parts.append(ai_services.REFERENCE_IMAGES.as_part(r))
+        parts.append(types.Part(text=f'[Reference Sugarcane {r["filename"]}]'))
+    for r in ai_services.load_reference_images('weeds'):
+        parts.append(ai_services.REFERENCE_IMAGES.as_part(r))
+        parts.append(types.Part(text=f'[Reference Weed {r["filename"]}]'))
+    parts.append(types.Part(text='[QUERY IMAGE]'))
+    parts.append(types.Part(inline_data=types.Blob(mime_type=mime_type, data=image_bytes)))
+    return [types.Content(parts=parts)]
+
+def analysis_config(store_name: str):
+    """Request config for the analysis call: grounded on the knowledge base File Search store."""
+    return operation_config('chat', types.GenerateContentConfig(
+        tools=[types.Tool(file_search=types.FileSearch(file_search_store_names=[store_name]))]
+    ))
+
+def normalize_scan_result(data: Optional[dict], raw_text: str = '') -> dict:
+    """Fill the /scan-image schema from the parsed 'scan' object, with defaults."""
+    if not isinstance(data, dict):
+        first_line = raw_text.split('\n')[0][:180]
+        data = {
+            'summary': first_line or 'Analysis unavailable',
+            'diagnosis': ['None detected'],
+            'severity': 'unknown',
+            'recommendations': [],
+            'preventive_measures': [],
+            'confidence': 'medium',
+            'uncertainty_notes': ''
+        }
+    def to_list(v):
+        if isinstance(v, list): return v
+        if isinstance(v, str) and v.strip(): return [v.strip()]
+        return []
+    data['diagnosis'] = to_list(data.get('diagnosis')) or ['None detected']
+    data['recommendations'] = to_list(data.get('recommendations'))
+    data['preventive_measures'] = to_list(data.get('preventive_measures'))
+    for k, default in {'summary': 'Analysis unavailable', 'severity': 'unknown', 'confidence': 'medium', 'uncertainty_notes': ''}.items():
+        data.setdefault(k, default)
+    return data
+
+def is_barren_scan(data: dict) -> bool:
+    """True when a scan found nothing and offered no advice (worth one retry)."""
+    return (len(data['diagnosis']) == 1 and data['diagnosis'][0].lower().startswith('none')
+            and not data['recommendations'] and not data['preventive_measures'])
+
+def normalize_classification(data: Optional[dict], raw_text: str = '') -> dict:
+    """The parsed 'classification' object, or an 'unknown' result when it is missing."""
+    if isinstance(data, dict) and data.get('classification'):
+        return data
+    return {
+        'classification': 'unknown',
+        'confidence': 0.5,
+        'plant_type': 'Unknown',
+        'details': raw_text,
+        'characteristics': 'Parsing failed',
+        'recommendation': 'Retry with clearer image'
+    }
+
+def parse_analysis(raw_text: str) -> dict:
+    """Split the combined model output into normalized 'classification' and 'scan' results."""
+    m = re.search(r'```(?:json)?\s*(\{.*\})\s*```', raw_text, re.DOTALL)
+    candidate = m.group(1) if m else raw_text.strip()
+    try:
+        parsed = ai_services.parse_json_from_text(candidate) or {}
+    except Exception:
+        parsed = {}
+    return {
+        'classification': normalize_classification(parsed.get('classification'), raw_text),
+        'scan': normalize_scan_result(parsed.get('scan'), raw_text),
+    }
+
+_INFOGRAPHIC_KEYS = ('infographic_url', 'infographic_reason')
+
+def analysis_view(merged: dict, route: str) -> dict:
+    """
+    Shape a merged /analyze-image result as one of the legacy endpoint responses.
+
+    Args:
+        merged: Result of the combined analysis (classification, scan, raw_text, ...)
+        route: 'analyze-image' (returned as is), 'scan-image' or 'classify-plant'
+
+    Returns:
+        Response payload in that endpoint's original schema
+    """
+    if route == 'analyze-image':
+        return merged
+    extra = {k: merged[k] for k in _INFOGRAPHIC_KEYS if k in merged}
+    if route == 'classify-plant':
+        return {'success': True, **merged['classification'], 'raw_response': merged['raw_text'], **extra}
+    return {**merged['scan'], 'prompt_used': merged['prompt_used'], 'raw_text': merged['raw_text'], **extra}
+
+def wants_stream() -> bool:
+    """Check if the client asked for a Server-Sent Events response instead of JSON."""
+    if 'text/event-stream' in (request.headers.get('Accept') or ''):
+        return True
+    if request.args.get('stream', '').lower() in ('1', 'true'):
+        return True
+    body = request.get_json(force=True, silent=True) or {}
+    return bool(body.get('stream', False))
+
+def requested_retrieval(body: dict) -> Optional[str]:
+    """Per-request retrieval override ('file_search' or 'local'), if valid."""
+    mode = str(body.get('retrieval') or '').lower()
+    return mode if mode in ai_services.RETRIEVAL_MODES else None
+
+# ----------------------------------------------------------------------------
+# Route logic shared with the native ASGI app (asgi.py). Helpers marked
+# blocking touch SQLite or take locks: asgi.py runs them with asyncio.to_thread.
+# ----------------------------------------------------------------------------
+
+def cache_bypass_requested(no_cache: Any, cache_control: Optional[str]) -> bool:
+    """
+    Whether the client asked to skip the answer or scan cache.
+
+    Args:
+        no_cache: The request's `no_cache` field (JSON bool, or '1'/'true' from a form)
+        cache_control: The Cache-Control request header
+    """
+    if isinstance(no_cache, str):
+        no_cache = no_cache.lower() in ('1', 'true')
+    return bool(no_cache) or 'no-cache' in (cache_control or '')
+
+class AskRequest(NamedTuple):
+    question: str
+    lang: str
+    # Instruction + question sent to the model
+    contents: str
+    bypass_cache: bool
+    # Resolved retrieval mode ('file_search' or 'local'); the answer cache is partitioned by it
+    retrieval: str
+
+# Fields of every /ask answer besides the text: text first, infographics on request (button)
+ASK_METADATA = {'response_format': 'text', 'can_generate_infographic': True, 'infographic_pending': False}
+
+def parse_ask_request(body: Optional[dict], cache_control: Optional[str]):
+    """
+    Validate an /ask body.
+
+    Returns:
+        (AskRequest, None), or (None, error message) for a 400 response
+    """
+    if not body:
+        return None, 'JSON body required'
+    question = (body.get('question', '') or '').strip()
+    if not question:
+        return None, 'Question cannot be empty'
+    lang = body.get('language', 'english').lower()
+    instruction = AGRICULTURAL_INSTRUCTIONS.get(lang, AGRICULTURAL_INSTRUCTIONS['english'])
+    return AskRequest(
+        question=question,
+        lang=lang,
+        contents=f'{instruction}\n\nUser Question: {question}',
+        bypass_cache=cache_bypass_requested(body.get('no_cache', False), cache_control),
+        retrieval=ai_services.retrieval_mode(requested_retrieval(body)),
+    ), None
+
+def lookup_answer(ask: AskRequest) -> Tuple[str, Optional[dict]]:
+    """
+    Answer cache lookup for an /ask request (blocking).
+
+    Returns:
+        (knowledge base version to store the answer under, cached response or None)
+    """
+    kb_version = ai_services.knowledge_base_version()
+    cached = ai_services.ANSWER_CACHE.get(ask.question, ask.lang, kb_version,
+                                          bypass=ask.bypass_cache, retrieval=ask.retrieval)
+    if cached is None:
+        return kb_version, None
+    logger.info(f"⚡ Answer cache {cached['match']} hit (similarity: {cached['similarity']:.2f})")
+    return kb_version, {**cached['value'], 'cached': True}
+
+def store_answer(ask: AskRequest, kb_version: str, result: dict):
+    """Cache a finished /ask answer (blocking)."""
+    ai_services.ANSWER_CACHE.put(ask.question, ask.lang, kb_version, result, retrieval=ask.retrieval)
+
+def attach_suggested_format(result: dict, classification_future):
+    """Add the background classifier's format suggestion to an answer if it finished in time."""
+    classification = ai_services.collect_query_classification(classification_future)
+    if classification:
+        result['suggested_format'] = classification.get('format', 'text')
+        logger.info(f"   ✓ Suggested format: {result['suggested_format'].upper()} "
+                    f"(confidence: {classification.get('confidence', 0.5):.2f}, "
+                    f"reason: {classification.get('reason', 'N/A')})")
+
+class InfographicRequest(NamedTuple):
+    question: str
+    content: str
+    lang: str
+    # Explicit user request: skips the cache lookup and the cooldown
+    force: bool
+
+INFOGRAPHIC_QUEUE_FULL = {'error': 'Too many infographics are being generated, try again shortly',
+                          'success': False, 'reason': 'queue_full'}
+
+def parse_infographic_request(body: Optional[dict]):
+    """
+    Validate a /generate-infographic body.
+
+    Returns:
+        (InfographicRequest, None), or (None, error message) for a 400 response
+    """
+    if not body:
+        return None, 'JSON body required'
+    question = (body.get('question', '') or '').strip()
+    if not question:
+        return None, 'Question cannot be empty'
+    return InfographicRequest(
+        question=question,
+        content=(body.get('content', '') or '').strip(),
+        lang=body.get('language', 'english').lower(),
+        force=bool(body.get('force', False)),
+    ), None
+
+def infographic_shortcut(req: InfographicRequest) -> Optional[Tuple[dict, int]]:
+    """
+    Answer an infographic request without queueing a job, when possible (blocking).
+
+    Returns:
+        (payload, 200) from the infographic cache, (payload, 429) while the
+        topic is on cooldown, or None when a job should be queued
+    """
+    # A forced request regenerates, replacing a bad cached image
+    cached = None if req.force else ai_services.cached_infographic(req.question, req.content, req.lang)
+    if cached:
+        logger.info(f"♻️ Infographic served from cache: {cached}")
+        return {'infographic_url': f'/uploads/{cached}', 'infographic_language': req.lang,
+                'state': 'succeeded', 'cached': True, 'success': True}, 200
+
+    # If not forced, check cooldown and trigger words to avoid unnecessary API calls
+    try:
+        on_cooldown = ai_services._infographic_is_on_cooldown(req.question)
+        has_create = bool(re.search(r'\bcreate\b', req.question or '', re.IGNORECASE))
+    except Exception:
+        on_cooldown = False
+        has_create = False
+
+    if on_cooldown and not req.force and not has_create:
+        logger.info('⏳ Infographic generation skipped: cooldown active')
+        return {'error': 'Infographic generation skipped due to recent similar generation',
+                'success': False, 'reason': 'cooldown'}, 429
+    return None
+
+def preprocess_error(e: Exception) -> Tuple[dict, int]:
+    """Response payload and status for an image_preprocess failure."""
+    if isinstance(e, image_preprocess.ImageTooLargeError):
+        return {'error': 'Image too large'}, 413
+    if isinstance(e, image_preprocess.InvalidImageError):
+        return {'error': 'Invalid image file'}, 400
+    logger.warning(f'⚠️ Image preprocessing unavailable: {e}')
+    return {'error': 'Image processing is busy, please try again'}, 503
+
+class AnalysisStart(NamedTuple):
+    kb_version: str
+    # Scan cache hit (merged result with cached=True), or None
+    cached: Optional[dict]
+    prompt: str
+
+def begin_analysis(prepared, lang: str, user_prompt: str, route: str, bypass_cache: bool = False) -> AnalysisStart:
+    """
+    Scan cache lookup and model prompt for an image analysis (blocking).
+
+    A (near-)duplicate of a recently analyzed image with the same prompt and
+    language is answered from the scan cache.
+    """
+    kb_version = ai_services.knowledge_base_version()
+    cached = ai_services.SCAN_CACHE.get(prepared.dhash, user_prompt, lang, kb_version, bypass=bypass_cache)
+    if cached is not None:
+        logger.info(f"⚡ Scan cache {cached['match']} hit in {route} (distance: {cached['distance']})")
+        cached = {**cached['value'], 'cached': True}
+    instruction = AGRICULTURAL_INSTRUCTIONS.get(lang, AGRICULTURAL_INSTRUCTIONS['english'])
+    return AnalysisStart(kb_version, cached, build_analysis_prompt(instruction, user_prompt))
+
+def analysis_retry_prompt(result: dict, prompt: str, user_prompt: str) -> Optional[str]:
+    """Prompt for one more model call when a user-focused scan came back empty, else None."""
+    if is_barren_scan(result['scan']) and user_prompt:
+        logger.info('Retrying barren analysis once due to user-specific prompt')
+        return prompt + SCAN_RETRY_SUFFIX
+    return None
+
+def merge_analysis_retry(raw_text: str, result: dict, retry_text: Optional[str]) -> Tuple[str, dict]:
+    """(raw_text, result) of the retry when it produced a new, substantial answer, else the original."""
+    if retry_text and retry_text != raw_text and len(retry_text) > 50:
+        return retry_text, parse_analysis(retry_text)
+    return raw_text, result
+
+def analysis_infographic(out: dict, user_prompt: str) -> Optional[Tuple[str, dict]]:
+    """(payload, decision) when an analysis result warrants a follow-up infographic, else None."""
+    # Pass user_prompt as original_question to check for showcase triggers
+    payload = json.dumps(out, ensure_ascii=False)
+    decision = ai_services.decide_make_infographic(payload, original_question=user_prompt)
+    return (payload, decision) if decision.get('make') else None
+
+def attach_infographic(out: dict, decision: dict, image_path: Optional[str]):
+    """Add a generated infographic to an analysis result."""
+    if image_path:
+        out['infographic_url'] = f'/uploads/{image_path}'
+        out['infographic_reason'] = decision.get('reason')
+
+def sse_event(event: str, payload: dict) -> str:
+    """Format a single Server-Sent Events frame with a JSON payload."""
+    return f"event: {event}\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+def stream_rag_response(contents: str, metadata: dict, on_complete=None,
+                        question: str = '', retrieval: Optional[str] = None) -> Response:
+    """
+    Stream a RAG answer to the browser as Server-Sent Events.
+    
+    Emits one `token` event per generated chunk, then a final `done` event that
+    carries the same fields the JSON variant of the route returns (the full
+    `response` text plus `metadata`). Failures emit a single `error` event.
+    
+    Args:
+        contents: Prompt passed to ai_services.stream_rag_answer()
+        metadata: Extra fields for the final `done` event
+        on_complete: Optional callback receiving the final payload (e.g. to cache it)
+        question: The user's question (query for local retrieval)
+        retrieval: Optional retrieval mode override
+    """
+    def generate():
+        # Comment frame so headers and the first byte leave immediately
+        yield ': stream open\n\n'
+        parts = []
+        try:
+            for text in ai_services.stream_rag_answer(contents, question=question, retrieval=retrieval):
+                parts.append(text)
+                yield sse_event('token', {'text': text})
+        except Exception as e:
+            logger.error(f'Streaming generation failed: {e}')
+            yield sse_event('error', {'error': 'Failed to process question'})
+            return
+        final = {'response': ''.join(parts) or 'No answer', **metadata}
+        if on_complete is not None:
+            try:
+                on_complete(final)
+            except Exception as e:
+                logger.warning(f'Stream completion hook failed: {e}')
+        yield sse_event('done', final)
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
 # ============================================================================
 # Routes
 # ============================================================================
 
 @app.route('/')
 def index():
-    """Serve main app."""
-    return send_from_directory('templates', 'index.html')
+    """
+    Serve main app with content-hash asset URLs (revalidated via ETag), asking
+    the browser for the width client hints used by /uploads.
+    """
+    response = send_html(os.path.join(app.root_path, 'templates', 'index.html'), STATIC_FOLDER)
+    response.headers['Accept-CH'] = image_variants.ACCEPT_CH
+    return response
+
+@app.route('/static/<path:filename>')
+def static_asset(filename):
+    """Serve UI assets: immutable for a year when requested with their current ?v= hash."""
+    return send_fingerprinted(STATIC_FOLDER, filename)
 
 @app.route('/_template_info')
 def _template_info():
@@ -139,26 +545,103 @@ def _template_info():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.before_request
-def initialize_on_first_request():
-    """Initialize the knowledge base on the first request."""
+def ensure_knowledge_base_initialized():
+    """
+    Start the background knowledge base warmup and the uploads retention
+    collector once per process (shared by Flask and the ASGI app).
+    """
+    RETENTION.start()
     global _KB_INITIALIZED
     if not _KB_INITIALIZED and client is not None:
         _KB_INITIALIZED = True
-        logger.info("🚀 First request detected - initializing knowledge base...")
-        ai_services.initialize_knowledge_base()
+        logger.info("🚀 Starting background knowledge base warmup...")
+        WARMUP.start()
+
+@app.before_request
+def initialize_on_first_request():
+    """Kick off the knowledge base warmup on the first request (does not wait for it)."""
+    ensure_knowledge_base_initialized()
 
 @app.route('/health')
 def health():
-    """Health check endpoint."""
+    """Liveness check: the process is up. Readiness is reported separately (see /ready)."""
     if not api_key:
         return jsonify({'status': 'unhealthy', 'error': 'GOOGLE_API_KEY missing'}), 500
-    return jsonify({'status': 'healthy'}), 200
+    return jsonify({
+        'status': 'healthy',
+        'live': True,
+        'ready': WARMUP.ready,
+        'answer_cache': ai_services.ANSWER_CACHE.stats(),
+        'scan_cache': ai_services.SCAN_CACHE.stats(),
+        'plant_classifier': ai_services.PLANT_CLASSIFIER.stats(),
+        'single_flight': ai_services.single_flight_stats(),
+        'retrieval': ai_services.retrieval_stats(),
+        'gemini_pool': pool_stats(),
+        'upload_manifest': ai_services.upload_manifest_stats(),
+        'infographic_cooldown': ai_services.cooldown_stats(),
+        'infographic_jobs': JOBS.stats(),
+        'infographic_cache': ai_services.infographic_cache_stats(),
+        'image_variants': image_variants.stats(),
+        'image_preprocess': image_preprocess.stats(),
+        'uploads_retention': RETENTION.stats(),
+        'reference_images': ai_services.REFERENCE_IMAGES.stats()
+    }), 200
+
+@app.route('/ready')
+def ready():
+    """Readiness check: 200 once the knowledge base is synced, 503 with progress until then."""
+    status = WARMUP.status()
+    return jsonify(status), 200 if status['ready'] else 503
 
 @app.route('/uploads/<path:filename>')
 def serve_upload(filename):
-    """Serve uploaded files including generated infographics."""
-    return send_from_directory(app.config['UPLOAD_FOLDER'], filename)
+    """
+    Serve uploaded files including generated infographics.
+    
+    Only generated infographics and user documents (ALLOWED_EXTENSIONS, top
+    level) are served; state databases live in ai_services.DATA_FOLDER.
+    
+    Every file gets a strong ETag and Last-Modified (304s), Range support and
+    precompressed siblings (see static_delivery.py); user uploads revalidate.
+    Generated infographics are content-negotiated once their variants exist:
+    the smallest WebP/JPEG derivative that covers the client-hinted width is
+    served (see image_variants.negotiate()). `?variant=placeholder` returns
+    the tiny preview and `?original=1` the model's original bytes.
+    """
+    folder = app.config['UPLOAD_FOLDER']
+    # Resolve '.' and '..' first so the checks below and the retention record
+    # see the path that is actually served
+    filename = posixpath.normpath(filename)
+    if not filename.startswith('generated_infographics/'):
+        # Only user documents; anything else (e.g. a stray state database) stays private
+        if '/' in filename or filename.startswith('.') or not allowed_file(filename):
+            return jsonify({'error': 'File not found'}), 404
+        return send_static(folder, filename)
+    if request.args.get('original'):
+        response = send_static(folder, filename, immutable=True)
+        RETENTION.touch(filename)
+        return response
+
+    path = safe_join(folder, filename)
+    want_placeholder = request.args.get('variant') == 'placeholder'
+    variant = image_variants.negotiate(
+        path, request.headers.get('Accept', ''),
+        width=image_variants.requested_width(request.headers, request.args),
+        placeholder=want_placeholder,
+    ) if path else None
+    if variant is None and want_placeholder:
+        return jsonify({'error': 'Placeholder not available yet'}), 404
+    # Infographic names are content hashes, so a negotiated response never
+    # changes; before the variants exist the original is only cached briefly
+    # so the client picks up a smaller variant later
+    response = send_static(
+        folder, posixpath.join(posixpath.dirname(filename), variant) if variant else filename,
+        cache_control=IMMUTABLE if variant else 'public, max-age=60',
+    )
+    response.headers['Vary'] = image_variants.VARY_HEADERS
+    # send_static raises NotFound for missing files, so only served images count as accessed
+    RETENTION.touch(filename)
+    return response
 
 @app.route('/upload', methods=['POST'])
 def upload():
@@ -198,46 +681,57 @@ def ask():
     Infographics are generated in the user's selected language.
     Response always includes text; visual responses also include infographic_url.
     """
-    if not request.json:
-        return jsonify({'error': 'JSON body required'}), 400
-    question = (request.json.get('question', '') or '').strip()
-    lang = request.json.get('language', 'english').lower()
-    if not question:
-        return jsonify({'error': 'Question cannot be empty'}), 400
+    # Clients can skip the answer cache with {"no_cache": true} or Cache-Control: no-cache
+    ask, error = parse_ask_request(request.json, request.headers.get('Cache-Control'))
+    if error:
+        return jsonify({'error': error}), 400
+    question, lang = ask.question, ask.lang
 
     logger.info(f"\n{'='*80}")
     logger.info(f"📝 NEW QUESTION RECEIVED: '{question}'")
     logger.info(f"🌍 Language: {lang}")
     logger.info(f"{'='*80}")
 
-    instruction = AGRICULTURAL_INSTRUCTIONS.get(lang, AGRICULTURAL_INSTRUCTIONS['english'])
+    stream = wants_stream()
     
     try:
-        # ========== STEP 1: Classify query type ==========
-        logger.info("🔍 [STEP 1] Classifying query type...")
-        classification = ai_services.classify_query_type(question)
-        response_format = classification.get('format', 'text')
-        confidence = classification.get('confidence', 0.5)
-        
-        logger.info(f"   ✓ Format: {response_format.upper()}")
-        logger.info(f"   ✓ Confidence: {confidence:.2f}")
-        logger.info(f"   ✓ Reason: {classification.get('reason', 'N/A')}")
-        
+        # ========== STEP 0: Answer cache lookup ==========
+        kb_version, cached = lookup_answer(ask)
+        if cached is not None:
+            if stream:
+                return Response(
+                    sse_event('token', {'text': cached['response']}) + sse_event('done', cached),
+                    mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache'}
+                )
+            return jsonify(cached), 200
+
+        # ========== STEP 1: Classify query type (in background) ==========
+        # Runs concurrently with answer generation; joined only if it finished first
+        logger.info("🔍 [STEP 1] Classifying query type in background...")
+        classification_future = ai_services.start_query_classification(question)
+
         # ========== STEP 2: Generate text response with RAG ==========
         logger.info("🤖 [STEP 2] Generating text response with RAG...")
-        store = ai_services.ensure_file_search_store()
-        
-        model_name = 'gemini-2.5-flash-lite'
-        resp = client.models.generate_content(
-            model=model_name,
-            contents=f'{instruction}\n\nUser Question: {question}',
-            config=types.GenerateContentConfig(
-                tools=[types.Tool(file_search=types.FileSearch(file_search_store_names=[store.name]))]
+        if stream:
+            logger.info("📡 [STEP 2] Streaming response as Server-Sent Events")
+
+            def _finish_stream(final: dict):
+                attach_suggested_format(final, classification_future)
+                store_answer(ask, kb_version, final)
+
+            return stream_rag_response(
+                ask.contents,
+                dict(ASK_METADATA),
+                on_complete=_finish_stream,
+                question=question,
+                retrieval=ask.retrieval
             )
-        )
+        resp = ai_services.generate_rag_answer(question, ask.contents, language=lang, retrieval=ask.retrieval)
         
         if not resp.candidates:
             logger.error("❌ No response generated from RAG call")
+            ai_services.collect_query_classification(classification_future)
             return jsonify({'error': 'No response generated'}), 500
         
         raw_text = resp.text or 'No answer'
@@ -245,12 +739,9 @@ def ask():
         
         # ========== STEP 3: Always return text, allow user to request infographic ==========
         # Users can click a button to generate infographic on demand
-        result = {
-            'response': raw_text,
-            'response_format': 'text',  # Always text first
-            'can_generate_infographic': True,  # User can request infographic via button
-            'infographic_pending': False  # Never auto-generate
-        }
+        result = {'response': raw_text, **ASK_METADATA}
+        attach_suggested_format(result, classification_future)
+        store_answer(ask, kb_version, result)
         
         logger.info(f"📝 [STEP 3] Text response ready. User can request infographic via button.")
         logger.info(f"✅ Returning text response")
@@ -266,61 +757,109 @@ def ask():
 @app.route('/generate-infographic', methods=['POST'])
 def generate_infographic():
     """
-    Generate an infographic for a given question and content.
+    Queue infographic generation for a given question and content.
     Called asynchronously by the frontend after text response is displayed.
-    """
-    if not request.json:
-        return jsonify({'error': 'JSON body required'}), 400
     
-    question = (request.json.get('question', '') or '').strip()
-    content = (request.json.get('content', '') or '').strip()
-    lang = request.json.get('language', 'english').lower()
-    force = bool(request.json.get('force', False))
-    
-    if not question:
-        return jsonify({'error': 'Question cannot be empty'}), 400
+    An equivalent request that was generated before is answered from the
+    infographic cache with 200 and `infographic_url` directly. Otherwise
+    returns 202 with the job (id, state, status_url) immediately; the image
+    is generated by the infographic job pool. Clients poll
+    /infographic-jobs/<id> and read `infographic_url` once the job has
+    succeeded. Only the async app (asgi.py) adds `events_url`: an SSE stream
+    there costs no thread, here it would hold a request thread.
+    """
+    req, error = parse_infographic_request(request.json)
+    if error:
+        return jsonify({'error': error}), 400
 
-    logger.info(f"🎨 Generating infographic for: '{question[:50]}...' in {lang}")
+    logger.info(f"🎨 Queueing infographic for: '{req.question[:50]}...' in {req.lang}")
     
     try:
-        # If not forced, check cooldown and trigger words to avoid unnecessary API calls
-        try:
-            on_cooldown = ai_services._infographic_is_on_cooldown(question)
-            has_create = bool(re.search(r'\bcreate\b', question or '', re.IGNORECASE))
-        except Exception:
-            on_cooldown = False
-            has_create = False
-
-        if on_cooldown and not force and not has_create:
-            logger.info('⏳ Infographic generation skipped: cooldown active')
-            return jsonify({'error': 'Infographic generation skipped due to recent similar generation', 'success': False, 'reason': 'cooldown'}), 429
-
-        image_path = ai_services.generate_infographic_image(
-            content=content,
-            topic=question,
-            language=lang,
-            force=force
-        )
-        
-        if image_path:
-            logger.info(f"✅ Infographic generated: {image_path}")
-            return jsonify({
-                'infographic_url': f'/uploads/{image_path}',
-                'infographic_language': lang,
-                'success': True
-            }), 200
-        else:
-            logger.warning("⚠️ Infographic generation returned None")
-            return jsonify({
-                'error': 'Infographic generation failed',
-                'success': False
-            }), 500
-            
+        shortcut = infographic_shortcut(req)
+        if shortcut is not None:
+            return jsonify(shortcut[0]), shortcut[1]
+
+        job = JOBS.submit(req.question, req.content, language=req.lang, force=req.force)
+        return jsonify(infographic_job_response(job)), 202
+
+    except QueueFullError as e:
+        logger.warning(f'⚠️ Infographic queue full: {e}')
+        return jsonify(INFOGRAPHIC_QUEUE_FULL), 503, {'Retry-After': '30'}
     except Exception as e:
         logger.error(f'/generate-infographic error: {e}')
         return jsonify({'error': str(e), 'success': False}), 500
 
 
+# An SSE connection under WSGI holds a request thread: end it after this long
+# and let EventSource reconnect (the async app streams until the job finishes)
+WSGI_JOB_EVENTS_SECONDS = 5.0
+WSGI_JOB_EVENTS_RETRY_MS = 2000
+
+
+def infographic_job_response(job: dict, events: bool = False) -> dict:
+    """
+    Public job payload: the job plus its status URL and the legacy result fields.
+
+    Args:
+        job: Job dict from JOBS
+        events: Also advertise the SSE `events_url` (only the async app does)
+    """
+    out = dict(job)
+    out['job_id'] = job['id']
+    out['status_url'] = f"/infographic-jobs/{job['id']}"
+    if events:
+        out['events_url'] = f"/infographic-jobs/{job['id']}/events"
+    out['success'] = job['state'] != 'failed'
+    if job['state'] == 'succeeded':
+        out['infographic_language'] = job['language']
+    return out
+
+
+@app.route('/infographic-jobs/<job_id>')
+def infographic_job_status(job_id):
+    """Current state of an infographic job (includes `infographic_url` once succeeded)."""
+    job = JOBS.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown infographic job', 'success': False}), 404
+    return jsonify(infographic_job_response(job)), 200
+
+
+@app.route('/infographic-jobs/<job_id>/events')
+def infographic_job_events(job_id):
+    """
+    Follow an infographic job as Server-Sent Events.
+    
+    Emits a `status` event whenever the job's state or queue position changes,
+    then a final `done` (succeeded) or `error` (failed or unknown) event. A
+    request thread is held for at most WSGI_JOB_EVENTS_SECONDS: an unfinished
+    job ends the stream with a `retry` hint and EventSource reconnects.
+    """
+    if JOBS.get(job_id) is None:
+        return jsonify({'error': 'Unknown infographic job', 'success': False}), 404
+
+    def generate():
+        job = None
+        for job in JOBS.watch(job_id, timeout=WSGI_JOB_EVENTS_SECONDS):
+            payload = infographic_job_response(job)
+            if job['state'] == 'succeeded':
+                yield sse_event('done', payload)
+                return
+            if job['state'] == 'failed':
+                yield sse_event('error', payload)
+                return
+            yield sse_event('status', payload)
+        if job is None:
+            yield sse_event('error', {'job_id': job_id, 'success': False, 'error': 'Unknown infographic job'})
+            return
+        yield f'retry: {WSGI_JOB_EVENTS_RETRY_MS}\n\n'
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+    )
+
+
 @app.route('/get-text-version', methods=['POST'])
 def get_text_version():
     """
@@ -338,16 +877,14 @@ def get_text_version():
     logger.info(f"📝 Text version requested for: '{question[:50]}...'")
     
     instruction = AGRICULTURAL_INSTRUCTIONS.get(lang, AGRICULTURAL_INSTRUCTIONS['english'])
+    contents = f'{instruction}\n\nUser Question: {question}'
     
     try:
-        store = ai_services.ensure_file_search_store()
-        resp = client.models.generate_content(
-            model='gemini-2.5-flash-lite',
-            contents=f'{instruction}\n\nUser Question: {question}',
-            config=types.GenerateContentConfig(
-                tools=[types.Tool(file_search=types.FileSearch(file_search_store_names=[store.name]))]
-            )
-        )
+        if wants_stream():
+            return stream_rag_response(contents, {'response_format': 'text', 'is_fallback': True},
+                                       question=question, retrieval=requested_retrieval(request.json))
+        resp = ai_services.generate_rag_answer(question, contents, language=lang,
+                                               retrieval=requested_retrieval(request.json))
         
         if not resp.candidates:
             return jsonify({'error': 'No response generated'}), 500
@@ -362,187 +899,123 @@ def get_text_version():
         logger.error(f'/get-text-version error: {e}')
         return jsonify({'error': 'Failed to get text version'}), 500
 
-@app.route('/scan-image', methods=['POST'])
-def scan_image():
-    """Analyze agricultural crop images."""
-    if 'file' not in request.files:
-        return jsonify({'error': 'No image file provided'}), 400
-    image_file = request.files['file']
+def read_image_upload(*fields: str):
+    """
+    Read and preprocess the uploaded image from the first form field present.
+
+    Returns:
+        (PreparedImage, None), or (None, (error response, status)) for a bad upload
+    """
+    image_file = next((request.files[f] for f in fields if f in request.files), None)
+    if image_file is None:
+        return None, (jsonify({'error': 'No image file provided'}), 400)
     if image_file.filename == '':
-        return jsonify({'error': 'Empty filename'}), 400
-    ext = image_file.filename.rsplit('.', 1)[-1].lower()
-    if ext not in IMAGE_EXTENSIONS:
-        return jsonify({'error': f'Unsupported type {ext}'}), 400
-    lang = request.form.get('language', 'english').lower()
-    user_prompt = (request.form.get('prompt', '') or '').strip()
-    instruction = AGRICULTURAL_INSTRUCTIONS.get(lang, AGRICULTURAL_INSTRUCTIONS['english'])
+        return None, (jsonify({'error': 'Empty filename'}), 400)
     img_bytes = image_file.read()
     if not img_bytes:
-        return jsonify({'error': 'Empty image data'}), 400
-    guidance = f"User focus: '{user_prompt}'\n" if user_prompt else ''
-    prompt = (
-        f"{instruction}\n\n"
-        "Analyze the agricultural crop image and output ONLY JSON.\n"
-        f"{guidance}"
-        "Schema: {\n"
-        "  \"summary\": \"1-2 sentence overview\",\n"
-        "  \"diagnosis\": [\"diseases/pests or 'None detected'\"],\n"
-        "  \"severity\": \"mild|moderate|severe|unknown\",\n"
-        "  \"recommendations\": [\"actionable treatment steps\"],\n"
-        "  \"preventive_measures\": [\"future prevention\"],\n"
-        "  \"confidence\": \"high|medium|low\",\n"
-        "  \"uncertainty_notes\": \"explain uncertainty\"\n"
-        "}\nRules: no markdown, target language, use 'None detected' if healthy."
-    )
+        return None, (jsonify({'error': 'Empty image data'}), 400)
     try:
-        store = ai_services.ensure_file_search_store()
-        resp = client.models.generate_content(
-            model='gemini-2.5-flash-lite',
-            contents=[types.Content(parts=[
-                types.Part(text=prompt),
-                types.Part(inline_data=types.Blob(mime_type=image_file.content_type or 'image/jpeg', data=img_bytes))
-            ])],
-            config=types.GenerateContentConfig(
-                tools=[types.Tool(file_search=types.FileSearch(file_search_store_names=[store.name]))]
-            )
-        )
-    except Exception as e:  # pragma: no cover
-        logger.error(f'Vision call failed: {e}')
-        return jsonify({'error': 'Model call failed'}), 500
+        return image_preprocess.preprocess_image(img_bytes), None
+    except (image_preprocess.InvalidImageError, image_preprocess.PreprocessUnavailableError) as e:
+        payload, status = preprocess_error(e)
+        return None, (jsonify(payload), status)
+
+def analyze_image(prepared, lang: str, user_prompt: str, route: str, bypass_cache: bool = False) -> dict:
+    """
+    Classify and diagnose an uploaded image with a single multimodal model call.
+
+    A (near-)duplicate of a recently analyzed image with the same prompt and
+    language is answered from the scan cache instead.
+
+    Args:
+        prepared: Preprocessed query image
+        lang: Response language
+        user_prompt: Optional user focus for the diagnosis
+        route: Endpoint name (for logs)
+        bypass_cache: Skip the scan cache lookup (the result is still stored)
+
+    Returns:
+        Merged result: success, classification, scan, prompt_used, raw_text
+        and, when warranted, infographic_url / infographic_reason ('cached'
+        is True for cache hits)
+
+    Raises:
+        RuntimeError: if the model returns no candidates (model call errors propagate)
+    """
+    start = begin_analysis(prepared, lang, user_prompt, route, bypass_cache)
+    if start.cached is not None:
+        return start.cached
+    store = ai_services.ensure_file_search_store()
+    resp = client.models.generate_content(
+        model='gemini-2.5-flash-lite',
+        contents=analysis_contents(start.prompt, prepared.data, prepared.mime_type),
+        config=analysis_config(store.name)
+    )
     if not resp.candidates:
-        return jsonify({'error': 'No model candidates'}), 500
+        raise RuntimeError('No model candidates')
     raw_text = resp.text or ''
-    m = re.search(r'```(?:json)?\s*(\{.*?\})\s*```', raw_text, re.DOTALL)
-    candidate = m.group(1) if m else raw_text.strip()
-    try:
-        parsed = ai_services.parse_json_from_text(candidate)
-        if parsed is not None:
-            data = parsed
-        else:
-            raise ValueError('Failed to parse JSON')
-    except Exception:
-        first_line = raw_text.split('\n')[0][:180]
-        data = { "severity": "unknown",
-            'summary': first_line or 'Analysis unavailable',
-            'diagnosis': ['None detected'],
-            'severity': 'unknown',
-            'recommendations': [],
-            'preventive_measures': [],
-            'confidence': 'medium',
-            'uncertainty_notes': ''
-        }
-    def to_list(v):
-        if isinstance(v, list): return v
-        if isinstance(v, str) and v.strip(): return [v.strip()]
-        return []
-    data['diagnosis'] = to_list(data.get('diagnosis')) or ['None detected']
-    data['recommendations'] = to_list(data.get('recommendations'))
-    data['preventive_measures'] = to_list(data.get('preventive_measures'))
-    for k, default in {'summary': 'Analysis unavailable', 'severity': 'unknown', 'confidence': 'medium', 'uncertainty_notes': ''}.items():
-        data.setdefault(k, default)
-    barren = (len(data['diagnosis']) == 1 and data['diagnosis'][0].lower().startswith('none') and not data['recommendations'] and not data['preventive_measures'])
-    if barren and user_prompt:
-        logger.info('Retrying barren analysis once due to user-specific prompt')
-        retry_prompt = prompt + '\nRe-check subtle early-stage issues; add at least one recommendation if appropriate. Do NOT invent diseases.'
+    result = parse_analysis(raw_text)
+    retry_prompt = analysis_retry_prompt(result, start.prompt, user_prompt)
+    if retry_prompt:
         try:
             retry = client.models.generate_content(
                 model='gemini-2.5-flash-lite',
-                contents=[types.Content(parts=[
-                    types.Part(text=retry_prompt),
-                    types.Part(inline_data=types.Blob(mime_type=image_file.content_type or 'image/jpeg', data=img_bytes))
-                ])]
+                contents=analysis_contents(retry_prompt, prepared.data, prepared.mime_type),
+                config=operation_config('chat')
             )
-            if retry.text and retry.text != raw_text and len(retry.text) > 50:
-                raw_text = retry.text
+            raw_text, result = merge_analysis_retry(raw_text, result, retry.text)
         except Exception as re_err:  # pragma: no cover
             logger.warning(f'Retry failed: {re_err}')
-    out = {**data, 'prompt_used': user_prompt, 'raw_text': raw_text}
+    out = {'success': True, **result, 'prompt_used': user_prompt, 'raw_text': raw_text}
     try:
-        # Pass user_prompt as original_question to check for showcase triggers
-        decision = ai_services.decide_make_infographic(json.dumps(out, ensure_ascii=False), original_question=user_prompt)
-        if decision.get('make'):
-            image_path = ai_services.generate_infographic_image(json.dumps(out, ensure_ascii=False), decision.get('style', 'simple'))
-            if image_path:
-                out['infographic_url'] = f'/uploads/{image_path}'
-                out['infographic_reason'] = decision.get('reason')
+        infographic = analysis_infographic(out, user_prompt)
+        if infographic:
+            payload, decision = infographic
+            attach_infographic(out, decision,
+                               ai_services.generate_infographic_image(payload, decision.get('style', 'simple')))
     except Exception as e:
-        logger.warning(f'Infographic generation failed in scan-image: {e}')
-    return jsonify(out), 200
+        logger.warning(f'Infographic generation failed in {route}: {e}')
+    ai_services.SCAN_CACHE.put(prepared.dhash, user_prompt, lang, start.kb_version, out)
+    return out
 
-@app.route('/classify-plant', methods=['POST'])
-def classify_plant():
-    """Classify plants from images (sugarcane, weed, or unknown)."""
+def image_analysis_response(route: str):
+    """Shared handler of /analyze-image and its legacy views /scan-image and /classify-plant."""
     if client is None:
         return jsonify({'error': 'AI unavailable'}), 503
-    if 'image' not in request.files:
-        return jsonify({'error': 'No image file provided'}), 400
-    image_file = request.files['image']
-    if image_file.filename == '':
-        return jsonify({'error': 'No selected file'}), 400
-    image_bytes = image_file.read()
-    try:
-        img = Image.open(BytesIO(image_bytes))
-        img.verify()
-    except Exception:
-        return jsonify({'error': 'Invalid image file'}), 400
-    refs_sugarcane = ai_services.load_reference_images('sugarcane')
-    refs_weeds = ai_services.load_reference_images('weeds')
-    prompt = (
-        'Classify the query image strictly as ONE of: sugarcane, weed, unknown.\n'
-        'Return JSON ONLY: {\n'
-        '  "classification": "sugarcane|weed|unknown",\n'
-        '  "confidence": <float 0-1>,\n'
-        '  "plant_type": "specific name if identifiable",\n'
-        '  "details": "brief classification reasoning",\n'
-        '  "characteristics": "key visual traits",\n'
-        '  "recommendation": "weed removal or sugarcane care advice"\n'
-        '}\nBe precise; stalk with segmented joints + long leaves -> sugarcane; any other plant growth among cane -> weed; unclear -> unknown.'
-    )
-    parts = [types.Part(text=prompt)]
-    for r in refs_sugarcane:
-        parts.append(types.Part(inline_data=types.Blob(mime_type='image/jpeg', data=r['data'])))
-        parts.append(types.Part(text=f'[Reference Sugarcane {r["filename"]}]'))
-    for r in refs_weeds:
-        parts.append(types.Part(inline_data=types.Blob(mime_type='image/jpeg', data=r['data'])))
-        parts.append(types.Part(text=f'[Reference Weed {r["filename"]}]'))
-    parts.append(types.Part(text='[QUERY IMAGE]'))
-    parts.append(types.Part(inline_data=types.Blob(mime_type=image_file.content_type or 'image/jpeg', data=image_bytes)))
-    resp = client.models.generate_content(
-        model='gemini-2.5-flash-lite',
-        contents=[types.Content(parts=parts)],
-        config=types.GenerateContentConfig(
-            # Use default settings; reasoning-level option removed for compatibility
-        )
-    )
-    raw = (resp.text or '').strip()
-    jm = re.search(r'```(?:json)?\s*(\{.*?\})\s*```', raw, re.DOTALL)
-    jtxt = jm.group(1) if jm else raw
-    try:
-        parsed = ai_services.parse_json_from_text(jtxt)
-        if parsed is not None:
-            data = parsed
-        else:
-            raise ValueError('Failed to parse JSON')
-    except Exception:
-        data = {
-            'classification': 'unknown',
-            'confidence': 0.5,
-            'plant_type': 'Unknown',
-            'details': raw,
-            'characteristics': 'Parsing failed',
-            'recommendation': 'Retry with clearer image'
-        }
-    out = {'success': True, **data, 'raw_response': raw}
+    prepared, error = read_image_upload('file', 'image')
+    if error:
+        return error
+    lang = request.form.get('language', 'english').lower()
+    user_prompt = (request.form.get('prompt', '') or '').strip()
+    # Clients can skip the scan cache with no_cache=1 or Cache-Control: no-cache
+    bypass_cache = cache_bypass_requested(request.form.get('no_cache', ''), request.headers.get('Cache-Control'))
+    # Only the classification-only view can be answered locally; /analyze-image
+    # needs the model's diagnosis anyway (see plant_classifier.py)
+    if route == 'classify-plant' and not bypass_cache:
+        local = ai_services.PLANT_CLASSIFIER.classify(prepared.data)
+        if local is not None:
+            return jsonify({'success': True, **local, 'raw_response': ''}), 200
     try:
-        decision = ai_services.decide_make_infographic(json.dumps(out, ensure_ascii=False))
-        if decision.get('make'):
-            image_path = ai_services.generate_infographic_image(json.dumps(out, ensure_ascii=False), decision.get('style', 'simple'))
-            if image_path:
-                out['infographic_url'] = f'/uploads/{image_path}'
-                out['infographic_reason'] = decision.get('reason')
-    except Exception as e:
-        logger.warning(f'Infographic generation failed in classify-plant: {e}')
-    return jsonify(out), 200
+        out = analyze_image(prepared, lang, user_prompt, route, bypass_cache=bypass_cache)
+    except Exception as e:  # pragma: no cover
+        logger.error(f'Vision call failed: {e}')
+        return jsonify({'error': 'Model call failed'}), 500
+    return jsonify(analysis_view(out, route)), 200
+
+@app.route('/analyze-image', methods=['POST'])
+def analyze_image_route():
+    """Classify (sugarcane / weed / unknown) and diagnose a crop image in one model call."""
+    return image_analysis_response('analyze-image')
+
+@app.route('/scan-image', methods=['POST'])
+def scan_image():
+    """Analyze agricultural crop images (disease view of /analyze-image)."""
+    return image_analysis_response('scan-image')
+
+@app.route('/classify-plant', methods=['POST'])
+def classify_plant():
+    """Classify plants from images (classification view of /analyze-image)."""
+    return image_analysis_response('classify-plant')
 
 @app.route('/webhook', methods=['POST'])
 def webhook():
@@ -553,15 +1026,13 @@ def webhook():
         return jsonify({'error': 'Chat text required'}), 400
     lang = data.get('language', 'english').lower()
     instruction = AGRICULTURAL_INSTRUCTIONS.get(lang, AGRICULTURAL_INSTRUCTIONS['english'])
+    contents = f'{instruction}\n\nUser Chat: {chat_text}'
     try:
-        store = ai_services.ensure_file_search_store()
-        resp = client.models.generate_content(
-            model='gemini-2.5-flash-lite',
-            contents=f'{instruction}\n\nUser Chat: {chat_text}',
-            config=types.GenerateContentConfig(
-                tools=[types.Tool(file_search=types.FileSearch(file_search_store_names=[store.name]))]
-            )
-        )
+        if wants_stream():
+            return stream_rag_response(contents, {'status': 'success'},
+                                       question=chat_text, retrieval=requested_retrieval(data))
+        resp = ai_services.generate_rag_answer(chat_text, contents, language=lang,
+                                               retrieval=requested_retrieval(data))
         if not resp.candidates:
             return jsonify({'error': 'No response'}), 500
         return jsonify({'response': resp.text or 'No answer', 'status': 'success'}), 200
@@ -1,7 +1,361 @@
+"""
+Native ASGI Application
+=======================
+
+Serves the model-bound routes as native async handlers on the Gemini client's
+`aio` surface, so an in-flight model call no longer pins a thread. Every other
+route (UI, uploads, health, text fallback) is served by the Flask app through
+the `WsgiToAsgi` adapter mounted underneath.
+
+Async routes (same request/response contracts as app.py):
+    - /ask, /webhook, /analyze-image (plus its /scan-image and /classify-plant
+      views), /generate-infographic, /infographic-jobs/<id>/events
+
+Run with:
+    uvicorn asgi:app --host 0.0.0.0 --port $PORT --workers 1
+
+Set ASGI_MODE=wsgi to serve the plain WsgiToAsgi-wrapped Flask app instead
+(useful for comparisons with scripts/benchmark_concurrency.py).
+"""
+# Standard library imports
+import asyncio
+import logging
+import os
+
+# Third-party imports
 from asgiref.wsgi import WsgiToAsgi
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.requests import Request
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Mount, Route
+
+# Local application imports
+import ai_services
+import image_preprocess
+import app as flask_module
+from gemini_client import operation_config
+from infographic_jobs import (
+    JOBS, POLL_SECONDS as INFOGRAPHIC_POLL_SECONDS, STALE_SECONDS as INFOGRAPHIC_STALE_SECONDS, QueueFullError,
+)
+from app import (
+    AGRICULTURAL_INSTRUCTIONS, ASK_METADATA, INFOGRAPHIC_QUEUE_FULL,
+    analysis_config, analysis_contents, analysis_infographic, analysis_retry_prompt, analysis_view,
+    attach_infographic, attach_suggested_format, begin_analysis, cache_bypass_requested,
+    infographic_job_response, infographic_shortcut, lookup_answer, merge_analysis_retry, parse_analysis,
+    parse_ask_request, parse_infographic_request, preprocess_error, requested_retrieval, sse_event,
+    store_answer,
+)
+
+logger = logging.getLogger(__name__)
+
+# Wrap the WSGI app with an ASGI adapter (serves all non-async routes)
+legacy_app = WsgiToAsgi(flask_module.app)
+
+_SSE_HEADERS = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+_MAX_CONTENT_LENGTH = flask_module.app.config['MAX_CONTENT_LENGTH']
+
+
+# ============================================================================
+# Helpers
+# ============================================================================
+
+async def _json_body(request: Request):
+    """Parse a JSON body; returns None when missing or malformed."""
+    try:
+        body = await request.json()
+    except Exception:
+        return None
+    return body if isinstance(body, dict) else None
+
+
+def _too_large(request: Request) -> bool:
+    """Mirror Flask's MAX_CONTENT_LENGTH check for multipart uploads."""
+    try:
+        return int(request.headers.get('content-length') or 0) > _MAX_CONTENT_LENGTH
+    except ValueError:
+        return False
+
+
+def _wants_stream(request: Request, body: dict) -> bool:
+    """Async counterpart of app.wants_stream()."""
+    if 'text/event-stream' in (request.headers.get('accept') or ''):
+        return True
+    if request.query_params.get('stream', '').lower() in ('1', 'true'):
+        return True
+    return bool(body.get('stream', False))
+
+
+def _stream_rag_response(contents: str, metadata: dict, on_complete=None,
+                         question: str = '', retrieval=None) -> StreamingResponse:
+    """Async counterpart of app.stream_rag_response() (same SSE event contract)."""
+    async def generate():
+        yield ': stream open\n\n'
+        parts = []
+        try:
+            async for text in ai_services.astream_rag_answer(contents, question=question, retrieval=retrieval):
+                parts.append(text)
+                yield sse_event('token', {'text': text})
+        except Exception as e:
+            logger.error(f'Streaming generation failed: {e}')
+            yield sse_event('error', {'error': 'Failed to process question'})
+            return
+        final = {'response': ''.join(parts) or 'No answer', **metadata}
+        if on_complete is not None:
+            try:
+                await asyncio.to_thread(on_complete, final)
+            except Exception as e:
+                logger.warning(f'Stream completion hook failed: {e}')
+        yield sse_event('done', final)
+
+    return StreamingResponse(generate(), media_type='text/event-stream', headers=_SSE_HEADERS)
+
+
+async def _attach_infographic(out: dict, route: str, original_question: str = ''):
+    """Generate a follow-up infographic for image analysis results when warranted."""
+    try:
+        infographic = analysis_infographic(out, original_question)
+        if infographic:
+            payload, decision = infographic
+            attach_infographic(out, decision, await ai_services.agenerate_infographic_image(
+                payload, decision.get('style', 'simple')))
+    except Exception as e:
+        logger.warning(f'Infographic generation failed in {route}: {e}')
+
+
+# ============================================================================
+# Routes
+# ============================================================================
+
+async def ask(request: Request):
+    """Async /ask: answer cache, background classification and RAG generation."""
+    body = await _json_body(request)
+    ask, error = parse_ask_request(body, request.headers.get('cache-control'))
+    if error:
+        return JSONResponse({'error': error}, status_code=400)
+    logger.info(f"📝 NEW QUESTION RECEIVED (async): '{ask.question}' [{ask.lang}]")
+    stream = _wants_stream(request, body)
+
+    try:
+        # The version read (manifest, store file lock) and the cache lookup block: keep them off the loop
+        kb_version, cached = await asyncio.to_thread(lookup_answer, ask)
+        if cached is not None:
+            if stream:
+                return StreamingResponse(
+                    iter([sse_event('token', {'text': cached['response']}), sse_event('done', cached)]),
+                    media_type='text/event-stream', headers=_SSE_HEADERS
+                )
+            return JSONResponse(cached)
+
+        classification_future = ai_services.start_query_classification(ask.question)
+        if stream:
+            def _finish_stream(final: dict):
+                attach_suggested_format(final, classification_future)
+                store_answer(ask, kb_version, final)
+
+            return _stream_rag_response(ask.contents, dict(ASK_METADATA), on_complete=_finish_stream,
+                                        question=ask.question, retrieval=ask.retrieval)
+
+        resp = await ai_services.agenerate_rag_answer(ask.question, ask.contents, language=ask.lang,
+                                                      retrieval=ask.retrieval)
+        if not resp.candidates:
+            logger.error("❌ No response generated from RAG call")
+            ai_services.collect_query_classification(classification_future)
+            return JSONResponse({'error': 'No response generated'}, status_code=500)
+
+        result = {'response': resp.text or 'No answer', **ASK_METADATA}
+        attach_suggested_format(result, classification_future)
+        await asyncio.to_thread(store_answer, ask, kb_version, result)
+        return JSONResponse(result)
+
+    except Exception as e:
+        logger.exception(f'/ask (async) error: {e}')
+        return JSONResponse({'error': 'Failed to process question'}, status_code=500)
+
+
+async def webhook(request: Request):
+    """Async /webhook: alternative chat endpoint."""
+    body = await _json_body(request) or {}
+    chat_text = body.get('chat') or body.get('message') or ''
+    if not chat_text:
+        return JSONResponse({'error': 'Chat text required'}, status_code=400)
+    lang = body.get('language', 'english').lower()
+    instruction = AGRICULTURAL_INSTRUCTIONS.get(lang, AGRICULTURAL_INSTRUCTIONS['english'])
+    contents = f'{instruction}\n\nUser Chat: {chat_text}'
+    try:
+        if _wants_stream(request, body):
+            return _stream_rag_response(contents, {'status': 'success'},
+                                        question=chat_text, retrieval=requested_retrieval(body))
+        resp = await ai_services.agenerate_rag_answer(chat_text, contents, language=lang,
+                                                      retrieval=requested_retrieval(body))
+        if not resp.candidates:
+            return JSONResponse({'error': 'No response'}, status_code=500)
+        return JSONResponse({'response': resp.text or 'No answer', 'status': 'success'})
+    except Exception as e:
+        logger.error(f'Webhook error: {e}')
+        return JSONResponse({'error': 'Failed'}, status_code=500)
+
+
+async def generate_infographic(request: Request):
+    """Async /generate-infographic: queue a job and return 202 with its id."""
+    req, error = parse_infographic_request(await _json_body(request))
+    if error:
+        return JSONResponse({'error': error}, status_code=400)
+
+    logger.info(f"🎨 Queueing infographic for: '{req.question[:50]}...' in {req.lang}")
+    try:
+        # Cache lookup and cooldown check read SQLite: keep them off the loop
+        shortcut = await asyncio.to_thread(infographic_shortcut, req)
+        if shortcut is not None:
+            return JSONResponse(shortcut[0], status_code=shortcut[1])
+
+        job = await asyncio.to_thread(JOBS.submit, req.question, req.content, language=req.lang, force=req.force)
+        return JSONResponse(infographic_job_response(job, events=True), status_code=202)
+    except QueueFullError as e:
+        logger.warning(f'⚠️ Infographic queue full: {e}')
+        return JSONResponse(INFOGRAPHIC_QUEUE_FULL, status_code=503, headers={'Retry-After': '30'})
+    except Exception as e:
+        logger.error(f'/generate-infographic error: {e}')
+        return JSONResponse({'error': str(e), 'success': False}, status_code=500)
+
+
+async def infographic_job_events(request: Request):
+    """Async /infographic-jobs/<id>/events: polls the job table without holding a thread between reads."""
+    job_id = request.path_params['job_id']
+    job = await asyncio.to_thread(JOBS.get, job_id)
+    if job is None:
+        return JSONResponse({'error': 'Unknown infographic job', 'success': False}, status_code=404)
+
+    async def generate():
+        nonlocal job
+        deadline = asyncio.get_running_loop().time() + INFOGRAPHIC_STALE_SECONDS * 2
+        last_seen = None
+        while job is not None:
+            seen = (job['state'], job.get('position'))
+            if seen != last_seen:
+                last_seen = seen
+                payload = infographic_job_response(job, events=True)
+                if job['state'] == 'succeeded':
+                    yield sse_event('done', payload)
+                    return
+                if job['state'] == 'failed':
+                    yield sse_event('error', payload)
+                    return
+                yield sse_event('status', payload)
+            if asyncio.get_running_loop().time() >= deadline:
+                break
+            await asyncio.sleep(INFOGRAPHIC_POLL_SECONDS)
+            job = await asyncio.to_thread(JOBS.get, job_id)
+        yield sse_event('error', {'job_id': job_id, 'success': False,
+                                  'error': 'Infographic job timed out' if job else 'Unknown infographic job'})
+
+    return StreamingResponse(generate(), media_type='text/event-stream', headers=_SSE_HEADERS)
+
+
+async def _analyze_image(request: Request, route: str):
+    """Shared async handler of /analyze-image and its legacy views /scan-image and /classify-plant."""
+    if ai_services.CLIENT is None:
+        return JSONResponse({'error': 'AI unavailable'}, status_code=503)
+    if _too_large(request):
+        return JSONResponse({'error': 'File too large (max 50MB)'}, status_code=413)
+    form = await request.form()
+    image_file = form.get('file') or form.get('image')
+    if image_file is None or not hasattr(image_file, 'read'):
+        return JSONResponse({'error': 'No image file provided'}, status_code=400)
+    if not image_file.filename:
+        return JSONResponse({'error': 'Empty filename'}, status_code=400)
+    img_bytes = await image_file.read()
+    if not img_bytes:
+        return JSONResponse({'error': 'Empty image data'}, status_code=400)
+    try:
+        prepared = await image_preprocess.apreprocess_image(img_bytes)
+    except (image_preprocess.InvalidImageError, image_preprocess.PreprocessUnavailableError) as e:
+        payload, status = preprocess_error(e)
+        return JSONResponse(payload, status_code=status)
+    lang = (form.get('language') or 'english').lower()
+    user_prompt = (form.get('prompt') or '').strip()
+    bypass_cache = cache_bypass_requested(form.get('no_cache') or '', request.headers.get('cache-control'))
+    if route == 'classify-plant' and not bypass_cache:
+        local = await asyncio.to_thread(ai_services.PLANT_CLASSIFIER.classify, prepared.data)
+        if local is not None:
+            return JSONResponse({'success': True, **local, 'raw_response': ''})
+    # Manifest read and scan cache lock: keep them off the loop
+    start = await asyncio.to_thread(begin_analysis, prepared, lang, user_prompt, route, bypass_cache)
+    if start.cached is not None:
+        return JSONResponse(analysis_view(start.cached, route))
+    try:
+        store = await asyncio.to_thread(ai_services.ensure_file_search_store)
+        contents = await asyncio.to_thread(analysis_contents, start.prompt, prepared.data, prepared.mime_type)
+        resp = await ai_services.CLIENT.aio.models.generate_content(
+            model='gemini-2.5-flash-lite',
+            contents=contents,
+            config=analysis_config(store.name)
+        )
+    except Exception as e:
+        logger.error(f'Vision call failed: {e}')
+        return JSONResponse({'error': 'Model call failed'}, status_code=500)
+    if not resp.candidates:
+        return JSONResponse({'error': 'No model candidates'}, status_code=500)
+    raw_text = resp.text or ''
+    result = parse_analysis(raw_text)
+    retry_prompt = analysis_retry_prompt(result, start.prompt, user_prompt)
+    if retry_prompt:
+        try:
+            contents = await asyncio.to_thread(analysis_contents, retry_prompt, prepared.data, prepared.mime_type)
+            retry = await ai_services.CLIENT.aio.models.generate_content(
+                model='gemini-2.5-flash-lite',
+                contents=contents,
+                config=operation_config('chat')
+            )
+            raw_text, result = merge_analysis_retry(raw_text, result, retry.text)
+        except Exception as re_err:
+            logger.warning(f'Retry failed: {re_err}')
+    out = {'success': True, **result, 'prompt_used': user_prompt, 'raw_text': raw_text}
+    await _attach_infographic(out, route, original_question=user_prompt)
+    await asyncio.to_thread(ai_services.SCAN_CACHE.put, prepared.dhash, user_prompt, lang, start.kb_version, out)
+    return JSONResponse(analysis_view(out, route))
+
+async def analyze_image(request: Request):
+    """Async /analyze-image: classification and crop disease analysis in one model call."""
+    return await _analyze_image(request, 'analyze-image')
+
+
+async def scan_image(request: Request):
+    """Async /scan-image: crop disease analysis (view of /analyze-image)."""
+    return await _analyze_image(request, 'scan-image')
+
+
+async def classify_plant(request: Request):
+    """Async /classify-plant: sugarcane / weed / unknown (view of /analyze-image)."""
+    return await _analyze_image(request, 'classify-plant')
+
+
+async def _internal_error(request: Request, exc: Exception):
+    logger.exception('Uncaught exception during request')
+    return JSONResponse({'error': 'internal_server_error', 'message': 'An internal error occurred'}, status_code=500)
+
+
+async def _start_knowledge_base_sync():
+    """Kick off the knowledge base sync without delaying startup."""
+    loop = asyncio.get_running_loop()
+    loop.run_in_executor(None, flask_module.ensure_knowledge_base_initialized)
+
 
-# Import the Flask WSGI app
-from app import app as flask_app
+native_app = Starlette(
+    routes=[
+        Route('/ask', ask, methods=['POST']),
+        Route('/webhook', webhook, methods=['POST']),
+        Route('/generate-infographic', generate_infographic, methods=['POST']),
+        Route('/infographic-jobs/{job_id}/events', infographic_job_events, methods=['GET']),
+        Route('/analyze-image', analyze_image, methods=['POST']),
+        Route('/scan-image', scan_image, methods=['POST']),
+        Route('/classify-plant', classify_plant, methods=['POST']),
+        Mount('/', app=legacy_app),
+    ],
+    middleware=[Middleware(CORSMiddleware, allow_origins=['*'], allow_methods=['*'], allow_headers=['*'])],
+    on_startup=[_start_knowledge_base_sync],
+    exception_handlers={Exception: _internal_error},
+)
 
-# Wrap the WSGI app with an ASGI adapter
-app = WsgiToAsgi(flask_app)
+app = legacy_app if os.getenv('ASGI_MODE', 'native').lower() == 'wsgi' else native_app
@@ -0,0 +1,190 @@
+"""
+Context Packer - Token-Budgeted Prompt Context
+==============================================
+
+Selects which retrieved passages go into a RAG prompt so input tokens stay
+flat as the knowledge base grows, instead of injecting everything retrieval
+returned.
+
+Packing steps:
+    1. **Relevance order**: candidates arrive ranked by the retriever (RRF);
+       scores are rescaled to [0, 1]
+    2. **MMR selection**: each pick maximizes
+       ``lambda * relevance - (1 - lambda) * max_similarity_to_picked``;
+       near-duplicates of an already picked passage are dropped outright
+    3. **Per-passage truncation**: long passages keep their most query-relevant
+       sentences (in original order) up to a per-passage cap
+    4. **Budget**: passages are added until the token budget is spent; the
+       last one is truncated to fit when enough budget remains
+
+Token counts are estimated locally (about 4 characters per token for Gemini
+models), so packing never costs a network call.
+
+Configuration (environment variables):
+    - CONTEXT_TOKEN_BUDGET: max tokens of injected passages (default 1500)
+    - CONTEXT_PASSAGE_MAX_TOKENS: cap per passage (default 350)
+    - CONTEXT_MMR_LAMBDA: relevance vs. diversity trade-off (default 0.7)
+    - CONTEXT_CANDIDATES: passages retrieved before packing (default 20)
+"""
+# Standard library imports
+import math
+import os
+import re
+import threading
+from typing import Any, Callable, Dict, List, Optional
+
+# Third-party imports
+import numpy as np
+
+# Local imports
+from answer_cache import normalize_question, vectorize
+
+# ============================================================================
+# CONFIGURATION
+# ============================================================================
+
+TOKEN_BUDGET = int(os.getenv('CONTEXT_TOKEN_BUDGET', '1500'))
+PASSAGE_MAX_TOKENS = int(os.getenv('CONTEXT_PASSAGE_MAX_TOKENS', '350'))
+MMR_LAMBDA = float(os.getenv('CONTEXT_MMR_LAMBDA', '0.7'))
+CANDIDATES = int(os.getenv('CONTEXT_CANDIDATES', '20'))
+
+# Passages at least this similar to a picked one are treated as duplicates
+REDUNDANCY_THRESHOLD = 0.9
+# Don't bother truncating a passage into less than this many tokens
+MIN_PASSAGE_TOKENS = 60
+CHARS_PER_TOKEN = 4
+
+_SENTENCE_RE = re.compile(r'(?<=[.!?।])\s+|\n+')
+_WORD_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def estimate_tokens(text: str) -> int:
+    """Approximate token count (~4 characters per token)."""
+    return math.ceil(len(text or '') / CHARS_PER_TOKEN)
+
+
+def _default_embed(text: str) -> np.ndarray:
+    return vectorize(normalize_question(text))
+
+
+def truncate_passage(text: str, query: str, max_tokens: int) -> str:
+    """
+    Shorten a passage to at most max_tokens.
+
+    Sentences are ranked by how many query words they contain; the best ones
+    are kept in their original order. A single oversized sentence is cut.
+    """
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    sentences = [s.strip() for s in _SENTENCE_RE.split(text) if s.strip()]
+    query_words = set(_WORD_RE.findall(query.lower()))
+    ranked = sorted(
+        range(len(sentences)),
+        key=lambda i: (-len(query_words & set(_WORD_RE.findall(sentences[i].lower()))), i),
+    )
+    budget_chars = max_tokens * CHARS_PER_TOKEN
+    keep, used = [], 0
+    for i in ranked:
+        cost = len(sentences[i]) + 1
+        if used + cost > budget_chars:
+            continue
+        keep.append(i)
+        used += cost
+    if not keep:
+        return text[:budget_chars].rstrip() + '…'
+    return ' '.join(sentences[i] for i in sorted(keep))
+
+
+class ContextPacker:
+    """
+    MMR-based, token-budgeted selection of retrieved passages.
+
+    Thread-safe; ``stats()`` aggregates tokens packed and saved across requests.
+    """
+
+    def __init__(self, token_budget: int = TOKEN_BUDGET, passage_max_tokens: int = PASSAGE_MAX_TOKENS,
+                 mmr_lambda: float = MMR_LAMBDA, embed: Optional[Callable[[str], np.ndarray]] = None):
+        self.token_budget = token_budget
+        self.passage_max_tokens = passage_max_tokens
+        self.mmr_lambda = mmr_lambda
+        self.embed = embed or _default_embed
+        self._lock = threading.Lock()
+        self._stats = {'requests': 0, 'candidate_tokens': 0, 'packed_tokens': 0, 'tokens_saved': 0,
+                       'passages_in': 0, 'passages_packed': 0, 'redundant_dropped': 0, 'truncated': 0}
+
+    def pack(self, query: str, hits: List[Dict[str, Any]], max_passages: Optional[int] = None,
+             vectors: Optional[np.ndarray] = None) -> Dict[str, Any]:
+        """
+        Pack retrieved passages under the token budget.
+
+        Args:
+            query: The user's question
+            hits: Retriever results (best first), each with 'text' and 'score'
+            max_passages: Optional cap on the number of passages
+            vectors: Optional L2-normalized passage vectors aligned with hits
+                (e.g. rows of the retriever's dense matrix); computed with
+                ``embed`` when omitted
+
+        Returns:
+            Dict with 'passages' (selected hits, 'text' possibly truncated, in
+            selection order) and 'metrics' (candidate/packed/saved tokens and
+            passage counts for this request)
+        """
+        candidate_tokens = sum(estimate_tokens(h['text']) for h in hits)
+        selected: List[Dict[str, Any]] = []
+        redundant = truncated = used = 0
+
+        if hits:
+            top = max(h.get('score', 0.0) for h in hits) or 1.0
+            relevance = np.array([h.get('score', 0.0) / top for h in hits], dtype=np.float32)
+            if vectors is None:
+                vectors = np.stack([self.embed(h['text']) for h in hits])
+            max_sim = np.zeros(len(hits), dtype=np.float32)
+            remaining = set(range(len(hits)))
+
+            while remaining and used < self.token_budget:
+                if max_passages is not None and len(selected) >= max_passages:
+                    break
+                order = sorted(remaining)
+                mmr = self.mmr_lambda * relevance[order] - (1.0 - self.mmr_lambda) * max_sim[order]
+                best = order[int(np.argmax(mmr))]
+                remaining.discard(best)
+                if selected and max_sim[best] >= REDUNDANCY_THRESHOLD:
+                    redundant += 1
+                    continue
+
+                text = hits[best]['text']
+                cap = min(self.passage_max_tokens, self.token_budget - used)
+                if estimate_tokens(text) > cap:
+                    if cap < MIN_PASSAGE_TOKENS:
+                        continue
+                    text = truncate_passage(text, query, cap)
+                    truncated += 1
+                selected.append({**hits[best], 'text': text})
+                used += estimate_tokens(text)
+                max_sim = np.maximum(max_sim, vectors @ vectors[best])
+
+        metrics = {
+            'candidate_tokens': candidate_tokens,
+            'packed_tokens': used,
+            'tokens_saved': candidate_tokens - used,
+            'passages_in': len(hits),
+            'passages_packed': len(selected),
+            'redundant_dropped': redundant,
+            'truncated': truncated,
+        }
+        with self._lock:
+            self._stats['requests'] += 1
+            for key, value in metrics.items():
+                self._stats[key] += value
+        return {'passages': selected, 'metrics': metrics}
+
+    def stats(self) -> Dict[str, Any]:
+        """Totals across requests plus per-request averages."""
+        with self._lock:
+            stats = dict(self._stats)
+        requests = stats['requests']
+        stats['avg_packed_tokens'] = round(stats['packed_tokens'] / requests, 1) if requests else 0.0
+        stats['avg_tokens_saved'] = round(stats['tokens_saved'] / requests, 1) if requests else 0.0
+        stats['token_budget'] = self.token_budget
+        return stats
@@ -0,0 +1,252 @@
+"""
+Gemini Client Factory - Pooled HTTP Connections
+===============================================
+
+Builds the process-wide ``genai.Client`` on explicitly configured httpx
+clients, so every Flask thread, executor worker and ASGI task shares one
+connection pool per surface (sync and ``aio``) and reuses TLS connections
+instead of paying a handshake on short answers.
+
+Features:
+    1. **Pool sizing**: max connections default to the concurrency this
+       process can generate (request threads + classification workers +
+       knowledge-base upload workers); keep-alive connections are retained
+       for GEMINI_KEEPALIVE_SECONDS
+    2. **Per-operation timeouts**: ``operation_config()`` attaches the
+       timeout for 'chat', 'classify', 'image' or 'upload' calls to a request
+       config
+    3. **Saturation metrics**: metered transports count in-flight requests
+       (until the response body is closed, so streams are included), the peak,
+       and requests that started while the pool was full; ``pool_stats()``
+       adds open/idle connection counts
+
+Configuration (environment variables):
+    - GEMINI_MAX_CONNECTIONS: pool size per surface (default: computed)
+    - GEMINI_REQUEST_THREADS: request threads per process used for the
+      computed default (default 4, as in the Procfile)
+    - GEMINI_KEEPALIVE_SECONDS: idle connection lifetime (default 120)
+    - GEMINI_CONNECT_TIMEOUT_SECONDS: TCP/TLS connect timeout (default 10)
+    - GEMINI_TIMEOUT_CHAT_SECONDS / _CLASSIFY_ / _IMAGE_ / _UPLOAD_:
+      per-operation request timeouts (default 60 / 15 / 180 / 300)
+"""
+# Standard library imports
+import logging
+import os
+import threading
+from typing import Any, Dict, Optional
+
+# Third-party imports
+import httpx
+
+# Google Gemini AI imports
+from google import genai
+from google.genai import types
+
+logger = logging.getLogger(__name__)
+
+# ============================================================================
+# CONFIGURATION
+# ============================================================================
+
+REQUEST_THREADS = int(os.getenv('GEMINI_REQUEST_THREADS', '4'))
+CLASSIFY_WORKERS = int(os.getenv('CLASSIFY_WORKERS', '4'))
+UPLOAD_WORKERS = min(8, (os.cpu_count() or 2) * 2)
+MAX_CONNECTIONS = int(os.getenv('GEMINI_MAX_CONNECTIONS', str(REQUEST_THREADS + CLASSIFY_WORKERS + UPLOAD_WORKERS)))
+KEEPALIVE_SECONDS = float(os.getenv('GEMINI_KEEPALIVE_SECONDS', '120'))
+CONNECT_TIMEOUT_SECONDS = float(os.getenv('GEMINI_CONNECT_TIMEOUT_SECONDS', '10'))
+
+OPERATION_TIMEOUTS = {
+    'chat': float(os.getenv('GEMINI_TIMEOUT_CHAT_SECONDS', '60')),
+    'classify': float(os.getenv('GEMINI_TIMEOUT_CLASSIFY_SECONDS', '15')),
+    'image': float(os.getenv('GEMINI_TIMEOUT_IMAGE_SECONDS', '180')),
+    'upload': float(os.getenv('GEMINI_TIMEOUT_UPLOAD_SECONDS', '300')),
+}
+
+
+# ============================================================================
+# METERED TRANSPORTS
+# ============================================================================
+
+class _PoolMeter:
+    """In-flight request counters for one transport's connection pool."""
+
+    def __init__(self, max_connections: int):
+        self.max_connections = max_connections
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.requests = 0
+        self.saturated_requests = 0
+
+    def begin(self):
+        with self._lock:
+            if self.in_flight >= self.max_connections:
+                self.saturated_requests += 1
+            self.in_flight += 1
+            self.requests += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+
+    def end(self):
+        with self._lock:
+            self.in_flight -= 1
+
+    def snapshot(self, transport: httpx.BaseTransport) -> Dict[str, Any]:
+        with self._lock:
+            stats = {
+                'in_flight': self.in_flight,
+                'peak_in_flight': self.peak_in_flight,
+                'requests': self.requests,
+                'saturated_requests': self.saturated_requests,
+            }
+        stats['saturation'] = round(stats['in_flight'] / self.max_connections, 3) if self.max_connections else 0.0
+        connections = list(getattr(getattr(transport, '_pool', None), 'connections', []))
+        stats['open_connections'] = len(connections)
+        stats['idle_connections'] = sum(1 for c in connections if c.is_idle())
+        return stats
+
+
+class _MeteredSyncStream(httpx.SyncByteStream):
+    def __init__(self, stream: httpx.SyncByteStream, meter: _PoolMeter):
+        self._stream = stream
+        self._meter = meter
+        self._closed = False
+
+    def __iter__(self):
+        yield from self._stream
+
+    def close(self):
+        try:
+            self._stream.close()
+        finally:
+            if not self._closed:
+                self._closed = True
+                self._meter.end()
+
+
+class _MeteredAsyncStream(httpx.AsyncByteStream):
+    def __init__(self, stream: httpx.AsyncByteStream, meter: _PoolMeter):
+        self._stream = stream
+        self._meter = meter
+        self._closed = False
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            yield chunk
+
+    async def aclose(self):
+        try:
+            await self._stream.aclose()
+        finally:
+            if not self._closed:
+                self._closed = True
+                self._meter.end()
+
+
+class _MeteredTransport(httpx.HTTPTransport):
+    def __init__(self, meter: _PoolMeter, **kwargs):
+        super().__init__(**kwargs)
+        self._meter = meter
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        self._meter.begin()
+        try:
+            response = super().handle_request(request)
+        except BaseException:
+            self._meter.end()
+            raise
+        response.stream = _MeteredSyncStream(response.stream, self._meter)
+        return response
+
+
+class _MeteredAsyncTransport(httpx.AsyncHTTPTransport):
+    def __init__(self, meter: _PoolMeter, **kwargs):
+        super().__init__(**kwargs)
+        self._meter = meter
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        self._meter.begin()
+        try:
+            response = await super().handle_async_request(request)
+        except BaseException:
+            self._meter.end()
+            raise
+        response.stream = _MeteredAsyncStream(response.stream, self._meter)
+        return response
+
+
+# ============================================================================
+# CLIENT FACTORY
+# ============================================================================
+
+_SYNC_TRANSPORT: Optional[_MeteredTransport] = None
+_ASYNC_TRANSPORT: Optional[_MeteredAsyncTransport] = None
+
+
+def create_client(api_key: str, max_connections: int = MAX_CONNECTIONS) -> genai.Client:
+    """
+    Create a Gemini client on pooled, metered httpx clients.
+
+    Args:
+        api_key: Gemini API key
+        max_connections: Connection pool size for each of the sync and async surfaces
+
+    Returns:
+        genai.Client whose sync and aio calls reuse keep-alive connections
+    """
+    global _SYNC_TRANSPORT, _ASYNC_TRANSPORT
+    limits = httpx.Limits(
+        max_connections=max_connections,
+        max_keepalive_connections=max_connections,
+        keepalive_expiry=KEEPALIVE_SECONDS,
+    )
+    # Per-call timeouts come from operation_config(); this is the fallback
+    timeout = httpx.Timeout(OPERATION_TIMEOUTS['chat'], connect=CONNECT_TIMEOUT_SECONDS)
+    sync_transport = _MeteredTransport(_PoolMeter(max_connections), limits=limits)
+    async_transport = _MeteredAsyncTransport(_PoolMeter(max_connections), limits=limits)
+
+    client = genai.Client(
+        api_key=api_key,
+        http_options=types.HttpOptions(
+            httpx_client=httpx.Client(transport=sync_transport, timeout=timeout),
+            httpx_async_client=httpx.AsyncClient(transport=async_transport, timeout=timeout),
+        ),
+    )
+    _SYNC_TRANSPORT, _ASYNC_TRANSPORT = sync_transport, async_transport
+    logger.info(f"🔌 Gemini HTTP pool: {max_connections} connections per surface, keep-alive {KEEPALIVE_SECONDS:.0f}s")
+    return client
+
+
+def operation_config(operation: str, config: Any = None) -> Any:
+    """
+    Attach the timeout for an operation to a request config.
+
+    Args:
+        operation: 'chat', 'classify', 'image' or 'upload'
+        config: Existing config (pydantic config object, dict or None)
+
+    Returns:
+        Config of the same kind with http_options.timeout set; None becomes a
+        GenerateContentConfig (or a dict for 'upload')
+    """
+    timeout_ms = int(OPERATION_TIMEOUTS[operation] * 1000)
+    if config is None:
+        if operation == 'upload':
+            return {'http_options': {'timeout': timeout_ms}}
+        return types.GenerateContentConfig(http_options=types.HttpOptions(timeout=timeout_ms))
+    if isinstance(config, dict):
+        return {**config, 'http_options': {**(config.get('http_options') or {}), 'timeout': timeout_ms}}
+    http_options = config.http_options.model_copy(update={'timeout': timeout_ms}) if config.http_options \
+        else types.HttpOptions(timeout=timeout_ms)
+    return config.model_copy(update={'http_options': http_options})
+
+
+def pool_stats() -> Dict[str, Any]:
+    """Connection pool usage and saturation per surface (empty before create_client)."""
+    if _SYNC_TRANSPORT is None or _ASYNC_TRANSPORT is None:
+        return {}
+    return {
+        'max_connections': _SYNC_TRANSPORT._meter.max_connections,
+        'sync': _SYNC_TRANSPORT._meter.snapshot(_SYNC_TRANSPORT),
+        'async': _ASYNC_TRANSPORT._meter.snapshot(_ASYNC_TRANSPORT),
+        'timeouts_seconds': dict(OPERATION_TIMEOUTS),
+    }
@@ -0,0 +1,272 @@
+"""
+Image Preprocess - Shared Preparation of Uploaded Photos for the Model
+======================================================================
+
+/scan-image and /classify-plant used to forward the raw upload (often a
+12 MP phone photo with EXIF data, up to MAX_CONTENT_LENGTH) to Gemini as an
+inline blob. Every uploaded image now goes through one preparation step:
+
+    1. **Header sniff**: the format is read from the first bytes; anything
+       that is not JPEG, PNG, WebP or GIF is rejected before decoding
+    2. **Orientation**: the EXIF orientation is applied to the pixels (and
+       the metadata dropped), so the model sees the photo upright
+    3. **Downscale**: the longest side is limited to IMAGE_MAX_SIDE; JPEGs
+       are decoded at a reduced scale when possible (draft mode)
+    4. **Re-encode**: JPEG at IMAGE_JPEG_QUALITY; the original bytes are kept
+       when they are already small enough and smaller than the re-encode
+
+Decoding doubles as validation (it replaces ``Image.verify()``). The same
+decode yields the perceptual hash used by the scan cache (see scan_cache.py).
+The Pillow work runs on a process pool so it never holds the GIL on request
+threads or the event loop.
+
+Failure handling:
+    - Images over IMAGE_MAX_PIXELS are refused before decoding
+      (``ImageTooLargeError``, a decompression bomb guard set in every worker)
+    - A pool whose worker died (OOM, crash) is replaced and the image is
+      tried once more; a second crash or a timeout raises
+      ``PreprocessUnavailableError`` (the routes answer 503)
+
+Configuration (environment variables):
+    - IMAGE_MAX_SIDE: longest side sent to the model (default 1536)
+    - IMAGE_JPEG_QUALITY: re-encode quality (default 85)
+    - IMAGE_MAX_PIXELS: largest decoded image accepted (default 64 MP)
+    - IMAGE_PREPROCESS_WORKERS: pool processes (default 2)
+"""
+# Standard library imports
+import asyncio
+import concurrent.futures
+import logging
+import multiprocessing
+import os
+import threading
+import time
+import warnings
+from concurrent.futures.process import BrokenProcessPool
+from io import BytesIO
+from typing import Any, Dict, NamedTuple, Optional
+
+# Third-party imports
+from PIL import Image, ImageOps
+
+# Local application imports
+from scan_cache import dhash_image
+
+logger = logging.getLogger(__name__)
+
+# ============================================================================
+# CONFIGURATION
+# ============================================================================
+
+MAX_SIDE = int(os.getenv('IMAGE_MAX_SIDE', '1536'))
+QUALITY = int(os.getenv('IMAGE_JPEG_QUALITY', '85'))
+MAX_PIXELS = int(os.getenv('IMAGE_MAX_PIXELS', str(64 * 1024 * 1024)))
+WORKERS = int(os.getenv('IMAGE_PREPROCESS_WORKERS', '2'))
+TIMEOUT_SECONDS = 30.0
+
+_EXECUTOR: Optional[concurrent.futures.ProcessPoolExecutor] = None
+_EXECUTOR_LOCK = threading.Lock()
+_STATS = {'images': 0, 'rejected': 0, 're_encoded': 0, 'passthrough': 0, 'bytes_in': 0, 'bytes_out': 0,
+          'total_ms': 0.0, 'timeouts': 0, 'pool_restarts': 0}
+_STATS_LOCK = threading.Lock()
+
+
+class InvalidImageError(ValueError):
+    """The upload is not a decodable image in a supported format."""
+
+
+class ImageTooLargeError(InvalidImageError):
+    """The upload decodes to more than MAX_PIXELS pixels."""
+
+
+class PreprocessUnavailableError(RuntimeError):
+    """The pool could not prepare the image (timeout or repeated worker crash)."""
+
+
+class PreparedImage(NamedTuple):
+    data: bytes
+    mime_type: str
+    width: int
+    height: int
+    original_bytes: int
+    # 64-bit difference hash for the scan cache (see scan_cache.dhash_image())
+    dhash: int
+
+
+def sniff_image_type(data: bytes) -> Optional[str]:
+    """MIME type from the file header, or None when it is not a supported image."""
+    if data.startswith(b'\xff\xd8\xff'):
+        return 'image/jpeg'
+    if data.startswith(b'\x89PNG\r\n\x1a\n'):
+        return 'image/png'
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+        return 'image/webp'
+    if data[:6] in (b'GIF87a', b'GIF89a'):
+        return 'image/gif'
+    return None
+
+
+def prepare_image(data: bytes, max_side: int = MAX_SIDE, quality: int = QUALITY) -> PreparedImage:
+    """
+    Orient, downscale and re-encode one image (runs in a pool process).
+
+    Args:
+        data: Uploaded file bytes
+        max_side: Longest side of the result
+        quality: JPEG quality
+
+    Returns:
+        PreparedImage with the bytes to send to the model
+
+    Raises:
+        InvalidImageError: if the bytes are not a supported, decodable image
+    """
+    mime_type = sniff_image_type(data)
+    if mime_type is None:
+        raise InvalidImageError('Unsupported or unrecognized image format')
+    try:
+        with Image.open(BytesIO(data)) as img:
+            if img.format == 'JPEG':
+                img.draft('RGB', (max_side, max_side))
+            oriented = ImageOps.exif_transpose(img)
+            needs_rotation = oriented is not img
+            img = oriented
+            needs_resize = max(img.size) > max_side
+            image_hash = dhash_image(img)  # decodes, which validates the pixel data
+            if not needs_resize and not needs_rotation and mime_type == 'image/jpeg':
+                return PreparedImage(data, mime_type, img.width, img.height, len(data), image_hash)
+            if img.mode in ('RGBA', 'LA', 'P'):
+                rgba = img.convert('RGBA')
+                img = Image.new('RGB', rgba.size, (255, 255, 255))
+                img.paste(rgba, mask=rgba.split()[-1])
+            elif img.mode != 'RGB':
+                img = img.convert('RGB')
+            img.thumbnail((max_side, max_side), Image.LANCZOS)
+            out = BytesIO()
+            img.save(out, 'JPEG', quality=quality, optimize=True)
+            encoded = out.getvalue()
+    except InvalidImageError:
+        raise
+    except (Image.DecompressionBombError, Image.DecompressionBombWarning) as e:
+        raise ImageTooLargeError(f'Image too large: {e}') from e
+    except Exception as e:
+        raise InvalidImageError(f'Invalid image file: {e}') from e
+    if not needs_resize and not needs_rotation and len(encoded) >= len(data):
+        # Already compact (e.g. a small PNG): keep the original bytes
+        return PreparedImage(data, mime_type, img.width, img.height, len(data), image_hash)
+    return PreparedImage(encoded, 'image/jpeg', img.width, img.height, len(data), image_hash)
+
+
+def _init_worker(max_pixels: int):
+    """Pool initializer: refuse images over max_pixels instead of only warning about them."""
+    Image.MAX_IMAGE_PIXELS = max_pixels
+    warnings.simplefilter('error', Image.DecompressionBombWarning)
+
+
+def _executor() -> concurrent.futures.ProcessPoolExecutor:
+    global _EXECUTOR
+    with _EXECUTOR_LOCK:
+        if _EXECUTOR is None:
+            # spawn: forking a multi-threaded server process is not safe
+            _EXECUTOR = concurrent.futures.ProcessPoolExecutor(
+                max_workers=WORKERS, mp_context=multiprocessing.get_context('spawn'),
+                initializer=_init_worker, initargs=(MAX_PIXELS,))
+        return _EXECUTOR
+
+
+def _replace_broken(executor: concurrent.futures.ProcessPoolExecutor):
+    """Drop a pool whose worker died so the next call builds a fresh one."""
+    global _EXECUTOR
+    with _EXECUTOR_LOCK:
+        if _EXECUTOR is executor:
+            _EXECUTOR = None
+            with _STATS_LOCK:
+                _STATS['pool_restarts'] += 1
+            logger.warning('⚠️ Image preprocessing worker died; restarting the pool')
+    executor.shutdown(wait=False)
+
+
+def _record(prepared: Optional[PreparedImage], started: float):
+    with _STATS_LOCK:
+        if prepared is None:
+            _STATS['rejected'] += 1
+            return
+        _STATS['images'] += 1
+        _STATS['re_encoded' if len(prepared.data) != prepared.original_bytes else 'passthrough'] += 1
+        _STATS['bytes_in'] += prepared.original_bytes
+        _STATS['bytes_out'] += len(prepared.data)
+        _STATS['total_ms'] += (time.perf_counter() - started) * 1000
+
+
+def _failed(started: float, error: BaseException, timed_out: bool = False) -> PreprocessUnavailableError:
+    _record(None, started)
+    if timed_out:
+        with _STATS_LOCK:
+            _STATS['timeouts'] += 1
+        return PreprocessUnavailableError(f'Image preprocessing timed out after {TIMEOUT_SECONDS:.0f}s')
+    return PreprocessUnavailableError(f'Image preprocessing pool crashed: {error}')
+
+
+def preprocess_image(data: bytes) -> PreparedImage:
+    """
+    Prepare an uploaded image on the process pool (blocking caller).
+
+    Raises:
+        InvalidImageError: if the upload is not a supported image
+            (ImageTooLargeError past MAX_PIXELS)
+        PreprocessUnavailableError: on a timeout or when the pool crashed twice
+    """
+    started = time.perf_counter()
+    if sniff_image_type(data) is None:
+        _record(None, started)
+        raise InvalidImageError('Unsupported or unrecognized image format')
+    for attempt in (1, 2):
+        executor = _executor()
+        try:
+            prepared = executor.submit(prepare_image, data).result(timeout=TIMEOUT_SECONDS)
+            break
+        except InvalidImageError:
+            _record(None, started)
+            raise
+        except BrokenProcessPool as e:
+            _replace_broken(executor)
+            if attempt == 2:
+                raise _failed(started, e) from e
+        except concurrent.futures.TimeoutError as e:
+            raise _failed(started, e, timed_out=True) from e
+    _record(prepared, started)
+    return prepared
+
+
+async def apreprocess_image(data: bytes) -> PreparedImage:
+    """Async variant of preprocess_image() for the native ASGI app."""
+    started = time.perf_counter()
+    if sniff_image_type(data) is None:
+        _record(None, started)
+        raise InvalidImageError('Unsupported or unrecognized image format')
+    for attempt in (1, 2):
+        executor = _executor()
+        try:
+            prepared = await asyncio.wait_for(
+                asyncio.wrap_future(executor.submit(prepare_image, data)), TIMEOUT_SECONDS)
+            break
+        except InvalidImageError:
+            _record(None, started)
+            raise
+        except BrokenProcessPool as e:
+            _replace_broken(executor)
+            if attempt == 2:
+                raise _failed(started, e) from e
+        except asyncio.TimeoutError as e:
+            raise _failed(started, e, timed_out=True) from e
+    _record(prepared, started)
+    return prepared
+
+
+def stats() -> Dict[str, Any]:
+    with _STATS_LOCK:
+        stats = dict(_STATS)
+    stats['avg_ms'] = round(stats['total_ms'] / stats['images'], 1) if stats['images'] else 0.0
+    stats['bytes_saved'] = stats['bytes_in'] - stats['bytes_out']
+    stats['total_ms'] = round(stats['total_ms'], 1)
+    return stats
@@ -0,0 +1,291 @@
+"""
+Image Variants - Responsive Derivatives for Generated Infographics
+=================================================================
+
+Generated infographics arrive from the model as large lossless images, and
+most users open them on phones over mobile data. This module keeps the
+model's original bytes untouched and builds smaller derivatives next to them:
+
+    infographic_x.png                  original bytes, as returned by the model
+    infographic_x.w480.webp / .jpg     one WebP and one JPEG per width
+    infographic_x.placeholder.webp     tiny blurred preview (a few hundred bytes)
+    infographic_x.variants.json        manifest of the above
+
+Derivatives are encoded on a process pool (``schedule()``), never on a
+request thread. ``negotiate()`` picks the best file for a request from the
+manifest using the Accept header (WebP when supported, JPEG otherwise) and
+the width client hints (Sec-CH-Width / Width, or viewport width x DPR).
+Until the manifest exists the original is served.
+
+Configuration (environment variables):
+    - IMAGE_VARIANT_WIDTHS: comma-separated target widths (default 480,960,1600)
+    - IMAGE_VARIANT_QUALITY: WebP/JPEG quality (default 80)
+    - IMAGE_VARIANT_WORKERS: encoder processes (default 1)
+"""
+# Standard library imports
+import concurrent.futures
+import json
+import logging
+import multiprocessing
+import os
+import re
+import threading
+from io import BytesIO
+from typing import Any, Dict, List, Optional
+
+# Third-party imports
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+# ============================================================================
+# CONFIGURATION
+# ============================================================================
+
+WIDTHS = tuple(sorted(int(w) for w in os.getenv('IMAGE_VARIANT_WIDTHS', '480,960,1600').split(',') if w.strip()))
+QUALITY = int(os.getenv('IMAGE_VARIANT_QUALITY', '80'))
+WORKERS = int(os.getenv('IMAGE_VARIANT_WORKERS', '1'))
+PLACEHOLDER_WIDTH = 32
+
+FORMATS = {'webp': 'WEBP', 'jpg': 'JPEG'}
+# Response headers that influence negotiate(), for the Vary header
+VARY_HEADERS = 'Accept, Sec-CH-Width, Width, Sec-CH-Viewport-Width, Viewport-Width, Sec-CH-DPR, DPR'
+# Client hints the app asks browsers to send
+ACCEPT_CH = 'Sec-CH-Width, Sec-CH-Viewport-Width, Sec-CH-DPR'
+
+_IMAGE_SIGNATURES = (
+    (b'\x89PNG\r\n\x1a\n', '.png'),
+    (b'\xff\xd8\xff', '.jpg'),
+    (b'GIF8', '.gif'),
+)
+
+_VARIANT_NAME_RE = re.compile(r'\.(?:w\d+\.(?:webp|jpg)|placeholder\.webp|variants\.json)$')
+
+_EXECUTOR: Optional[concurrent.futures.ProcessPoolExecutor] = None
+_EXECUTOR_LOCK = threading.Lock()
+_STATS = {'scheduled': 0, 'built': 0, 'failed': 0, 'negotiated': 0, 'served_variant': 0}
+_STATS_LOCK = threading.Lock()
+# manifest path -> (mtime_ns, manifest)
+_MANIFEST_CACHE: Dict[str, tuple] = {}
+
+
+def image_extension(data: bytes, mime_type: Optional[str] = None) -> str:
+    """File extension for encoded image bytes, from the header (falling back to the MIME type)."""
+    for signature, ext in _IMAGE_SIGNATURES:
+        if data.startswith(signature):
+            return ext
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+        return '.webp'
+    return {'image/jpeg': '.jpg', 'image/webp': '.webp', 'image/gif': '.gif'}.get(mime_type or '', '.png')
+
+
+def manifest_path(image_path: str) -> str:
+    return os.path.splitext(image_path)[0] + '.variants.json'
+
+
+def variant_paths(image_path: str) -> List[str]:
+    """Every derivative file (plus the manifest) that may exist for an original."""
+    stem = os.path.splitext(image_path)[0]
+    paths = [f'{stem}.w{width}.{ext}' for width in WIDTHS for ext in FORMATS]
+    return paths + [f'{stem}.placeholder.webp', manifest_path(image_path)]
+
+
+def is_variant_file(path: str) -> bool:
+    """True for derivative and manifest files written by build_variants()."""
+    return bool(_VARIANT_NAME_RE.search(path))
+
+
+def remove_variants(image_path: str) -> int:
+    """Delete the derivatives of an original; returns bytes freed."""
+    freed = 0
+    for path in variant_paths(image_path):
+        try:
+            freed += os.path.getsize(path)
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+    return freed
+
+
+# ============================================================================
+# ENCODING (runs in worker processes)
+# ============================================================================
+
+def _encode(img: Image.Image, fmt: str) -> bytes:
+    out = BytesIO()
+    if fmt == 'JPEG':
+        if img.mode in ('RGBA', 'LA', 'P'):
+            rgba = img.convert('RGBA')
+            img = Image.new('RGB', rgba.size, (255, 255, 255))
+            img.paste(rgba, mask=rgba.split()[-1])
+        elif img.mode != 'RGB':
+            img = img.convert('RGB')
+        img.save(out, 'JPEG', quality=QUALITY, optimize=True, progressive=True)
+    else:
+        img.save(out, 'WEBP', quality=QUALITY, method=4)
+    return out.getvalue()
+
+
+def _write_atomic(path: str, data: bytes):
+    tmp = f'{path}.tmp.{os.getpid()}'
+    with open(tmp, 'wb') as fh:
+        fh.write(data)
+    os.replace(tmp, path)
+
+
+def build_variants(image_path: str) -> Dict[str, Any]:
+    """
+    Encode the derivatives of one original and write their manifest.
+
+    Widths at or above the original width are skipped, as is any variant that
+    would not be smaller than the original file.
+
+    Args:
+        image_path: Path of the original image
+
+    Returns:
+        Manifest dict: original width/height/bytes, variants and placeholder
+    """
+    original_bytes = os.path.getsize(image_path)
+    stem = os.path.splitext(image_path)[0]
+    variants = []
+    with Image.open(image_path) as img:
+        img.load()
+        width, height = img.size
+        for target in [w for w in WIDTHS if w < width] or [width]:
+            resized = img if target == width else img.resize(
+                (target, max(1, round(height * target / width))), Image.LANCZOS)
+            for ext, fmt in FORMATS.items():
+                data = _encode(resized, fmt)
+                if len(data) >= original_bytes:
+                    continue
+                path = f'{stem}.w{target}.{ext}'
+                _write_atomic(path, data)
+                variants.append({'format': ext, 'width': target, 'file': os.path.basename(path), 'bytes': len(data)})
+        preview = img.resize((PLACEHOLDER_WIDTH, max(1, round(height * PLACEHOLDER_WIDTH / width))), Image.BILINEAR)
+        placeholder = _encode(preview, 'WEBP')
+        _write_atomic(f'{stem}.placeholder.webp', placeholder)
+
+    manifest = {
+        'original': {'file': os.path.basename(image_path), 'width': width, 'height': height, 'bytes': original_bytes},
+        'variants': variants,
+        'placeholder': {'file': os.path.basename(stem) + '.placeholder.webp', 'bytes': len(placeholder)},
+    }
+    _write_atomic(manifest_path(image_path), json.dumps(manifest).encode('utf-8'))
+    return manifest
+
+
+# ============================================================================
+# SCHEDULING
+# ============================================================================
+
+def _executor() -> concurrent.futures.ProcessPoolExecutor:
+    global _EXECUTOR
+    with _EXECUTOR_LOCK:
+        if _EXECUTOR is None:
+            # spawn: forking a multi-threaded server process is not safe
+            _EXECUTOR = concurrent.futures.ProcessPoolExecutor(
+                max_workers=WORKERS, mp_context=multiprocessing.get_context('spawn'))
+        return _EXECUTOR
+
+
+def schedule(image_path: str) -> concurrent.futures.Future:
+    """Queue derivative encoding for an original on the process pool."""
+    with _STATS_LOCK:
+        _STATS['scheduled'] += 1
+    future = _executor().submit(build_variants, image_path)
+    future.add_done_callback(lambda f: _on_built(image_path, f))
+    return future
+
+
+def _on_built(image_path: str, future: concurrent.futures.Future):
+    try:
+        manifest = future.result()
+    except Exception as e:
+        with _STATS_LOCK:
+            _STATS['failed'] += 1
+        logger.warning(f'⚠️ Image variants failed for {image_path}: {e}')
+        return
+    with _STATS_LOCK:
+        _STATS['built'] += 1
+    smallest = min((v['bytes'] for v in manifest['variants']), default=manifest['original']['bytes'])
+    logger.info(f"🖼️ Built {len(manifest['variants'])} variant(s) for {os.path.basename(image_path)}: "
+                f"{manifest['original']['bytes'] // 1024} KB original, smallest {smallest // 1024} KB")
+
+
+def stats() -> Dict[str, Any]:
+    with _STATS_LOCK:
+        return dict(_STATS)
+
+
+# ============================================================================
+# NEGOTIATION
+# ============================================================================
+
+def _load_manifest(path: str) -> Optional[Dict[str, Any]]:
+    """Read a manifest, memoized on its mtime."""
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+    cached = _MANIFEST_CACHE.get(path)
+    if cached and cached[0] == mtime:
+        return cached[1]
+    try:
+        with open(path, 'r', encoding='utf-8') as fh:
+            manifest = json.load(fh)
+    except (OSError, ValueError):
+        return None
+    if len(_MANIFEST_CACHE) > 1024:
+        _MANIFEST_CACHE.clear()
+    _MANIFEST_CACHE[path] = (mtime, manifest)
+    return manifest
+
+
+def requested_width(headers, args=None) -> Optional[int]:
+    """Target width in physical pixels from ?w=, Sec-CH-Width/Width or viewport width x DPR."""
+    for value in ((args or {}).get('w'), headers.get('Sec-CH-Width'), headers.get('Width')):
+        if value and str(value).isdigit():
+            return int(value)
+    viewport = headers.get('Sec-CH-Viewport-Width') or headers.get('Viewport-Width')
+    if viewport and viewport.isdigit():
+        try:
+            dpr = float(headers.get('Sec-CH-DPR') or headers.get('DPR') or 1)
+        except ValueError:
+            dpr = 1.0
+        return int(int(viewport) * max(dpr, 1.0))
+    return None
+
+
+def negotiate(image_path: str, accept: str = '', width: Optional[int] = None,
+              placeholder: bool = False) -> Optional[str]:
+    """
+    Pick the file to serve for a request to an original image.
+
+    Args:
+        image_path: Path of the original image
+        accept: The request's Accept header
+        width: Target display width in physical pixels, if known
+        placeholder: Serve the tiny preview instead
+
+    Returns:
+        Basename of the chosen derivative, or None to serve the original
+    """
+    manifest = _load_manifest(manifest_path(image_path))
+    if manifest is None:
+        return None
+    with _STATS_LOCK:
+        _STATS['negotiated'] += 1
+    if placeholder:
+        return manifest['placeholder']['file']
+
+    ext = 'webp' if 'image/webp' in (accept or '') else 'jpg'
+    candidates = sorted((v for v in manifest['variants'] if v['format'] == ext), key=lambda v: v['width'])
+    if not candidates:
+        return None
+    chosen = candidates[-1]
+    if width:
+        chosen = next((v for v in candidates if v['width'] >= width), candidates[-1])
+    with _STATS_LOCK:
+        _STATS['served_variant'] += 1
+    return chosen['file']
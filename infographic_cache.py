@@ -0,0 +1,213 @@
+"""
+Infographic Cache - Content-Addressed Reuse of Generated Images
+===============================================================
+
+Image generation is the slowest and most expensive model call, and the same
+topics ("red rot symptoms" in Hindi) recur constantly. This cache maps
+(normalized topic, language, content digest) to a previously generated image
+so a repeat request returns its URL instantly instead of generating again.
+
+Design:
+    1. **Key**: ``infographic_cache_key()`` normalizes the topic (case,
+       whitespace, punctuation, Unicode form) and digests only the part of the
+       content the prompt actually uses, so equivalent requests share a key
+    2. **Index**: a SQLite table (WAL mode) shared by all gunicorn workers,
+       persisted under uploads/ so hits survive restarts; entries whose file
+       has disappeared are dropped on lookup
+    3. **Eviction**: when the indexed images exceed INFOGRAPHIC_CACHE_MAX_MB,
+       least recently used entries are removed (row, file and its responsive
+       variants) until the total is back under budget
+
+Usage:
+    cache = InfographicCache('uploads/infographic_cache.sqlite3', 'uploads')
+    key = infographic_cache_key(topic, language, content)
+    path = cache.lookup(key) or generate_and_save(...)
+    cache.store(key, path, topic=topic, language=language)
+"""
+# Standard library imports
+import hashlib
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from typing import Any, Dict, Optional, Set
+
+# Local application imports
+import image_variants
+
+logger = logging.getLogger(__name__)
+
+# ============================================================================
+# CONFIGURATION
+# ============================================================================
+
+MAX_BYTES = int(float(os.getenv('INFOGRAPHIC_CACHE_MAX_MB', '500')) * 1024 * 1024)
+# The infographic prompt only includes this much of the answer text
+CONTENT_PREFIX_CHARS = 500
+
+_PUNCTUATION_RE = re.compile(r'[?!.,;:।॥"\'()\[\]{}<>/\\|*_~`-]+')
+_WHITESPACE_RE = re.compile(r'\s+')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key          TEXT PRIMARY KEY,
+    image_path   TEXT NOT NULL,
+    bytes        INTEGER NOT NULL,
+    topic        TEXT,
+    language     TEXT,
+    hits         INTEGER NOT NULL DEFAULT 0,
+    created_at   REAL NOT NULL,
+    last_used_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_by_use ON entries (last_used_at);
+"""
+
+
+def normalize_topic(topic: str) -> str:
+    """Canonical form of a topic: NFKC, lower case, punctuation and extra whitespace removed."""
+    text = unicodedata.normalize('NFKC', topic or '').lower()
+    text = _PUNCTUATION_RE.sub(' ', text)
+    return _WHITESPACE_RE.sub(' ', text).strip()
+
+
+def infographic_cache_key(topic: str, language: str, content: str = '') -> str:
+    """
+    Content address of an infographic request.
+
+    Args:
+        topic: Question or topic of the infographic
+        language: Language code for the labels
+        content: Answer text given as context (only the prompt prefix counts)
+
+    Returns:
+        Hex digest identifying equivalent requests
+    """
+    prefix = _WHITESPACE_RE.sub(' ', unicodedata.normalize('NFKC', (content or '')[:CONTENT_PREFIX_CHARS])).strip()
+    content_digest = hashlib.sha256(prefix.encode('utf-8')).hexdigest()
+    material = f"{normalize_topic(topic)}\0{(language or 'english').lower()}\0{content_digest}"
+    return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+
+class InfographicCache:
+    """Process-shared, size-bounded LRU index of generated infographics."""
+
+    def __init__(self, db_path: str, root_dir: str, max_bytes: int = MAX_BYTES):
+        """
+        Args:
+            db_path: SQLite index location
+            root_dir: Directory image paths are relative to (the uploads folder)
+            max_bytes: Total size of cached images before LRU eviction
+        """
+        self.db_path = db_path
+        self.root_dir = root_dir
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._stats = {'lookups': 0, 'hits': 0, 'stale': 0, 'stores': 0, 'evicted': 0, 'evicted_bytes': 0}
+
+        os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+        self._conn().executescript(_SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=10, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    # ------------------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------------------
+    def lookup(self, key: str) -> Optional[str]:
+        """Relative image path cached for `key`, or None (stale entries are dropped)."""
+        conn = self._conn()
+        row = conn.execute('SELECT image_path FROM entries WHERE key = ?', (key,)).fetchone()
+        with self._lock:
+            self._stats['lookups'] += 1
+        if row is None:
+            return None
+        image_path = row[0]
+        if not os.path.exists(os.path.join(self.root_dir, image_path)):
+            conn.execute('DELETE FROM entries WHERE key = ?', (key,))
+            with self._lock:
+                self._stats['stale'] += 1
+            return None
+        conn.execute('UPDATE entries SET hits = hits + 1, last_used_at = ? WHERE key = ?', (time.time(), key))
+        with self._lock:
+            self._stats['hits'] += 1
+        return image_path
+
+    def store(self, key: str, image_path: str, topic: str = '', language: str = ''):
+        """Index a generated image under `key`, then evict LRU entries beyond the size budget."""
+        try:
+            size = os.path.getsize(os.path.join(self.root_dir, image_path))
+        except OSError as e:
+            logger.debug(f'⚠️ Not caching missing infographic {image_path}: {e}')
+            return
+        now = time.time()
+        self._conn().execute(
+            'INSERT INTO entries (key, image_path, bytes, topic, language, created_at, last_used_at) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?) ON CONFLICT (key) DO UPDATE SET image_path = excluded.image_path, '
+            'bytes = excluded.bytes, last_used_at = excluded.last_used_at',
+            (key, image_path, size, topic[:200], language, now, now),
+        )
+        with self._lock:
+            self._stats['stores'] += 1
+        self.evict()
+
+    def evict(self) -> int:
+        """Drop least recently used entries (and their files) until within max_bytes; returns entries evicted."""
+        conn = self._conn()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            total = conn.execute('SELECT COALESCE(SUM(bytes), 0) FROM entries').fetchone()[0]
+            victims = []
+            if total > self.max_bytes:
+                for key, image_path, size in conn.execute(
+                        'SELECT key, image_path, bytes FROM entries ORDER BY last_used_at'):
+                    if total <= self.max_bytes:
+                        break
+                    victims.append((key, image_path, size))
+                    total -= size
+                conn.executemany('DELETE FROM entries WHERE key = ?', [(v[0],) for v in victims])
+                # Images are named by content, so another entry may share the file
+                shared = {row[0] for row in conn.execute(
+                    f"SELECT image_path FROM entries WHERE image_path IN ({','.join('?' * len(victims))})",
+                    [v[1] for v in victims])}
+                victims = [v for v in victims if v[1] not in shared]
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        for _, image_path, _ in victims:
+            path = os.path.join(self.root_dir, image_path)
+            image_variants.remove_variants(path)
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        if victims:
+            with self._lock:
+                self._stats['evicted'] += len(victims)
+                self._stats['evicted_bytes'] += sum(v[2] for v in victims)
+            logger.info(f'🧹 Evicted {len(victims)} cached infographic(s) to stay under '
+                        f'{self.max_bytes // (1024 * 1024)} MB')
+        return len(victims)
+
+    def referenced_paths(self) -> Set[str]:
+        """Absolute paths of every indexed image."""
+        rows = self._conn().execute('SELECT image_path FROM entries').fetchall()
+        return {os.path.abspath(os.path.join(self.root_dir, row[0])) for row in rows}
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+        entries, total = self._conn().execute('SELECT COUNT(*), COALESCE(SUM(bytes), 0) FROM entries').fetchone()
+        stats.update(entries=entries, bytes=total, max_bytes=self.max_bytes)
+        stats['hit_rate'] = round(stats['hits'] / stats['lookups'], 3) if stats['lookups'] else 0.0
+        return stats
@@ -0,0 +1,398 @@
+"""
+Infographic Jobs - Persistent Background Queue for Image Generation
+===================================================================
+
+Infographic generation (``ai_services.generate_infographic_image()``) takes
+tens of seconds. Running it inside the request pinned one of the few HTTP
+worker threads for the whole call, so two slow image requests could starve
+chat traffic. Requests now submit a job and return immediately; the image is
+produced on a small dedicated worker pool.
+
+Design:
+    1. **Persistence**: jobs live in SQLite (WAL mode, in DATA_FOLDER) shared
+       by all gunicorn workers, so status can be read from any worker and
+       survives restarts
+    2. **Bounded pool**: each process runs at most INFOGRAPHIC_WORKERS jobs at
+       once on its own threads (never the request threads), and refuses new
+       jobs once INFOGRAPHIC_MAX_PENDING jobs are queued or running
+    3. **Dedupe**: a job for the same (topic, language, content) as a queued
+       or running job returns the existing job instead of a new one
+    4. **Recovery**: jobs are owned by a per-process boot token (a uuid4 made
+       on first use in each process), not the pid, which a restarted
+       container hands out again. Queued or running jobs owned by another
+       token whose process is gone (or reused its pid), or that have not
+       progressed for STALE_SECONDS, are adopted and re-run. A running job
+       refreshes ``updated_at`` every HEARTBEAT_SECONDS, and its result is
+       only written while it still owns the job, so an adopted job is never
+       finished twice
+    5. **Retention**: finished jobs are deleted after INFOGRAPHIC_JOB_RETENTION_SECONDS
+
+States: 'queued' -> 'running' -> 'succeeded' | 'failed'
+
+Usage:
+    job = JOBS.submit(question, content, language='english')
+    JOBS.get(job['id'])            # poll
+    for job in JOBS.watch(job_id):  # or follow until finished
+        ...
+"""
+# Standard library imports
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterator, Optional
+
+# Local application imports
+import ai_services
+from gemini_client import OPERATION_TIMEOUTS
+from infographic_cache import infographic_cache_key
+
+logger = logging.getLogger(__name__)
+
+# ============================================================================
+# CONFIGURATION
+# ============================================================================
+
+WORKERS = int(os.getenv('INFOGRAPHIC_WORKERS', '2'))
+MAX_PENDING = int(os.getenv('INFOGRAPHIC_MAX_PENDING', '20'))
+RETENTION_SECONDS = float(os.getenv('INFOGRAPHIC_JOB_RETENTION_SECONDS', '86400'))
+# A running job is considered abandoned once it outlives the image timeout by this margin
+STALE_SECONDS = OPERATION_TIMEOUTS['image'] + 60
+# Running jobs refresh updated_at this often so they do not look abandoned
+HEARTBEAT_SECONDS = 30.0
+# Orphan adoption and retention purge run at most this often
+SWEEP_SECONDS = 30.0
+# watch() re-reads a job at least this often (other workers' jobs are not notified)
+POLL_SECONDS = 0.5
+
+FINAL_STATES = ('succeeded', 'failed')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id          TEXT PRIMARY KEY,
+    dedupe_key  TEXT NOT NULL,
+    state       TEXT NOT NULL,
+    topic       TEXT NOT NULL,
+    content     TEXT NOT NULL,
+    language    TEXT NOT NULL,
+    force       INTEGER NOT NULL,
+    image_path  TEXT,
+    error       TEXT,
+    reason      TEXT,
+    attempts    INTEGER NOT NULL DEFAULT 0,
+    owner_pid   INTEGER,
+    owner       TEXT,
+    created_at  REAL NOT NULL,
+    started_at  REAL,
+    finished_at REAL,
+    updated_at  REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_by_key ON jobs (dedupe_key, state);
+CREATE INDEX IF NOT EXISTS jobs_by_state ON jobs (state, created_at);
+"""
+
+_ACTIVE = "state IN ('queued', 'running')"
+
+# Job owner of this process (see boot_token())
+_BOOT = {'pid': None, 'token': None}
+_BOOT_LOCK = threading.Lock()
+
+
+def boot_token() -> str:
+    """Owner token of this process; a new one is made after a fork or restart, even with the same pid."""
+    with _BOOT_LOCK:
+        if _BOOT['pid'] != os.getpid():
+            _BOOT.update(pid=os.getpid(), token=uuid.uuid4().hex)
+        return _BOOT['token']
+
+
+class QueueFullError(RuntimeError):
+    """Raised by submit() when INFOGRAPHIC_MAX_PENDING jobs are already queued or running."""
+
+
+def job_dedupe_key(topic: str, content: str, language: str) -> str:
+    """Identical requests share a key: the infographic cache address of the request."""
+    return infographic_cache_key(topic, language, content)
+
+
+def _pid_alive(pid: Optional[int]) -> bool:
+    if not pid:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class InfographicJobQueue:
+    """Process-shared infographic job table with a per-process worker pool."""
+
+    def __init__(self, db_path: str, workers: int = WORKERS, max_pending: int = MAX_PENDING):
+        self.db_path = db_path
+        self.workers = workers
+        self.max_pending = max_pending
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._changed = threading.Condition()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._schema_ready = False
+        self._last_sweep = 0.0
+        self._stats = {'submitted': 0, 'deduped': 0, 'rejected': 0, 'adopted': 0,
+                       'succeeded': 0, 'failed': 0, 'running': 0, 'superseded': 0}
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.db_path) or '.', exist_ok=True)
+            conn = sqlite3.connect(self.db_path, timeout=10, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            if not self._schema_ready:
+                conn.executescript(_SCHEMA)
+                columns = {row['name'] for row in conn.execute('PRAGMA table_info(jobs)')}
+                if 'owner' not in columns:  # databases created before boot tokens
+                    conn.execute('ALTER TABLE jobs ADD COLUMN owner TEXT')
+                self._schema_ready = True
+            self._local.conn = conn
+        return conn
+
+    def _pool(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='infographic-job')
+            return self._executor
+
+    # ------------------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------------------
+    def submit(self, topic: str, content: str = '', language: str = 'english', force: bool = False) -> Dict[str, Any]:
+        """
+        Queue an infographic job, or join an identical queued/running one.
+
+        Args:
+            topic: Question or topic the infographic is about
+            content: Answer text to visualize
+            language: Language for the infographic labels
+            force: Bypass the per-topic cooldown
+
+        Returns:
+            Job dict (see get()) with 'deduped' set when an existing job was returned
+
+        Raises:
+            QueueFullError: if max_pending jobs are already queued or running
+        """
+        self._maybe_sweep()
+        key = job_dedupe_key(topic, content, language)
+        now = time.time()
+        conn = self._conn()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute(f'SELECT id FROM jobs WHERE dedupe_key = ? AND {_ACTIVE} LIMIT 1', (key,)).fetchone()
+            if row is not None:
+                conn.execute('COMMIT')
+                with self._lock:
+                    self._stats['deduped'] += 1
+                return {**self.get(row['id']), 'deduped': True}
+            pending = conn.execute(f'SELECT COUNT(*) FROM jobs WHERE {_ACTIVE}').fetchone()[0]
+            if pending >= self.max_pending:
+                conn.execute('COMMIT')
+                with self._lock:
+                    self._stats['rejected'] += 1
+                raise QueueFullError(f'{pending} infographic jobs already pending')
+            job_id = uuid.uuid4().hex
+            conn.execute(
+                'INSERT INTO jobs (id, dedupe_key, state, topic, content, language, force, owner_pid, owner, '
+                'created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (job_id, key, 'queued', topic, content, language, int(force), os.getpid(), boot_token(), now, now),
+            )
+            conn.execute('COMMIT')
+        except QueueFullError:
+            raise
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        with self._lock:
+            self._stats['submitted'] += 1
+        self._pool().submit(self._run, job_id)
+        logger.info(f"🗂️ Infographic job {job_id[:8]} queued for '{topic[:50]}' in {language}")
+        return {**self.get(job_id), 'deduped': False}
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Public view of a job (None if unknown or purged)."""
+        self._maybe_sweep()
+        row = self._conn().execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = {
+            'id': row['id'],
+            'state': row['state'],
+            'topic': row['topic'],
+            'language': row['language'],
+            'attempts': row['attempts'],
+            'created_at': row['created_at'],
+            'started_at': row['started_at'],
+            'finished_at': row['finished_at'],
+        }
+        if row['state'] == 'queued':
+            job['position'] = self._conn().execute(
+                "SELECT COUNT(*) FROM jobs WHERE state = 'queued' AND created_at < ?", (row['created_at'],)
+            ).fetchone()[0]
+        if row['state'] == 'succeeded':
+            job['infographic_url'] = f"/uploads/{row['image_path']}"
+        if row['state'] == 'failed':
+            job['error'] = row['error']
+            job['reason'] = row['reason']
+        return job
+
+    def watch(self, job_id: str, timeout: float = STALE_SECONDS * 2) -> Iterator[Dict[str, Any]]:
+        """Yield the job each time its state changes, ending once it is finished, gone or timed out."""
+        deadline = time.monotonic() + timeout
+        last_seen = None
+        while True:
+            job = self.get(job_id)
+            if job is None:
+                return
+            seen = (job['state'], job.get('position'))
+            if seen != last_seen:
+                last_seen = seen
+                yield job
+            if job['state'] in FINAL_STATES or time.monotonic() >= deadline:
+                return
+            with self._changed:
+                self._changed.wait(POLL_SECONDS)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+        stats['workers'] = self.workers
+        stats['max_pending'] = self.max_pending
+        try:
+            rows = self._conn().execute('SELECT state, COUNT(*) FROM jobs GROUP BY state').fetchall()
+            stats['jobs'] = {state: count for state, count in rows}
+        except sqlite3.Error:
+            stats['jobs'] = {}
+        return stats
+
+    # ------------------------------------------------------------------
+    # Internals
+    # ------------------------------------------------------------------
+    def _notify(self):
+        with self._changed:
+            self._changed.notify_all()
+
+    def _heartbeat(self, job_id: str, token: str, stop: threading.Event):
+        """Keep a running job's updated_at fresh until `stop` is set or the job is taken over."""
+        while not stop.wait(HEARTBEAT_SECONDS):
+            try:
+                if not self._conn().execute(
+                    "UPDATE jobs SET updated_at = ? WHERE id = ? AND owner = ? AND state = 'running'",
+                    (time.time(), job_id, token),
+                ).rowcount:
+                    return
+            except sqlite3.Error as e:
+                logger.debug(f'Infographic job heartbeat failed: {e}')
+
+    def _run(self, job_id: str):
+        """Execute one job on a pool thread."""
+        conn = self._conn()
+        token = boot_token()
+        now = time.time()
+        claimed = conn.execute(
+            "UPDATE jobs SET state = 'running', started_at = ?, updated_at = ?, attempts = attempts + 1 "
+            "WHERE id = ? AND state = 'queued' AND owner = ?",
+            (now, now, job_id, token),
+        ).rowcount
+        if not claimed:
+            return
+        with self._lock:
+            self._stats['running'] += 1
+        self._notify()
+        stop_heartbeat = threading.Event()
+        threading.Thread(target=self._heartbeat, args=(job_id, token, stop_heartbeat),
+                         name=f'infographic-heartbeat-{job_id[:8]}', daemon=True).start()
+
+        row = conn.execute('SELECT topic, content, language, force FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        image_path, error, reason = None, None, None
+        try:
+            on_cooldown = not row['force'] and ai_services._infographic_is_on_cooldown(row['topic'])
+            image_path = ai_services.generate_infographic_image(
+                content=row['content'], topic=row['topic'], language=row['language'], force=bool(row['force'])
+            )
+            if not image_path and on_cooldown:
+                error, reason = 'Infographic generation skipped due to recent similar generation', 'cooldown'
+            elif not image_path:
+                error, reason = 'Infographic generation failed', 'generation_failed'
+        except Exception as e:
+            logger.error(f'❌ Infographic job {job_id[:8]} failed: {e}')
+            error, reason = str(e), 'error'
+        finally:
+            stop_heartbeat.set()
+
+        state = 'succeeded' if image_path else 'failed'
+        now = time.time()
+        # Only the current owner finishes the job: another process may have adopted it meanwhile
+        owned = conn.execute(
+            'UPDATE jobs SET state = ?, image_path = ?, error = ?, reason = ?, finished_at = ?, updated_at = ? '
+            "WHERE id = ? AND owner = ? AND state = 'running'",
+            (state, image_path, error, reason, now, now, job_id, token),
+        ).rowcount
+        with self._lock:
+            self._stats['running'] -= 1
+            self._stats[state if owned else 'superseded'] += 1
+        self._notify()
+        if not owned:
+            logger.warning(f'⚠️ Infographic job {job_id[:8]} was taken over by another worker; result discarded')
+        elif image_path:
+            logger.info(f'✅ Infographic job {job_id[:8]} finished: {image_path}')
+        else:
+            logger.warning(f'⚠️ Infographic job {job_id[:8]} failed: {error}')
+
+    def _maybe_sweep(self):
+        if time.monotonic() - self._last_sweep < SWEEP_SECONDS:
+            return
+        self._last_sweep = time.monotonic()
+        try:
+            self.sweep()
+        except sqlite3.Error as e:
+            logger.warning(f'⚠️ Infographic job sweep failed: {e}')
+
+    def sweep(self) -> int:
+        """Adopt orphaned jobs into this process and purge expired finished jobs; returns jobs adopted."""
+        conn = self._conn()
+        now = time.time()
+        conn.execute("DELETE FROM jobs WHERE state IN ('succeeded', 'failed') AND finished_at < ?",
+                     (now - RETENTION_SECONDS,))
+        rows = conn.execute(f'SELECT id, state, owner_pid, owner, updated_at FROM jobs WHERE {_ACTIVE}').fetchall()
+        token = boot_token()
+        adopted = []
+        for row in rows:
+            if row['owner'] == token:
+                continue
+            # A foreign token with our pid belongs to an earlier process that had this pid
+            owner_alive = row['owner_pid'] != os.getpid() and _pid_alive(row['owner_pid'])
+            if owner_alive and now - row['updated_at'] < STALE_SECONDS:
+                continue
+            # Compare-and-swap on the previous owner so only one process adopts a job
+            if conn.execute(
+                "UPDATE jobs SET state = 'queued', owner_pid = ?, owner = ?, updated_at = ? "
+                f"WHERE id = ? AND owner IS ? AND {_ACTIVE}",
+                (os.getpid(), token, now, row['id'], row['owner']),
+            ).rowcount:
+                adopted.append(row['id'])
+        for job_id in adopted:
+            self._pool().submit(self._run, job_id)
+        if adopted:
+            with self._lock:
+                self._stats['adopted'] += len(adopted)
+            logger.info(f'♻️ Re-queued {len(adopted)} orphaned infographic job(s)')
+        return len(adopted)
+
+
+JOBS = InfographicJobQueue(ai_services.state_path('infographic_jobs.sqlite3'))
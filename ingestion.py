@@ -0,0 +1,348 @@
+"""
+Document Ingestion Pipeline
+===========================
+
+Extracts, normalizes and chunks knowledge base documents into a local,
+content-addressed chunk store. This is the text source for local retrieval
+(retrieval.py) and for deduplication across formats.
+
+Pipeline:
+    1. **Discover**: walk the knowledge base for supported extensions
+       (.pdf, .txt, .json)
+    2. **Hash**: SHA-256 of each file's bytes; files whose hash already has a
+       chunk file are skipped, so re-runs only parse changed documents
+    3. **Extract + chunk** (process pool): PDFs page by page, TXT files by
+       section heading, JSON records one per section; text is normalized
+       (NFKC, de-hyphenated line breaks, rewrapped lines) and packed into
+       paragraph/sentence-aligned chunks that never cross a page or section
+    4. **Store**: one `<sha256>.json` per file plus `index.json` mapping each
+       source path to its hash; writes are atomic (temp file + rename)
+
+Usage:
+    python ingestion.py                      # ingest knowledge_base/
+    python ingestion.py --workers 8 --kb-dir knowledge_base
+
+Configuration (environment variables):
+    - CHUNK_STORE_DIR: chunk store location (default '.chunk_store')
+    - CHUNK_MAX_CHARS: target chunk size in characters (default 1000)
+"""
+# Standard library imports
+import argparse
+import concurrent.futures
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import re
+import time
+import unicodedata
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# ============================================================================
+# CONFIGURATION
+# ============================================================================
+
+CHUNK_STORE_DIR = os.getenv('CHUNK_STORE_DIR', '.chunk_store')
+CHUNK_MAX_CHARS = int(os.getenv('CHUNK_MAX_CHARS', '1000'))
+SUPPORTED_EXTENSIONS = ('.pdf', '.txt', '.json')
+
+# Bump when extraction/normalization/chunking changes so stored chunks are rebuilt
+PIPELINE_VERSION = 1
+
+_INDEX_NAME = 'index.json'
+_HASH_BUFFER = 1024 * 1024
+
+_HEADING_RE = re.compile(r'^(?:\d+[.)]\s+)?[A-Z][A-Z0-9 ,&/()\-]{3,}$')
+_BULLET_RE = re.compile(r'^\s*(?:[-•*▪●]|\d+[.)]|[a-z][.)])\s+')
+_SENTENCE_RE = re.compile(r'(?<=[.!?।])\s+')
+
+
+# ============================================================================
+# EXTRACTION
+# ============================================================================
+
+def _extract_pdf(path: str) -> List[Dict[str, Any]]:
+    from pypdf import PdfReader
+    reader = PdfReader(path)
+    return [{'text': page.extract_text() or '', 'page': i, 'section': None}
+            for i, page in enumerate(reader.pages, start=1)]
+
+
+def _extract_txt(path: str) -> List[Dict[str, Any]]:
+    """Split plain text into sections at ALL-CAPS heading lines."""
+    with open(path, 'r', encoding='utf-8', errors='replace') as fh:
+        text = fh.read()
+    sections: List[Dict[str, Any]] = []
+    title, lines = None, []
+    for line in text.splitlines():
+        stripped = line.strip()
+        if _HEADING_RE.match(stripped) and not set(stripped) <= set('=-_ '):
+            if any(l.strip() for l in lines):
+                sections.append({'text': '\n'.join(lines), 'page': None, 'section': title})
+            title, lines = stripped, []
+        else:
+            lines.append(line)
+    if any(l.strip() for l in lines):
+        sections.append({'text': '\n'.join(lines), 'page': None, 'section': title})
+    return sections
+
+
+def _extract_json(path: str) -> List[Dict[str, Any]]:
+    """One section per record; records use the scraper's title/content fields."""
+    with open(path, 'r', encoding='utf-8') as fh:
+        data = json.load(fh)
+    records = data if isinstance(data, list) else [data]
+    sections = []
+    for record in records:
+        if not isinstance(record, dict):
+            continue
+        body = record.get('content') or record.get('text') or ''
+        if body:
+            sections.append({'text': body, 'page': None, 'section': record.get('title')})
+    return sections
+
+
+_EXTRACTORS = {'.pdf': _extract_pdf, '.txt': _extract_txt, '.json': _extract_json}
+
+
+# ============================================================================
+# NORMALIZATION & CHUNKING
+# ============================================================================
+
+def normalize_text(text: str) -> str:
+    """
+    Normalize extracted text.
+
+    NFKC-folds the text, drops control characters, re-joins words hyphenated
+    across line breaks and rewraps hard-wrapped lines into paragraphs (bullet
+    and numbered lines keep their own line). Paragraphs are separated by a
+    blank line.
+    """
+    text = unicodedata.normalize('NFKC', text or '')
+    text = ''.join(ch for ch in text if ch in '\n\t' or unicodedata.category(ch)[0] != 'C')
+    text = re.sub(r'(\w)-\n(\w)', r'\1\2', text)
+    paragraphs = []
+    for block in re.split(r'\n\s*\n', text):
+        lines = []
+        for raw in block.split('\n'):
+            line = re.sub(r'[ \t]+', ' ', raw).strip()
+            if not line or set(line) <= set('=-_'):
+                continue
+            if lines and not _BULLET_RE.match(line):
+                lines[-1] = f'{lines[-1]} {line}'
+            else:
+                lines.append(line)
+        if lines:
+            paragraphs.append('\n'.join(lines))
+    return '\n\n'.join(paragraphs)
+
+
+def chunk_text(text: str, max_chars: int = CHUNK_MAX_CHARS) -> List[str]:
+    """Pack paragraphs (split into sentences when oversized) into chunks of at most ~max_chars."""
+    pieces: List[str] = []
+    for para in text.split('\n\n'):
+        if len(para) <= max_chars:
+            pieces.append(para)
+            continue
+        for sentence in _SENTENCE_RE.split(para):
+            while len(sentence) > max_chars:
+                pieces.append(sentence[:max_chars])
+                sentence = sentence[max_chars:]
+            if sentence:
+                pieces.append(sentence)
+
+    chunks, current = [], ''
+    for piece in pieces:
+        if current and len(current) + len(piece) + 2 > max_chars:
+            chunks.append(current)
+            current = ''
+        current = f'{current}\n\n{piece}' if current else piece
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def process_file(path: str, file_hash: str, source: str, max_chars: int = CHUNK_MAX_CHARS) -> Dict[str, Any]:
+    """
+    Extract, normalize and chunk one file. Runs in a worker process.
+
+    Returns:
+        Chunk-store record: file hash, source, pipeline version and chunk list
+        (each chunk has id, text, source, page, section, ordinal)
+    """
+    ext = os.path.splitext(path)[1].lower()
+    chunks: List[Dict[str, Any]] = []
+    for section in _EXTRACTORS[ext](path):
+        normalized = normalize_text(section['text'])
+        for text in chunk_text(normalized, max_chars):
+            ordinal = len(chunks)
+            chunks.append({
+                'id': f'{file_hash[:16]}:{ordinal}',
+                'text': text,
+                'source': source,
+                'page': section['page'],
+                'section': section['section'],
+                'ordinal': ordinal,
+            })
+    return {'file_hash': file_hash, 'source': source, 'pipeline_version': PIPELINE_VERSION, 'chunks': chunks}
+
+
+# ============================================================================
+# CHUNK STORE
+# ============================================================================
+
+def file_sha256(path: str) -> str:
+    """SHA-256 of a file's bytes."""
+    h = hashlib.sha256()
+    with open(path, 'rb') as fh:
+        for block in iter(lambda: fh.read(_HASH_BUFFER), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _atomic_write_json(path: str, data: Any):
+    tmp = f'{path}.tmp.{os.getpid()}'
+    with open(tmp, 'w', encoding='utf-8') as fh:
+        json.dump(data, fh, ensure_ascii=False)
+    os.replace(tmp, path)
+
+
+def _chunk_path(store_dir: str, file_hash: str) -> str:
+    return os.path.join(store_dir, f'{file_hash}.json')
+
+
+def _is_current(store_dir: str, file_hash: str) -> bool:
+    path = _chunk_path(store_dir, file_hash)
+    if not os.path.exists(path):
+        return False
+    try:
+        with open(path, 'r', encoding='utf-8') as fh:
+            return json.load(fh).get('pipeline_version') == PIPELINE_VERSION
+    except Exception:
+        return False
+
+
+def discover_files(kb_dir: str) -> List[str]:
+    """All supported documents under kb_dir, sorted for stable ordering."""
+    paths = []
+    for root, _dirs, files in os.walk(kb_dir):
+        for filename in files:
+            if filename.lower().endswith(SUPPORTED_EXTENSIONS):
+                paths.append(os.path.join(root, filename))
+    return sorted(paths)
+
+
+def ingest_directory(kb_dir: str = 'knowledge_base', store_dir: str = CHUNK_STORE_DIR,
+                     max_workers: Optional[int] = None, max_chars: int = CHUNK_MAX_CHARS) -> Dict[str, Any]:
+    """
+    Bring the chunk store up to date with kb_dir.
+
+    Only files whose content hash has no current chunk record are parsed; that
+    work is spread over a process pool. Chunk records no longer referenced by
+    any source are deleted.
+
+    Returns:
+        Stats dict: files, processed, skipped, failed, chunks, seconds
+    """
+    start = time.perf_counter()
+    os.makedirs(store_dir, exist_ok=True)
+    paths = discover_files(kb_dir)
+
+    workers = max_workers or min(8, os.cpu_count() or 2)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as pool:
+        hashes = dict(zip(paths, pool.map(file_sha256, paths)))
+
+    pending: Dict[str, Tuple[str, str]] = {}
+    for path, file_hash in hashes.items():
+        if file_hash not in pending and not _is_current(store_dir, file_hash):
+            pending[file_hash] = (path, os.path.relpath(path, kb_dir))
+
+    failed: List[str] = []
+    if pending:
+        logger.info(f"🧩 Ingesting {len(pending)} changed file(s) on {workers} process(es)...")
+        # spawn: called from request and warmup threads, and forking a multi-threaded process is not safe
+        with concurrent.futures.ProcessPoolExecutor(
+                max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+            futures = {pool.submit(process_file, path, file_hash, source, max_chars): (path, file_hash)
+                       for file_hash, (path, source) in pending.items()}
+            for fut in concurrent.futures.as_completed(futures):
+                path, file_hash = futures[fut]
+                try:
+                    _atomic_write_json(_chunk_path(store_dir, file_hash), fut.result())
+                except Exception as e:
+                    failed.append(path)
+                    logger.warning(f'⚠️ Ingestion failed for {path}: {e}')
+
+    index = {os.path.relpath(path, kb_dir): {'hash': file_hash, 'size': os.path.getsize(path)}
+             for path, file_hash in hashes.items() if path not in failed}
+    _atomic_write_json(os.path.join(store_dir, _INDEX_NAME), {'pipeline_version': PIPELINE_VERSION, 'files': index})
+
+    # Drop chunk records whose source changed or disappeared
+    live = {entry['hash'] for entry in index.values()}
+    for name in os.listdir(store_dir):
+        if name.endswith('.json') and name != _INDEX_NAME and name[:-5] not in live:
+            os.remove(os.path.join(store_dir, name))
+
+    stats = {
+        'files': len(paths),
+        'processed': len(pending) - len(failed),
+        'skipped': len(paths) - len(pending),
+        'failed': len(failed),
+        'chunks': sum(1 for _ in iter_chunks(store_dir)),
+        'seconds': round(time.perf_counter() - start, 2),
+    }
+    logger.info(f"🧩 Ingestion complete: {stats}")
+    return stats
+
+
+def iter_chunks(store_dir: str = CHUNK_STORE_DIR, dedupe: bool = True):
+    """
+    Yield chunks for every indexed source.
+
+    With dedupe, files with identical bytes are read once and chunks whose
+    text exactly repeats an earlier chunk (e.g. the same article scraped to
+    both .txt and .json) are skipped.
+    """
+    index_path = os.path.join(store_dir, _INDEX_NAME)
+    if not os.path.exists(index_path):
+        return
+    with open(index_path, 'r', encoding='utf-8') as fh:
+        files = json.load(fh).get('files', {})
+    seen_files, seen_text = set(), set()
+    for source in sorted(files):
+        file_hash = files[source]['hash']
+        if dedupe and file_hash in seen_files:
+            continue
+        seen_files.add(file_hash)
+        try:
+            with open(_chunk_path(store_dir, file_hash), 'r', encoding='utf-8') as fh:
+                record = json.load(fh)
+        except Exception as e:
+            logger.warning(f'⚠️ Missing chunk record for {source}: {e}')
+            continue
+        for chunk in record['chunks']:
+            if dedupe:
+                digest = hashlib.sha1(re.sub(r'\s+', ' ', chunk['text'].lower()).encode('utf-8')).digest()
+                if digest in seen_text:
+                    continue
+                seen_text.add(digest)
+            yield chunk
+
+
+def load_chunks(store_dir: str = CHUNK_STORE_DIR, dedupe: bool = True) -> List[Dict[str, Any]]:
+    """All chunks in the store as a list (see iter_chunks)."""
+    return list(iter_chunks(store_dir, dedupe=dedupe))
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description='Ingest knowledge base documents into the local chunk store')
+    parser.add_argument('--kb-dir', default='knowledge_base', help='Knowledge base directory (default: knowledge_base)')
+    parser.add_argument('--store-dir', default=CHUNK_STORE_DIR, help=f'Chunk store directory (default: {CHUNK_STORE_DIR})')
+    parser.add_argument('--workers', type=int, default=None, help='Worker processes (default: min(8, CPU count))')
+    parser.add_argument('--max-chars', type=int, default=CHUNK_MAX_CHARS, help=f'Chunk size (default: {CHUNK_MAX_CHARS})')
+    args = parser.parse_args()
+    print(json.dumps(ingest_directory(args.kb_dir, args.store_dir, args.workers, args.max_chars), indent=2))
@@ -0,0 +1,212 @@
+"""
+Intent Matcher - Precompiled Keyword Routing for Questions
+==========================================================
+
+``classify_query_type()`` and ``decide_make_infographic()`` route questions
+with cheap keyword checks before (or instead of) an LLM call. They used to
+scan several Python lists with ``pattern in question_lower``, which also
+matched inside words ("hi" in "this", "vs" in "canvas", "pest" in
+"pesticide") and sent real questions down the wrong path.
+
+All phrases now live in two tables (English; Hinglish and Hindi) and are
+compiled into a single regex (an alternation factored into a prefix trie)
+plus a phrase -> intent map:
+
+    1. **Whole words only**: every phrase is wrapped in boundaries that also
+       treat Devanagari letters and vowel signs as word characters (Python's
+       ``\\b`` does not, so ``\\bतरीका\\b`` never matches)
+    2. **Inflections**: single English words also match -s/-es/-ed/-ing forms
+       (with e-dropping and y -> i), so "diseases", "charts" and "comparing"
+       route like their base word while "pesticide" and "canvas" still don't
+    3. **Flexible spacing**: spaces inside a phrase match any run of whitespace
+    4. **One pass**: ``match_intents()`` scans the lower-cased text once and
+       returns every matched intent, the phrase that triggered it and the
+       infographic style hint
+    5. **Languages**: English, Hindi (Devanagari) and Hinglish (romanized)
+
+Benchmark against the previous substring scan:
+    python scripts/benchmark_intents.py
+"""
+# Standard library imports
+import re
+import unicodedata
+from typing import Any, Dict, FrozenSet, NamedTuple, Optional, Tuple
+
+# ============================================================================
+# CONFIGURATION
+# ============================================================================
+
+# intent -> English phrases; single words also match their inflections
+# (-s/-es/-ed/-ing: "diseases", "charts", "comparing", "identified")
+ENGLISH_PHRASES: Dict[str, tuple] = {
+    'create': ('create',),
+    'pleasantry': (
+        'hello', 'hi', 'hey', 'good morning', 'good evening', 'thank you', 'thanks', 'bye', 'goodbye',
+        'how are you', 'what is your name', 'who are you', 'who made you',
+    ),
+    'visual_request': ('show me', 'diagram', 'chart', 'infographic', 'visual'),
+    'image_reference': ('picture', 'image', 'photo'),
+    'steps': ('steps', 'step by step', 'how to', 'how do i', 'procedure', 'process'),
+    'schedule': ('schedule', 'calendar', 'timeline', 'when to'),
+    'symptoms': ('symptom', 'identify', 'signs of', 'disease', 'pest'),
+    'compare': ('compare', 'comparison', 'difference between', 'vs', 'versus'),
+}
+
+# intent -> Hinglish (romanized) and Hindi phrases, matched as written
+LOCAL_PHRASES: Dict[str, tuple] = {
+    'create': ('banao', 'bana do', 'banaiye', 'बनाओ', 'बना दो', 'बनाइए'),
+    'pleasantry': (
+        'namaste', 'namaskar', 'ram ram', 'dhanyawad', 'dhanyavad', 'shukriya', 'alvida',
+        'kaise ho', 'aap kaise hain', 'aapka naam', 'tum kaun ho', 'aap kaun hain',
+        'नमस्ते', 'नमस्कार', 'राम राम', 'धन्यवाद', 'शुक्रिया', 'अलविदा', 'आप कैसे हैं', 'कैसे हो',
+        'आपका नाम', 'आप कौन हैं', 'तुम कौन हो',
+    ),
+    'visual_request': (
+        'dikhao', 'dikhaiye', 'dikha do', 'दिखाओ', 'दिखाइए', 'दिखा दो', 'चार्ट', 'आरेख', 'इन्फोग्राफिक',
+    ),
+    'image_reference': ('tasveer', 'chitra', 'तस्वीर', 'चित्र', 'फोटो', 'फ़ोटो'),
+    'steps': (
+        'kaise kare', 'kaise karein', 'kaise karen', 'tarika', 'vidhi', 'prakriya',
+        'कैसे करें', 'कैसे करे', 'तरीका', 'विधि', 'प्रक्रिया', 'चरण',
+    ),
+    'schedule': (
+        'kab kare', 'kab karein', 'kab dale', 'kab dalein', 'samay sarini',
+        'कब करें', 'कब डालें', 'समय सारणी', 'कैलेंडर',
+    ),
+    'symptoms': (
+        'lakshan', 'rog', 'bimari', 'beemari', 'keet', 'keeda', 'pehchan',
+        'लक्षण', 'रोग', 'बीमारी', 'कीट', 'कीड़ा', 'पहचान',
+    ),
+    'compare': ('antar', 'fark', 'farak', 'tulna', 'अंतर', 'फर्क', 'फ़र्क', 'तुलना'),
+}
+
+# Greetings are matched exactly: they do not inflect, and "hi" + "s" is "his"
+_UNINFLECTED_INTENTS = frozenset({'pleasantry'})
+
+# Intents that ask for a visual answer (/ask format suggestion)
+VISUAL_INTENTS = frozenset({'visual_request', 'image_reference', 'steps', 'schedule', 'symptoms', 'compare'})
+# Intents that warrant an infographic for a generated answer; image_reference is left out
+# because image scan prompts mention "image"/"photo" without asking for a visual
+INFOGRAPHIC_INTENTS = frozenset({'create', 'visual_request', 'steps', 'schedule', 'symptoms', 'compare'})
+# Infographic style hint per intent (others: 'detailed'); these win over generic intents
+STYLES = {'schedule': 'timeline', 'compare': 'chart'}
+
+# Word characters for boundaries: \w plus the Devanagari block (vowel signs are not \w)
+_WORD = r'\wऀ-ॿ'
+
+
+class IntentMatch(NamedTuple):
+    intents: FrozenSet[str]
+    # intent -> first phrase matched for it (lower case), in order of appearance
+    keywords: Dict[str, str]
+    # earliest matched intent in the text
+    first: Optional[str]
+
+    def any(self, intents: FrozenSet[str]) -> bool:
+        return not self.intents.isdisjoint(intents)
+
+    def style(self) -> str:
+        """Infographic style hint: the earliest intent with a specific style ('timeline', 'chart'), else 'detailed'."""
+        for intent in self.keywords:
+            if intent in STYLES:
+                return STYLES[intent]
+        return 'detailed'
+
+
+def _inflection(word: str) -> Tuple[str, str]:
+    """(stem, required suffix pattern) matching an English word and its -s/-es/-ed/-ing forms."""
+    if word.endswith('e'):
+        return word[:-1], '(?:e[sd]?|ing)'
+    if word.endswith('y') and word[-2:-1] not in 'aeiou':
+        return word[:-1], '(?:y|ies|ied|ying)'
+    if word.endswith(('s', 'x', 'sh', 'ch')):
+        return word, '(?:|es|ed|ing)'
+    return word, '(?:|s|ed|ing)'
+
+
+def _trie_pattern(phrases: Dict[str, Optional[str]]) -> str:
+    """
+    Regex matching any of `phrases`, factored by common prefixes.
+
+    Each phrase maps to the suffix pattern that must follow it (None: none).
+    Python's re tries the branches of a flat alternation one by one at every
+    position; a prefix trie rejects most positions after a character or two.
+    """
+    trie: Dict[str, Any] = {}
+    for phrase, suffix in phrases.items():
+        node = trie
+        for ch in phrase:
+            node = node.setdefault(ch, {})
+        node.setdefault('', set()).add(suffix)
+
+    def build(node: Dict[str, Any]) -> str:
+        ends = node.get('', set())
+        alternatives = [(r'\s+' if ch == ' ' else re.escape(ch)) + build(child)
+                        for ch, child in sorted(node.items()) if ch]
+        alternatives += sorted(suffix for suffix in ends if suffix)
+        if not alternatives:
+            return ''
+        pattern = alternatives[0] if len(alternatives) == 1 else f"(?:{'|'.join(alternatives)})"
+        # A phrase ends here: the longer continuations are optional (greedy, so longest wins)
+        return f'(?:{pattern})?' if None in ends else pattern
+
+    return build(trie)
+
+
+def _normalize(text: str) -> str:
+    return unicodedata.normalize('NFC', text or '').lower()
+
+
+def _compile():
+    """Build the phrase -> intent map, the stem -> intent map and the matcher regex."""
+    phrase_intents: Dict[str, str] = {}
+    stem_intents: Dict[str, str] = {}
+    patterns: Dict[str, Optional[str]] = {}
+    for table in (ENGLISH_PHRASES, LOCAL_PHRASES):
+        for intent, phrases in table.items():
+            for p in phrases:
+                phrase = ' '.join(_normalize(p).split())
+                phrase_intents[phrase] = intent
+                if table is ENGLISH_PHRASES and ' ' not in phrase and intent not in _UNINFLECTED_INTENTS:
+                    stem, suffix = _inflection(phrase)
+                    stem_intents[stem] = intent
+                    patterns[stem] = suffix
+                else:
+                    patterns[phrase] = None
+    matcher = re.compile(rf'(?<![{_WORD}])(?:{_trie_pattern(patterns)})(?![{_WORD}])')
+    return phrase_intents, stem_intents, matcher
+
+
+# phrase (normalized, single-spaced) -> intent; inflected word stem -> intent
+_PHRASE_INTENTS, _STEM_INTENTS, _MATCHER = _compile()
+_SUFFIXES = ('ying', 'ies', 'ied', 'ing', 'es', 'ed', 's', 'e', 'y')
+
+
+def _intent_of(phrase: str) -> str:
+    intent = _PHRASE_INTENTS.get(phrase)
+    if intent is not None:
+        return intent
+    if phrase in _STEM_INTENTS:
+        return _STEM_INTENTS[phrase]
+    for suffix in _SUFFIXES:
+        if phrase.endswith(suffix) and phrase[:-len(suffix)] in _STEM_INTENTS:
+            return _STEM_INTENTS[phrase[:-len(suffix)]]
+    raise KeyError(phrase)
+
+
+def match_intents(text: str) -> IntentMatch:
+    """
+    Find every intent mentioned in a question in one regex pass.
+
+    Args:
+        text: Question or prompt (any case; NFC-normalized before matching)
+
+    Returns:
+        IntentMatch with the matched intents, the phrase that triggered each
+        (in order of first appearance) and the earliest intent
+    """
+    keywords: Dict[str, str] = {}
+    for m in _MATCHER.finditer(_normalize(text)):
+        phrase = ' '.join(m.group(0).split())
+        keywords.setdefault(_intent_of(phrase), phrase)
+    return IntentMatch(frozenset(keywords), keywords, next(iter(keywords), None))
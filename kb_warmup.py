@@ -0,0 +1,267 @@
+"""
+Knowledge Base Warmup - Background Sync with Readiness
+======================================================
+
+Runs the knowledge base sync (``ai_services.initialize_knowledge_base()``)
+in a background thread instead of inside the first user's request, and does
+it once per deployment rather than once per gunicorn worker.
+
+Coordination across worker processes:
+    1. **Leader election**: each process tries a non-blocking exclusive flock
+       on ``.kb_sync.lock``; the holder is the leader and runs the sync
+    2. **Shared status**: the leader writes progress to ``.kb_sync_status.json``
+       (atomic replace); followers mirror it and become ready when it reports
+       'ready' for the current knowledge base fingerprint
+    3. **Once per deployment**: the fingerprint covers the store name and every
+       file's (path, size, mtime_ns); a restarted worker that finds a 'ready'
+       status for the same fingerprint skips the sync entirely
+    4. **Failures**: a sync in which any upload failed ends in 'partial' (or
+       'failed' when nothing uploaded). That status is never up to date for
+       later boots. Any failed attempt, including an error before the sync
+       (no client, store lookup), is retried with exponential backoff
+       (uploaded files are skipped cheaply)
+    5. **Ready with warnings**: after MAX_SYNC_ATTEMPTS incomplete syncs a
+       process becomes ready anyway and lists the files that keep failing in
+       ``warnings``; the shared status stays 'partial', so the next boot
+       tries them again
+    6. **Failover**: the lock is released by the OS if the leader dies, so a
+       waiting follower takes over
+
+Each process also builds its own local retrieval index after the sync when
+RETRIEVAL_MODE is 'local', and preloads the classification reference images.
+
+States: 'idle' -> 'waiting' (follower) | 'syncing' (leader) -> 'ready' | 'partial' | 'failed'
+('partial' and 'failed' retry until 'ready')
+
+Configuration (environment variables):
+    - KB_SYNC_RETRY_SECONDS: delay before the first retry, doubled per attempt (default 15)
+    - KB_SYNC_RETRY_MAX_SECONDS: upper bound of the retry delay (default 300)
+    - KB_SYNC_MAX_ATTEMPTS: incomplete syncs before files that keep failing
+      are reported as warnings instead of blocking readiness (default 3)
+"""
+# Standard library imports
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, Optional
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+
+# Local application imports
+import ai_services
+
+logger = logging.getLogger(__name__)
+
+# ============================================================================
+# CONFIGURATION
+# ============================================================================
+
+LOCK_PATH = '.kb_sync.lock'
+STATUS_PATH = '.kb_sync_status.json'
+# Followers re-read the leader's status this often
+POLL_INTERVAL_SECONDS = 1.0
+# Leader writes progress at most this often
+STATUS_WRITE_INTERVAL_SECONDS = 1.0
+RETRY_INTERVAL_SECONDS = float(os.getenv('KB_SYNC_RETRY_SECONDS', '15'))
+RETRY_MAX_SECONDS = float(os.getenv('KB_SYNC_RETRY_MAX_SECONDS', '300'))
+MAX_SYNC_ATTEMPTS = int(os.getenv('KB_SYNC_MAX_ATTEMPTS', '3'))
+# Final shared states of a sync attempt
+FINISHED_STATES = ('ready', 'partial', 'failed')
+
+
+def knowledge_base_fingerprint(store_name: str) -> str:
+    """Hash of the store name and every knowledge base file's (path, size, mtime_ns)."""
+    h = hashlib.sha256(store_name.encode('utf-8'))
+    for path in ai_services.knowledge_base_files():
+        st = os.stat(path)
+        h.update(f'\0{path}\0{st.st_size}\0{st.st_mtime_ns}'.encode('utf-8'))
+    return h.hexdigest()[:16]
+
+
+def _read_status() -> Dict[str, Any]:
+    try:
+        with open(STATUS_PATH, 'r', encoding='utf-8') as fh:
+            return json.load(fh)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def _write_status(status: Dict[str, Any]):
+    tmp = f'{STATUS_PATH}.tmp.{os.getpid()}'
+    with open(tmp, 'w', encoding='utf-8') as fh:
+        json.dump(status, fh)
+    os.replace(tmp, STATUS_PATH)
+
+
+class KnowledgeBaseWarmup:
+    """Per-process view of the deployment-wide knowledge base sync."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._state: Dict[str, Any] = {
+            'state': 'idle', 'role': None, 'fingerprint': None,
+            'total': 0, 'done': 0, 'failed': 0, 'attempts': 0, 'next_retry_at': None,
+            'started_at': None, 'finished_at': None, 'error': None, 'warnings': [],
+        }
+
+    # ------------------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------------------
+    def start(self) -> bool:
+        """Start the background warmup once per process; returns False if already started."""
+        with self._lock:
+            if self._thread is not None:
+                return False
+            self._state['started_at'] = time.time()
+            self._thread = threading.Thread(target=self._run, name='kb-warmup', daemon=True)
+            self._thread.start()
+            return True
+
+    @property
+    def ready(self) -> bool:
+        with self._lock:
+            return self._state['state'] == 'ready'
+
+    def status(self) -> Dict[str, Any]:
+        """Snapshot of the warmup state and sync progress."""
+        with self._lock:
+            status = dict(self._state)
+        status['ready'] = status['state'] == 'ready'
+        status['progress'] = round(status['done'] / status['total'], 3) if status['total'] else (
+            1.0 if status['ready'] else 0.0)
+        return status
+
+    # ------------------------------------------------------------------
+    # Internals
+    # ------------------------------------------------------------------
+    def _update(self, **fields):
+        with self._lock:
+            self._state.update(fields)
+
+    def _run(self):
+        """Run warmup attempts with exponential backoff until this process is ready."""
+        attempt = 0
+        while True:
+            attempt += 1
+            self._update(attempts=attempt, next_retry_at=None)
+            try:
+                if self._attempt(attempt):
+                    return
+            except Exception as e:
+                logger.error(f'❌ Knowledge base warmup attempt {attempt} failed: {e}')
+                self._update(state='failed', error=str(e), finished_at=time.time())
+            delay = min(RETRY_INTERVAL_SECONDS * 2 ** (attempt - 1), RETRY_MAX_SECONDS)
+            self._update(next_retry_at=time.time() + delay)
+            logger.warning(f'⚠️ Retrying knowledge base warmup in {delay:.0f}s')
+            time.sleep(delay)
+
+    def _attempt(self, attempt: int) -> bool:
+        """One warmup attempt; returns True once this process is ready."""
+        if ai_services.CLIENT is None:
+            raise RuntimeError('Gemini client not initialized')
+        store = ai_services.ensure_file_search_store()
+        fingerprint = knowledge_base_fingerprint(store.name)
+        self._update(fingerprint=fingerprint)
+        sync = self._sync_once_per_deployment(fingerprint, time.time())
+        warnings = []
+        if sync['state'] != 'ready':
+            error = f"{sync.get('failed', 0)} of {sync.get('total', 0)} knowledge base files failed to upload"
+            if attempt < MAX_SYNC_ATTEMPTS:
+                self._update(state=sync['state'], error=error, finished_at=time.time())
+                logger.warning(f'⚠️ Knowledge base sync {sync["state"]}: {error}')
+                return False
+            # Files that keep failing should not keep the whole service out of rotation
+            warnings = [f'{path}: failed to upload after {attempt} attempts'
+                        for path in sync.get('failed_files', [])] or [error]
+            logger.warning(f'⚠️ {error} after {attempt} attempts; serving without them')
+        if ai_services.RETRIEVAL_MODE == 'local':
+            ai_services.get_local_retriever()
+        ai_services.REFERENCE_IMAGES.preload()
+        self._update(state='ready', error=None, warnings=warnings, finished_at=time.time())
+        logger.info(f"✅ Knowledge base ready ({self._state['role']})")
+        return True
+
+    def _sync_once_per_deployment(self, fingerprint: str, since: float) -> Dict[str, Any]:
+        """
+        Wait for or run the sync of `fingerprint`; returns the final shared status.
+
+        A 'ready' status for the fingerprint is always up to date. A 'partial'
+        or 'failed' one only counts when it was written after `since` (by a
+        leader this process waited for); otherwise the sync is run again.
+        """
+        def _finished(status: Dict[str, Any]) -> bool:
+            if status.get('fingerprint') != fingerprint:
+                return False
+            return status.get('state') == 'ready' or (
+                status.get('state') in FINISHED_STATES and status.get('updated_at', 0) >= since)
+
+        while True:
+            status = _read_status()
+            if _finished(status):
+                self._update(role=self._state['role'] or 'follower', total=status.get('total', 0),
+                             done=status.get('done', 0), failed=status.get('failed', 0))
+                return status
+
+            lock_fh = open(LOCK_PATH, 'a')
+            try:
+                if self._try_lock(lock_fh):
+                    # Re-check under the lock: a previous leader may have just finished
+                    if _finished(_read_status()):
+                        continue
+                    return self._lead(fingerprint)
+            finally:
+                lock_fh.close()
+
+            # Another process is the leader: mirror its progress
+            self._update(state='waiting', role='follower', total=status.get('total', 0),
+                         done=status.get('done', 0), failed=status.get('failed', 0))
+            time.sleep(POLL_INTERVAL_SECONDS)
+
+    @staticmethod
+    def _try_lock(fh) -> bool:
+        if fcntl is None:
+            return True
+        try:
+            fcntl.flock(fh, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return True
+        except BlockingIOError:
+            return False
+
+    def _lead(self, fingerprint: str) -> Dict[str, Any]:
+        """Run the sync while holding the leader lock, publishing progress; returns the final status."""
+        logger.info("🚀 Knowledge base warmup: this worker is syncing for the deployment")
+        self._update(state='syncing', role='leader')
+        shared = {'state': 'syncing', 'fingerprint': fingerprint, 'leader_pid': os.getpid(),
+                  'total': 0, 'done': 0, 'failed': 0, 'updated_at': time.time()}
+        _write_status(shared)
+        last_write = [0.0]
+
+        def _progress(done: int, failed: int, total: int):
+            self._update(done=done, failed=failed, total=total)
+            now = time.monotonic()
+            if now - last_write[0] >= STATUS_WRITE_INTERVAL_SECONDS or done == total:
+                last_write[0] = now
+                shared.update(done=done, failed=failed, total=total, updated_at=time.time())
+                _write_status(shared)
+
+        result = ai_services.initialize_knowledge_base(progress=_progress)
+        if not result['failed']:
+            state = 'ready'
+        else:
+            state = 'partial' if result['uploaded'] else 'failed'
+        shared.update(state=state, total=result['total'], done=result['uploaded'] + result['failed'],
+                      failed=result['failed'], failed_files=result.get('failed_files', []),
+                      updated_at=time.time())
+        _write_status(shared)
+        self._update(total=shared['total'], done=shared['done'], failed=shared['failed'])
+        return shared
+
+
+WARMUP = KnowledgeBaseWarmup()
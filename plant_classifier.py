@@ -0,0 +1,397 @@
+"""
+Plant Classifier - Local Pre-Classifier for /classify-plant
+===========================================================
+
+Every /classify-plant request used to go to the model together with the
+reference photos, even when the photo is an obvious sugarcane field. This
+module answers such cases locally, in milliseconds, from the labelled photos
+in ``knowledge_base/plant_images/<category>/``:
+
+    1. **Features** (NumPy, on a 128x128 RGB thumbnail):
+         - HSV color histograms (hue 16, saturation 4, value 4 bins)
+         - HOG: 9 unsigned orientation bins on a 4x4 cell grid, each cell
+           L2-normalized
+         - texture statistics: gradient magnitude mean/std, Laplacian
+           variance, edge density, vertical/horizontal gradient energy ratio
+           and green excess (2G - R - B)
+    2. **Model**: k-nearest neighbours (cosine similarity on standardized
+       features) with similarity-weighted votes. The vote share of the
+       winning label is the confidence
+    3. **Threshold**: only answers with confidence >= PLANT_CLASSIFIER_THRESHOLD
+       are returned; everything else falls back to the model
+
+Scope: only the legacy /classify-plant route (Flask and ASGI) consults the
+local model. The web UI calls /analyze-image, whose single model call returns
+the classification and the diagnosis together; a local label could not skip
+that call, so it is not used there. Enabling the shortcut therefore helps
+API clients and integrations that still call /classify-plant, not the UI.
+
+The model is fitted lazily on first use and refitted when the folder
+changes (checked at most every RELOAD_CHECK_SECONDS). It stays inactive
+until every category has at least MIN_IMAGES_PER_CLASS photos.
+
+Evaluate offline (leave-one-out accuracy and per-image latency, optionally
+against the remote path as well):
+    python plant_classifier.py evaluate
+    python plant_classifier.py evaluate --remote --threshold 0.8
+
+Configuration (environment variables):
+    - PLANT_CLASSIFIER_ENABLED: '1' enables the local /classify-plant shortcut (default '0')
+    - PLANT_CLASSIFIER_THRESHOLD: minimum confidence for a local answer (default 0.85)
+    - PLANT_CLASSIFIER_K: neighbours consulted (default 5)
+"""
+# Standard library imports
+import argparse
+import logging
+import os
+import statistics
+import threading
+import time
+from io import BytesIO
+from typing import Any, Dict, List, Optional, Tuple
+
+# Third-party imports
+import numpy as np
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+# ============================================================================
+# CONFIGURATION
+# ============================================================================
+
+ENABLED = os.getenv('PLANT_CLASSIFIER_ENABLED', '0').lower() in ('1', 'true', 'yes')
+THRESHOLD = float(os.getenv('PLANT_CLASSIFIER_THRESHOLD', '0.85'))
+K = int(os.getenv('PLANT_CLASSIFIER_K', '5'))
+MIN_IMAGES_PER_CLASS = 3
+RELOAD_CHECK_SECONDS = 60.0
+IMAGE_ROOT = os.path.join('knowledge_base', 'plant_images')
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp')
+
+# Folder name -> /classify-plant label
+LABELS = {'sugarcane': 'sugarcane', 'weeds': 'weed', 'weed': 'weed', 'unknown': 'unknown'}
+
+_SIDE = 128
+_HOG_CELLS = 4
+_HOG_BINS = 9
+
+_RECOMMENDATIONS = {
+    'sugarcane': 'Healthy-looking sugarcane: continue regular irrigation, nutrient and pest monitoring.',
+    'weed': 'Remove the weed early (manual weeding or a recommended herbicide) before it competes with the cane.',
+    'unknown': 'Retry with a clearer, closer image of the plant.',
+}
+
+
+def extract_features(data: bytes) -> np.ndarray:
+    """
+    Feature vector of an encoded image (color histograms, HOG, texture statistics).
+
+    Args:
+        data: Encoded image bytes
+
+    Returns:
+        1-D float32 array
+    """
+    with Image.open(BytesIO(data)) as img:
+        img.draft('RGB', (_SIDE * 2, _SIDE * 2))
+        img = ImageOps.exif_transpose(img).convert('RGB').resize((_SIDE, _SIDE), Image.BILINEAR)
+        hsv = np.asarray(img.convert('HSV'), dtype=np.float32) / 255.0
+    rgb = np.asarray(img, dtype=np.float32) / 255.0
+
+    # Color: marginal HSV histograms (hue weighted by saturation so grey pixels don't vote)
+    hue_hist, _ = np.histogram(hsv[..., 0], bins=16, range=(0, 1), weights=hsv[..., 1])
+    sat_hist, _ = np.histogram(hsv[..., 1], bins=4, range=(0, 1))
+    val_hist, _ = np.histogram(hsv[..., 2], bins=4, range=(0, 1))
+    color = np.concatenate([hue_hist / max(hue_hist.sum(), 1e-6), sat_hist / sat_hist.sum(), val_hist / val_hist.sum()])
+
+    # HOG on the luminance channel
+    gray = rgb @ np.array([0.299, 0.587, 0.114], dtype=np.float32)
+    gy, gx = np.gradient(gray)
+    magnitude = np.hypot(gx, gy)
+    orientation = np.mod(np.arctan2(gy, gx), np.pi)
+    bins = np.minimum((orientation / np.pi * _HOG_BINS).astype(np.int64), _HOG_BINS - 1)
+    cell = _SIDE // _HOG_CELLS
+    cell_index = (np.arange(_SIDE) // cell)
+    flat = (cell_index[:, None] * _HOG_CELLS + cell_index[None, :]) * _HOG_BINS + bins
+    hog = np.bincount(flat.ravel(), weights=magnitude.ravel(),
+                      minlength=_HOG_CELLS * _HOG_CELLS * _HOG_BINS).reshape(-1, _HOG_BINS)
+    hog /= np.linalg.norm(hog, axis=1, keepdims=True) + 1e-6
+
+    # Texture statistics
+    laplacian = (np.roll(gray, 1, 0) + np.roll(gray, -1, 0) + np.roll(gray, 1, 1) + np.roll(gray, -1, 1)
+                 - 4 * gray)[1:-1, 1:-1]
+    edge_threshold = magnitude.mean() + magnitude.std()
+    texture = np.array([
+        magnitude.mean(), magnitude.std(), laplacian.var(),
+        (magnitude > edge_threshold).mean(),
+        np.log1p((gy ** 2).sum()) - np.log1p((gx ** 2).sum()),
+        (2 * rgb[..., 1] - rgb[..., 0] - rgb[..., 2]).mean(),
+    ], dtype=np.float32)
+    return np.concatenate([color, hog.ravel(), texture]).astype(np.float32)
+
+
+def _folder_signature(root: str) -> Tuple[tuple, List[Tuple[str, str]]]:
+    """(name, size, mtime) signature of the labelled photos and their (path, label) list."""
+    signature, samples = [], []
+    try:
+        categories = sorted(os.listdir(root))
+    except FileNotFoundError:
+        return (), []
+    for category in categories:
+        label = LABELS.get(category.lower())
+        folder = os.path.join(root, category)
+        if label is None or not os.path.isdir(folder):
+            continue
+        for name in sorted(os.listdir(folder)):
+            if not name.lower().endswith(IMAGE_EXTENSIONS):
+                continue
+            path = os.path.join(folder, name)
+            st = os.stat(path)
+            signature.append((category, name, st.st_size, st.st_mtime_ns))
+            samples.append((path, label))
+    return tuple(signature), samples
+
+
+class KNNModel:
+    """Cosine k-nearest-neighbour classifier on standardized feature vectors."""
+
+    def __init__(self, features: np.ndarray, labels: List[str], k: int = K):
+        self.mean = features.mean(axis=0)
+        self.std = features.std(axis=0) + 1e-6
+        self.matrix = self._normalize(features)
+        self.labels = np.array(labels)
+        self.k = min(k, len(labels))
+
+    def _normalize(self, features: np.ndarray) -> np.ndarray:
+        z = (features - self.mean) / self.std
+        return z / (np.linalg.norm(z, axis=-1, keepdims=True) + 1e-6)
+
+    def predict(self, features: np.ndarray) -> Tuple[str, float, float]:
+        """
+        Returns:
+            (label, confidence, nearest similarity); confidence is the
+            similarity-weighted vote share of the label among the k neighbours
+        """
+        scores = self.matrix @ self._normalize(features)
+        nearest = np.argsort(-scores)[:self.k]
+        weights = np.clip(scores[nearest], 0.0, None) + 1e-6
+        votes: Dict[str, float] = {}
+        for label, weight in zip(self.labels[nearest].tolist(), weights):
+            votes[label] = votes.get(label, 0.0) + float(weight)
+        label = max(votes, key=votes.get)
+        return label, votes[label] / sum(votes.values()), float(scores[nearest[0]])
+
+
+class PlantClassifier:
+    """Lazily fitted, folder-backed local classifier with a confidence threshold."""
+
+    def __init__(self, root: str = IMAGE_ROOT, threshold: float = THRESHOLD, k: int = K, enabled: bool = ENABLED):
+        self.root = root
+        self.threshold = threshold
+        self.k = k
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._model: Optional[KNNModel] = None
+        self._signature: tuple = ()
+        self._checked_at = 0.0
+        self._stats = {'fits': 0, 'samples': 0, 'local': 0, 'fallbacks': 0, 'total_ms': 0.0}
+
+    # ------------------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------------------
+    def classify(self, data: bytes) -> Optional[Dict[str, Any]]:
+        """
+        Classify an image locally when confident.
+
+        Args:
+            data: Encoded (preprocessed) query image
+
+        Returns:
+            Result in the /classify-plant schema (plus 'source': 'local'), or
+            None when disabled, not fitted or below the threshold
+        """
+        if not self.enabled:
+            return None
+        model = self._current_model()
+        if model is None:
+            return None
+        started = time.perf_counter()
+        try:
+            label, confidence, similarity = model.predict(extract_features(data))
+        except Exception as e:
+            logger.warning(f'⚠️ Local plant classifier failed, using the model: {e}')
+            return None
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        with self._lock:
+            self._stats['total_ms'] += elapsed_ms
+            self._stats['local' if confidence >= self.threshold else 'fallbacks'] += 1
+        if confidence < self.threshold:
+            return None
+        logger.info(f'⚡ Local plant classifier: {label} ({confidence:.2f}) in {elapsed_ms:.1f} ms')
+        return {
+            'classification': label,
+            'confidence': round(confidence, 3),
+            'plant_type': 'Sugarcane' if label == 'sugarcane' else ('Weed' if label == 'weed' else 'Unknown'),
+            'details': f'Matched {model.k} nearest reference photos locally (best similarity {similarity:.2f}).',
+            'characteristics': 'Color distribution, leaf/stalk edge orientation and texture',
+            'recommendation': _RECOMMENDATIONS[label],
+            'source': 'local',
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+        decisions = stats['local'] + stats['fallbacks']
+        stats['avg_ms'] = round(stats['total_ms'] / decisions, 2) if decisions else 0.0
+        stats['total_ms'] = round(stats['total_ms'], 1)
+        stats['local_rate'] = round(stats['local'] / decisions, 3) if decisions else 0.0
+        stats.update(enabled=self.enabled, threshold=self.threshold, ready=self._model is not None)
+        return stats
+
+    # ------------------------------------------------------------------
+    # Internals
+    # ------------------------------------------------------------------
+    def _current_model(self) -> Optional[KNNModel]:
+        now = time.monotonic()
+        if now - self._checked_at < RELOAD_CHECK_SECONDS:
+            return self._model
+        with self._lock:
+            if now - self._checked_at < RELOAD_CHECK_SECONDS:
+                return self._model
+            self._checked_at = now
+            signature, samples = _folder_signature(self.root)
+            if signature != self._signature:
+                self._signature = signature
+                self._model = self._fit(samples)
+            return self._model
+
+    def _fit(self, samples: List[Tuple[str, str]]) -> Optional[KNNModel]:
+        features, labels = load_samples(samples)
+        counts = {label: labels.count(label) for label in set(labels)}
+        if len(counts) < 2 or min(counts.values()) < MIN_IMAGES_PER_CLASS:
+            logger.info(f'ℹ️ Local plant classifier inactive: needs {MIN_IMAGES_PER_CLASS}+ photos in at least '
+                        f'two categories under {self.root} (found {counts or "none"})')
+            return None
+        self._stats['fits'] += 1
+        self._stats['samples'] = len(labels)
+        logger.info(f'🌿 Local plant classifier fitted on {len(labels)} photos {counts}')
+        return KNNModel(np.stack(features), labels, self.k)
+
+
+def load_samples(samples: List[Tuple[str, str]]) -> Tuple[List[np.ndarray], List[str]]:
+    """Feature vectors and labels for (path, label) pairs; unreadable images are skipped."""
+    features, labels = [], []
+    for path, label in samples:
+        try:
+            with open(path, 'rb') as fh:
+                features.append(extract_features(fh.read()))
+            labels.append(label)
+        except Exception as e:
+            logger.warning(f'⚠️ Skipping {path}: {e}')
+    return features, labels
+
+
+# ============================================================================
+# OFFLINE EVALUATION
+# ============================================================================
+
+def _latency_summary(samples_ms: List[float]) -> str:
+    if not samples_ms:
+        return 'n/a'
+    ordered = sorted(samples_ms)
+    p95 = ordered[min(len(ordered) - 1, int(round(0.95 * (len(ordered) - 1))))]
+    return f'mean {statistics.mean(ordered):.1f} ms, p50 {statistics.median(ordered):.1f} ms, p95 {p95:.1f} ms'
+
+
+def _remote_classify(path: str) -> Tuple[str, float]:
+    """Classify one image through the /classify-plant model path; returns (label, seconds)."""
+    import app as flask_module
+    import image_preprocess
+
+    with open(path, 'rb') as fh:
+        prepared = image_preprocess.prepare_image(fh.read())
+    instruction = flask_module.AGRICULTURAL_INSTRUCTIONS['english']
+    started = time.perf_counter()
+    resp = flask_module.client.models.generate_content(
+        model='gemini-2.5-flash-lite',
+        contents=flask_module.analysis_contents(flask_module.build_analysis_prompt(instruction, ''),
+                                                prepared.data, prepared.mime_type),
+        config=flask_module.operation_config('classify'),
+    )
+    result = flask_module.parse_analysis(resp.text or '')
+    return str(result['classification'].get('classification', 'unknown')).lower(), time.perf_counter() - started
+
+
+def evaluate(root: str, threshold: float, k: int, remote: bool) -> Dict[str, Any]:
+    """
+    Leave-one-out evaluation of the local classifier (and optionally the model).
+
+    Each photo is classified by a model fitted on all other photos. Note that
+    with --remote the model also sees the folder's first photos as references.
+
+    Returns:
+        Summary dict (also logged)
+    """
+    _, samples = _folder_signature(root)
+    started = time.perf_counter()
+    features, labels = load_samples(samples)
+    extract_ms = (time.perf_counter() - started) * 1000 / max(len(labels), 1)
+    if len(set(labels)) < 2:
+        raise SystemExit(f'Need photos in at least two categories under {root} (found {len(labels)} photo(s))')
+    matrix = np.stack(features)
+
+    local_ms, remote_s = [], []
+    answered = correct_local = correct_combined = correct_remote = 0
+    for i, truth in enumerate(labels):
+        keep = np.arange(len(labels)) != i
+        model = KNNModel(matrix[keep], [l for j, l in enumerate(labels) if j != i], k)
+        t0 = time.perf_counter()
+        with open(samples[i][0], 'rb') as fh:
+            label, confidence, _ = model.predict(extract_features(fh.read()))
+        local_ms.append((time.perf_counter() - t0) * 1000)
+        remote_label = None
+        if remote:
+            remote_label, seconds = _remote_classify(samples[i][0])
+            remote_s.append(seconds)
+            correct_remote += remote_label == truth
+        if confidence >= threshold:
+            answered += 1
+            correct_local += label == truth
+            correct_combined += label == truth
+        elif remote_label is not None:
+            correct_combined += remote_label == truth
+
+    n = len(labels)
+    summary = {
+        'images': n, 'threshold': threshold, 'k': k,
+        'local_coverage': round(answered / n, 3),
+        'local_accuracy': round(correct_local / answered, 3) if answered else None,
+        'feature_extraction_ms': round(extract_ms, 1),
+    }
+    logger.info(f'📊 {n} photos, threshold {threshold}, k={k}')
+    logger.info(f"   Local path: answers {answered}/{n} ({summary['local_coverage']:.0%}), "
+                f"accuracy {summary['local_accuracy'] if answered else 'n/a'}; latency {_latency_summary(local_ms)}")
+    if remote:
+        summary.update(remote_accuracy=round(correct_remote / n, 3), combined_accuracy=round(correct_combined / n, 3))
+        logger.info(f"   Remote path: accuracy {summary['remote_accuracy']}; "
+                    f"latency {_latency_summary([s * 1000 for s in remote_s])}")
+        logger.info(f"   Local + fallback: accuracy {summary['combined_accuracy']}, "
+                    f"remote calls saved {answered}/{n}")
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Local plant pre-classifier tools')
+    sub = parser.add_subparsers(dest='command', required=True)
+    ev = sub.add_parser('evaluate', help='Leave-one-out accuracy and per-image latency')
+    ev.add_argument('--dir', default=IMAGE_ROOT, help='Folder with one sub-folder per category')
+    ev.add_argument('--threshold', type=float, default=THRESHOLD)
+    ev.add_argument('-k', type=int, default=K)
+    ev.add_argument('--remote', action='store_true', help='Also classify every photo with the model (needs GOOGLE_API_KEY)')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    evaluate(args.dir, args.threshold, args.k, args.remote)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,195 @@
+"""
+Reference Images - Preloaded, Compact Reference Set for Plant Classification
+============================================================================
+
+/classify-plant sends a few labelled reference photos (sugarcane, weeds)
+alongside the query image. They used to be globbed and read at full size
+from disk twice per request and sent inline every time. This manager keeps
+a compact copy of each category in memory:
+
+    1. **Load once**: each category is read, EXIF-transposed, downscaled to
+       REFERENCE_IMAGE_MAX_SIDE and re-encoded as JPEG on first use (or at
+       warmup via ``preload()``); requests only copy references to bytes
+    2. **Hot reload**: at most every RELOAD_CHECK_SECONDS the folder's
+       (name, size, mtime) signature is compared and a changed category is
+       rebuilt, so adding or replacing photos needs no restart
+    3. **Uploaded references** (optional, REFERENCE_IMAGES_UPLOAD=1): the
+       compact images are registered with the Gemini Files API and requests
+       reference them by URI instead of re-sending the bytes; files are
+       re-uploaded before they expire
+
+Images larger than 768 px on a side are tiled by the model (each tile
+costing a fixed token count), so the default max side keeps each reference
+to a tile or two instead of the many tiles of a phone photo.
+"""
+# Standard library imports
+import logging
+import os
+import threading
+import time
+from io import BytesIO
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# Third-party imports
+from PIL import Image, ImageOps
+
+# Google Gemini AI imports
+from google.genai import types
+
+# Local application imports
+from gemini_client import operation_config
+
+logger = logging.getLogger(__name__)
+
+# ============================================================================
+# CONFIGURATION
+# ============================================================================
+
+MAX_SIDE = int(os.getenv('REFERENCE_IMAGE_MAX_SIDE', '768'))
+QUALITY = int(os.getenv('REFERENCE_IMAGE_QUALITY', '80'))
+RELOAD_CHECK_SECONDS = float(os.getenv('REFERENCE_IMAGES_RELOAD_SECONDS', '10'))
+UPLOAD = os.getenv('REFERENCE_IMAGES_UPLOAD', '0').lower() in ('1', 'true', 'yes')
+# Re-upload files this long before the Files API expires them
+UPLOAD_REFRESH_MARGIN_SECONDS = 3600
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+
+
+def compact_image(data: bytes, max_side: int = MAX_SIDE, quality: int = QUALITY) -> bytes:
+    """Apply EXIF orientation, downscale to max_side and re-encode as JPEG."""
+    with Image.open(BytesIO(data)) as img:
+        img.draft('RGB', (max_side, max_side))  # JPEG: decode at reduced scale
+        img = ImageOps.exif_transpose(img)
+        if img.mode != 'RGB':
+            img = img.convert('RGB')
+        img.thumbnail((max_side, max_side), Image.LANCZOS)
+        out = BytesIO()
+        img.save(out, 'JPEG', quality=quality, optimize=True)
+        return out.getvalue()
+
+
+class ReferenceImageSet:
+    """In-memory, hot-reloading compact reference images per category folder."""
+
+    def __init__(self, root: str, max_images: int = 2, client_getter: Optional[Callable[[], Any]] = None,
+                 upload: bool = UPLOAD):
+        """
+        Args:
+            root: Folder containing one sub-folder per category
+            max_images: Images kept per category
+            client_getter: Returns the Gemini client (used when upload is enabled)
+            upload: Register images with the Files API and reference them by URI
+        """
+        self.root = root
+        self.max_images = max_images
+        self._client_getter = client_getter
+        self.upload = upload
+        self._lock = threading.Lock()
+        # category -> (signature, images, checked_at)
+        self._sets: Dict[str, Tuple[tuple, List[Dict[str, Any]], float]] = {}
+        self._stats = {'loads': 0, 'reloads': 0, 'uploads': 0, 'source_bytes': 0, 'compact_bytes': 0}
+
+    # ------------------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------------------
+    def get(self, category: str) -> List[Dict[str, Any]]:
+        """
+        Compact reference images for a category.
+
+        Returns:
+            List of dicts with 'data' (JPEG bytes), 'filename', 'mime_type'
+            and, when uploaded, 'file_uri'
+        """
+        now = time.monotonic()
+        with self._lock:
+            cached = self._sets.get(category)
+        if cached and now - cached[2] < RELOAD_CHECK_SECONDS and not self._uploads_expiring(cached[1]):
+            return cached[1]
+
+        signature, paths = self._signature(category)
+        with self._lock:
+            cached = self._sets.get(category)
+            if cached and cached[0] == signature and not self._uploads_expiring(cached[1]):
+                self._sets[category] = (signature, cached[1], now)
+                return cached[1]
+            images = self._load(paths)
+            self._sets[category] = (signature, images, now)
+            self._stats['reloads' if cached else 'loads'] += 1
+        if images:
+            logger.info(f"🌿 Reference images '{category}': {len(images)} loaded, "
+                        f"{sum(len(i['data']) for i in images) // 1024} KB in memory")
+        return images
+
+    def preload(self, categories: Tuple[str, ...] = ('sugarcane', 'weeds')):
+        """Load categories ahead of the first classification request."""
+        for category in categories:
+            self.get(category)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats['categories'] = {c: len(entry[1]) for c, entry in self._sets.items()}
+        stats['upload'] = self.upload
+        return stats
+
+    @staticmethod
+    def as_part(image: Dict[str, Any]) -> types.Part:
+        """Model part for a reference image: a file reference when uploaded, inline bytes otherwise."""
+        if image.get('file_uri'):
+            return types.Part(file_data=types.FileData(file_uri=image['file_uri'], mime_type=image['mime_type']))
+        return types.Part(inline_data=types.Blob(mime_type=image['mime_type'], data=image['data']))
+
+    # ------------------------------------------------------------------
+    # Internals
+    # ------------------------------------------------------------------
+    def _signature(self, category: str) -> Tuple[tuple, List[str]]:
+        folder = os.path.join(self.root, category)
+        try:
+            names = sorted(n for n in os.listdir(folder) if n.lower().endswith(IMAGE_EXTENSIONS))
+        except FileNotFoundError:
+            return (), []
+        paths = [os.path.join(folder, n) for n in names][:self.max_images]
+        signature = []
+        for path in paths:
+            st = os.stat(path)
+            signature.append((os.path.basename(path), st.st_size, st.st_mtime_ns))
+        return tuple(signature), paths
+
+    def _load(self, paths: List[str]) -> List[Dict[str, Any]]:
+        images = []
+        for path in paths:
+            try:
+                with open(path, 'rb') as fh:
+                    source = fh.read()
+                data = compact_image(source)
+            except Exception as e:
+                logger.warning(f'⚠️ Failed to load reference image {path}: {e}')
+                continue
+            image = {'data': data, 'filename': os.path.basename(path), 'mime_type': 'image/jpeg'}
+            if self.upload:
+                self._upload(image)
+            self._stats['source_bytes'] += len(source)
+            self._stats['compact_bytes'] += len(data)
+            images.append(image)
+        return images
+
+    def _upload(self, image: Dict[str, Any]):
+        client = self._client_getter() if self._client_getter else None
+        if client is None:
+            return
+        try:
+            uploaded = client.files.upload(
+                file=BytesIO(image['data']),
+                config=operation_config('upload', {'mime_type': image['mime_type'],
+                                                   'display_name': f"reference-{image['filename']}"}),
+            )
+        except Exception as e:
+            logger.warning(f"⚠️ Reference image upload failed for {image['filename']}, sending inline: {e}")
+            return
+        image['file_uri'] = uploaded.uri
+        image['expires_at'] = uploaded.expiration_time.timestamp() if uploaded.expiration_time else None
+        self._stats['uploads'] += 1
+
+    @staticmethod
+    def _uploads_expiring(images: List[Dict[str, Any]]) -> bool:
+        now = time.time()
+        return any(i.get('expires_at') and i['expires_at'] - now < UPLOAD_REFRESH_MARGIN_SECONDS for i in images)
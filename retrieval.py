@@ -0,0 +1,244 @@
+"""
+Local Retrieval - Hybrid BM25 + Dense Vector Search
+===================================================
+
+In-process retrieval over the knowledge base, so answers can be grounded
+without the remote File Search store. Passages are the chunks produced by the
+ingestion pipeline (ingestion.py). Two indexes are built over the same
+passages and merged with reciprocal rank fusion (RRF):
+
+    1. **BM25**: inverted index of word tokens (k1=1.5, b=0.75); postings are
+       NumPy arrays so a query scores every candidate document in one pass
+    2. **Dense**: locally computed embeddings (signed feature hashing of words
+       and in-word character 4-grams, IDF weighted, L2-normalized) held in a
+       float32 matrix; a query is one matrix-vector product
+
+RRF score for a passage is the sum over both rankings of 1 / (RRF_K + rank),
+which needs no score calibration between the two indexes.
+
+Usage:
+    retriever = HybridRetriever.from_directory('knowledge_base')
+    hits = retriever.search('red rot symptoms', k=5)
+"""
+# Standard library imports
+import hashlib
+import logging
+import math
+import re
+import threading
+import time
+from collections import defaultdict
+from typing import Any, Dict, List
+
+# Third-party imports
+import numpy as np
+
+# Local imports
+from ingestion import CHUNK_STORE_DIR, ingest_directory, load_chunks
+
+logger = logging.getLogger(__name__)
+
+# ============================================================================
+# CONFIGURATION
+# ============================================================================
+
+BM25_K1 = 1.5
+BM25_B = 0.75
+RRF_K = 60
+
+# Dense feature space; 1024 float32 dims keeps 10k passages under 41 MB
+EMBEDDING_DIM = 1024
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+_STOPWORDS = frozenset(
+    'a an and are as at be by for from has have in is it its of on or that the this '
+    'to was were what when where which who why will with how do does i you your'.split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens with common English stopwords removed."""
+    return [t for t in _TOKEN_RE.findall((text or '').lower()) if t not in _STOPWORDS]
+
+
+def _hash_feature(feature: str) -> tuple:
+    """Map a feature to (bucket, sign) for signed feature hashing."""
+    h = int.from_bytes(hashlib.blake2b(feature.encode('utf-8'), digest_size=8).digest(), 'little')
+    return h % EMBEDDING_DIM, (1.0 if (h >> 63) & 1 else -1.0)
+
+
+def _features(tokens: List[str]) -> Dict[int, float]:
+    """Signed hashed counts of word and in-word character 4-gram features."""
+    counts: Dict[int, float] = defaultdict(float)
+    for tok in tokens:
+        idx, sign = _hash_feature('w:' + tok)
+        counts[idx] += sign
+        padded = f'<{tok}>'
+        for i in range(len(padded) - 3):
+            idx, sign = _hash_feature('c:' + padded[i:i + 4])
+            counts[idx] += 0.5 * sign
+    return counts
+
+
+class BM25Index:
+    """Okapi BM25 over an inverted index with NumPy postings."""
+
+    def __init__(self, tokenized_docs: List[List[str]], k1: float = BM25_K1, b: float = BM25_B):
+        self.k1 = k1
+        self.b = b
+        self.num_docs = len(tokenized_docs)
+        self.doc_lengths = np.array([len(d) for d in tokenized_docs], dtype=np.float32)
+        self.avg_doc_length = float(self.doc_lengths.mean()) if self.num_docs else 0.0
+
+        postings: Dict[str, Dict[int, int]] = defaultdict(dict)
+        for doc_id, tokens in enumerate(tokenized_docs):
+            for tok in tokens:
+                postings[tok][doc_id] = postings[tok].get(doc_id, 0) + 1
+
+        self._postings: Dict[str, tuple] = {}
+        for term, docs in postings.items():
+            ids = np.fromiter(docs.keys(), dtype=np.int32, count=len(docs))
+            tfs = np.fromiter(docs.values(), dtype=np.float32, count=len(docs))
+            df = len(docs)
+            idf = math.log(1.0 + (self.num_docs - df + 0.5) / (df + 0.5))
+            self._postings[term] = (ids, tfs, idf)
+
+    def scores(self, query_tokens: List[str]) -> np.ndarray:
+        """BM25 score of every document for the query."""
+        scores = np.zeros(self.num_docs, dtype=np.float32)
+        if not self.num_docs:
+            return scores
+        norm = self.k1 * (1.0 - self.b + self.b * self.doc_lengths / (self.avg_doc_length or 1.0))
+        for term in set(query_tokens):
+            posting = self._postings.get(term)
+            if posting is None:
+                continue
+            ids, tfs, idf = posting
+            scores[ids] += idf * (tfs * (self.k1 + 1.0)) / (tfs + norm[ids])
+        return scores
+
+
+class DenseIndex:
+    """Cosine search over locally computed hashed embeddings."""
+
+    def __init__(self, tokenized_docs: List[List[str]]):
+        doc_features = [_features(tokens) for tokens in tokenized_docs]
+        df = np.zeros(EMBEDDING_DIM, dtype=np.float32)
+        for feats in doc_features:
+            df[list(feats.keys())] += 1.0
+        n = max(len(tokenized_docs), 1)
+        self.idf = np.log((1.0 + n) / (1.0 + df)).astype(np.float32) + 1.0
+        self.matrix = np.zeros((len(tokenized_docs), EMBEDDING_DIM), dtype=np.float32)
+        for row, feats in enumerate(doc_features):
+            self.matrix[row] = self._vector(feats)
+
+    def _vector(self, feats: Dict[int, float]) -> np.ndarray:
+        vec = np.zeros(EMBEDDING_DIM, dtype=np.float32)
+        if feats:
+            idx = np.fromiter(feats.keys(), dtype=np.int64, count=len(feats))
+            val = np.fromiter(feats.values(), dtype=np.float32, count=len(feats))
+            vec[idx] = np.sign(val) * np.log1p(np.abs(val))
+            vec *= self.idf
+            norm = float(np.linalg.norm(vec))
+            if norm > 0:
+                vec /= norm
+        return vec
+
+    def embed(self, tokens: List[str]) -> np.ndarray:
+        return self._vector(_features(tokens))
+
+    def scores(self, query_tokens: List[str]) -> np.ndarray:
+        """Cosine similarity of every document to the query."""
+        if not len(self.matrix):
+            return np.zeros(0, dtype=np.float32)
+        return self.matrix @ self.embed(query_tokens)
+
+
+def _top_ranks(scores: np.ndarray, depth: int, positive_only: bool) -> List[int]:
+    """Indices of the top `depth` scores, best first."""
+    if not len(scores):
+        return []
+    depth = min(depth, len(scores))
+    top = np.argpartition(-scores, depth - 1)[:depth]
+    top = top[np.argsort(-scores[top])]
+    if positive_only:
+        top = top[scores[top] > 0]
+    return top.tolist()
+
+
+class HybridRetriever:
+    """BM25 + dense retrieval over a list of passages, merged with RRF."""
+
+    def __init__(self, passages: List[Dict[str, Any]]):
+        start = time.perf_counter()
+        self.passages = passages
+        tokenized = [tokenize(f"{p.get('section') or ''} {p['text']}") for p in passages]
+        self.bm25 = BM25Index(tokenized)
+        self.dense = DenseIndex(tokenized)
+        self.build_seconds = time.perf_counter() - start
+        self._lock = threading.Lock()
+        self._searches = 0
+        self._search_seconds = 0.0
+        logger.info(f"🔎 Local retriever built over {len(passages)} passages in {self.build_seconds:.2f}s")
+
+    @classmethod
+    def from_directory(cls, kb_dir: str = 'knowledge_base', store_dir: str = CHUNK_STORE_DIR) -> 'HybridRetriever':
+        """Bring the chunk store up to date with kb_dir (see ingestion.py) and index its chunks."""
+        ingest_directory(kb_dir, store_dir)
+        return cls(load_chunks(store_dir))
+
+    def search(self, query: str, k: int = 5, depth: int = 50) -> List[Dict[str, Any]]:
+        """
+        Return the top-k passages for a query.
+
+        Args:
+            query: Free-text question
+            k: Number of passages to return
+            depth: How many candidates from each index enter the fusion
+
+        Returns:
+            List of dicts with 'doc_id' (row in dense.matrix), 'text', 'source',
+            'page', 'section', 'score' (RRF), 'bm25_rank' and 'dense_rank'
+            (1-based, None if not in that index's top `depth`)
+        """
+        start = time.perf_counter()
+        tokens = tokenize(query)
+        if not tokens or not self.passages:
+            return []
+        bm25_ranked = _top_ranks(self.bm25.scores(tokens), depth, positive_only=True)
+        dense_ranked = _top_ranks(self.dense.scores(tokens), depth, positive_only=True)
+
+        fused: Dict[int, float] = defaultdict(float)
+        ranks: Dict[int, Dict[str, int]] = defaultdict(dict)
+        for name, ranked in (('bm25_rank', bm25_ranked), ('dense_rank', dense_ranked)):
+            for rank, doc_id in enumerate(ranked, start=1):
+                fused[doc_id] += 1.0 / (RRF_K + rank)
+                ranks[doc_id][name] = rank
+
+        best = sorted(fused.items(), key=lambda item: item[1], reverse=True)[:k]
+        hits = [{
+            'doc_id': doc_id,
+            'text': self.passages[doc_id]['text'],
+            'source': self.passages[doc_id].get('source', ''),
+            'page': self.passages[doc_id].get('page'),
+            'section': self.passages[doc_id].get('section'),
+            'score': round(score, 6),
+            'bm25_rank': ranks[doc_id].get('bm25_rank'),
+            'dense_rank': ranks[doc_id].get('dense_rank'),
+        } for doc_id, score in best]
+
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self._searches += 1
+            self._search_seconds += elapsed
+        return hits
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            searches, total = self._searches, self._search_seconds
+        return {
+            'passages': len(self.passages),
+            'build_seconds': round(self.build_seconds, 3),
+            'searches': searches,
+            'avg_search_ms': round(1000 * total / searches, 3) if searches else 0.0,
+        }
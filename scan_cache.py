@@ -0,0 +1,264 @@
+"""
+Scan Cache - Perceptual-Hash Cache for Repeated Image Scans
+===========================================================
+
+Farmers often re-submit the same photo (a resend after a timeout) or an
+almost identical retake, and every submission used to run the full vision +
+File Search call again. This module keeps recent image analysis results in
+memory, keyed by what the photo looks like rather than its exact bytes.
+
+Lookup:
+    1. **Perceptual hash**: a 64-bit difference hash (dHash) of the prepared
+       image, computed by image_preprocess in its pool process: grayscale,
+       9x8 box downscale, one bit per horizontally adjacent pixel pair (NumPy). Re-encoding, resizing and small exposure changes
+       flip few bits; a different scene flips about half of them
+    2. **Partition**: results are only shared between requests with the same
+       normalized prompt, language and knowledge-base version
+    3. **Hamming search**: each partition keeps a BK-tree over its hashes, so
+       a lookup visits only the branches that can lie within
+       SCAN_CACHE_MAX_DISTANCE bits instead of comparing every entry
+
+Eviction is LRU bounded by ``max_entries`` plus a per-entry TTL. Evicted
+hashes are removed from the trees lazily: a tree is rebuilt once more than
+half of its nodes are dead.
+
+Configuration (environment variables):
+    - SCAN_CACHE_ENABLED: '0' disables the cache entirely (default '1')
+    - SCAN_CACHE_MAX_ENTRIES: LRU capacity (default 1000)
+    - SCAN_CACHE_TTL_SECONDS: entry lifetime (default 6 hours)
+    - SCAN_CACHE_MAX_DISTANCE: Hamming distance (of 64 bits) for a hit (default 6)
+"""
+# Standard library imports
+import itertools
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+# Third-party imports
+import numpy as np
+from PIL import Image
+
+# Local application imports
+from answer_cache import normalize_question
+
+# ============================================================================
+# CONFIGURATION
+# ============================================================================
+
+ENABLED = os.getenv('SCAN_CACHE_ENABLED', '1') != '0'
+MAX_ENTRIES = int(os.getenv('SCAN_CACHE_MAX_ENTRIES', '1000'))
+TTL_SECONDS = int(os.getenv('SCAN_CACHE_TTL_SECONDS', str(6 * 3600)))
+MAX_DISTANCE = int(os.getenv('SCAN_CACHE_MAX_DISTANCE', '6'))
+
+_HASH_SIZE = 8  # 8x8 = 64 bits
+_BIT_WEIGHTS = np.left_shift(np.uint64(1), np.arange(_HASH_SIZE * _HASH_SIZE, dtype=np.uint64))
+
+
+def dhash_image(img: Image.Image) -> int:
+    """
+    64-bit difference hash of a decoded image.
+
+    image_preprocess.prepare_image() calls this on the image it has already
+    decoded (in its pool process), so requests never decode twice.
+
+    Returns:
+        Hash as an int; near-duplicate images differ in few bits
+    """
+    gray = img.convert('L').resize((_HASH_SIZE + 1, _HASH_SIZE), Image.BOX)
+    pixels = np.asarray(gray, dtype=np.int16)
+    bits = (pixels[:, 1:] > pixels[:, :-1]).ravel()
+    return int(_BIT_WEIGHTS[bits].sum())
+
+
+def hamming(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+
+class BKTree:
+    """
+    Burkhard-Keller tree over 64-bit hashes under Hamming distance.
+
+    Each node is ``[hash, entry ids, {distance: child}]``; several entries may
+    share a hash. Removing an entry only empties its id set, so callers
+    rebuild the tree when ``dead`` grows large.
+    """
+
+    def __init__(self):
+        self.root: Optional[list] = None
+        self.nodes = 0
+        self.dead = 0
+
+    def add(self, value: int, entry_id: int):
+        if self.root is None:
+            self.root = [value, {entry_id}, {}]
+            self.nodes = 1
+            return
+        node = self.root
+        while True:
+            d = hamming(value, node[0])
+            if d == 0:
+                if not node[1]:
+                    self.dead -= 1
+                node[1].add(entry_id)
+                return
+            child = node[2].get(d)
+            if child is None:
+                node[2][d] = [value, {entry_id}, {}]
+                self.nodes += 1
+                return
+            node = child
+
+    def remove(self, value: int, entry_id: int):
+        node = self.root
+        while node is not None:
+            d = hamming(value, node[0])
+            if d == 0:
+                if entry_id in node[1]:
+                    node[1].discard(entry_id)
+                    if not node[1]:
+                        self.dead += 1
+                return
+            node = node[2].get(d)
+
+    def search(self, value: int, max_distance: int) -> List[Tuple[int, Set[int]]]:
+        """(distance, entry ids) of every live node within max_distance, nearest first."""
+        found = []
+        stack = [self.root] if self.root is not None else []
+        while stack:
+            node = stack.pop()
+            d = hamming(value, node[0])
+            if d <= max_distance and node[1]:
+                found.append((d, node[1]))
+            # Triangle inequality: only children at distance d±max_distance can match
+            for child_d, child in node[2].items():
+                if d - max_distance <= child_d <= d + max_distance:
+                    stack.append(child)
+        found.sort(key=lambda item: item[0])
+        return found
+
+
+class ScanCache:
+    """
+    Thread-safe LRU + TTL cache of image analysis results with near-duplicate lookup.
+
+    Entries live in an ``OrderedDict`` keyed by an increasing id; each
+    (prompt, language, kb_version) partition has a BKTree mapping hashes to
+    entry ids.
+    """
+
+    def __init__(self, max_entries: int = MAX_ENTRIES, ttl_seconds: int = TTL_SECONDS,
+                 max_distance: int = MAX_DISTANCE, enabled: bool = ENABLED):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.max_distance = max_distance
+        self.enabled = enabled
+        self._entries: 'OrderedDict[int, Dict[str, Any]]' = OrderedDict()
+        self._trees: Dict[Tuple[str, str, str], BKTree] = {}
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+        self._stats = {'exact_hits': 0, 'similar_hits': 0, 'misses': 0, 'bypassed': 0,
+                       'stores': 0, 'evictions': 0, 'expired': 0, 'rebuilds': 0}
+
+    # ------------------------------------------------------------------
+    # Internal helpers (caller holds the lock)
+    # ------------------------------------------------------------------
+    @staticmethod
+    def _partition(prompt: str, language: str, kb_version: str) -> Tuple[str, str, str]:
+        return normalize_question(prompt), (language or 'english').lower(), kb_version
+
+    def _drop(self, entry_id: int):
+        entry = self._entries.pop(entry_id)
+        tree = self._trees.get(entry['partition'])
+        if tree is None:
+            return
+        tree.remove(entry['hash'], entry_id)
+        if tree.dead == tree.nodes:
+            del self._trees[entry['partition']]
+        elif tree.dead * 2 > tree.nodes:
+            self._rebuild(entry['partition'])
+
+    def _rebuild(self, partition: Tuple[str, str, str]):
+        tree = BKTree()
+        for entry_id, entry in self._entries.items():
+            if entry['partition'] == partition:
+                tree.add(entry['hash'], entry_id)
+        self._trees[partition] = tree
+        self._stats['rebuilds'] += 1
+
+    # ------------------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------------------
+    def get(self, image_hash: int, prompt: str, language: str, kb_version: str,
+            bypass: bool = False) -> Optional[Dict[str, Any]]:
+        """
+        Look up the result of a scan of a (nearly) identical image.
+
+        Returns:
+            Dict with 'value', 'match' ('exact' or 'similar') and 'distance',
+            or None on a miss (or when bypassed/disabled).
+        """
+        if not self.enabled or bypass:
+            with self._lock:
+                self._stats['bypassed'] += 1
+            return None
+
+        now = time.time()
+        with self._lock:
+            tree = self._trees.get(self._partition(prompt, language, kb_version))
+            for distance, entry_ids in (tree.search(image_hash, self.max_distance) if tree else []):
+                # Newest first among entries sharing a hash
+                for entry_id in sorted(entry_ids, reverse=True):
+                    entry = self._entries.get(entry_id)
+                    if entry is None:
+                        continue
+                    if now - entry['stored_at'] > self.ttl_seconds:
+                        self._drop(entry_id)
+                        self._stats['expired'] += 1
+                        continue
+                    self._entries.move_to_end(entry_id)
+                    match = 'exact' if distance == 0 else 'similar'
+                    self._stats[f'{match}_hits'] += 1
+                    return {'value': entry['value'], 'match': match, 'distance': distance}
+            self._stats['misses'] += 1
+            return None
+
+    def put(self, image_hash: int, prompt: str, language: str, kb_version: str, value: Dict[str, Any]):
+        """Store a result, evicting expired and least recently used entries past capacity."""
+        if not self.enabled:
+            return
+        partition = self._partition(prompt, language, kb_version)
+        now = time.time()
+        with self._lock:
+            entry_id = next(self._ids)
+            self._entries[entry_id] = {'hash': image_hash, 'partition': partition, 'value': value, 'stored_at': now}
+            self._trees.setdefault(partition, BKTree()).add(image_hash, entry_id)
+            self._stats['stores'] += 1
+            while self._entries:
+                oldest_id, oldest = next(iter(self._entries.items()))
+                if now - oldest['stored_at'] > self.ttl_seconds:
+                    self._stats['expired'] += 1
+                elif len(self._entries) > self.max_entries:
+                    self._stats['evictions'] += 1
+                else:
+                    break
+                self._drop(oldest_id)
+
+    def clear(self):
+        """Drop every cached entry (counters are kept)."""
+        with self._lock:
+            self._entries.clear()
+            self._trees.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit/miss counters and current size."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['size'] = len(self._entries)
+            stats['partitions'] = len(self._trees)
+        lookups = stats['exact_hits'] + stats['similar_hits'] + stats['misses']
+        stats['hit_rate'] = round((stats['exact_hits'] + stats['similar_hits']) / lookups, 4) if lookups else 0.0
+        stats['enabled'] = self.enabled
+        stats['max_distance'] = self.max_distance
+        return stats
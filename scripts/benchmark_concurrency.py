@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""
+Concurrency Benchmark: sync gunicorn vs native ASGI
+===================================================
+
+Measures how many simultaneous model-bound requests one deployment can keep
+in flight. The Gemini client is replaced with a fake that sleeps for a fixed
+latency (time.sleep on the sync surface, asyncio.sleep on the aio surface), so
+the numbers reflect the serving model rather than the network.
+
+Setups compared:
+    - sync:   gunicorn, 2 sync workers (the Procfile setup before gthread)
+    - native: uvicorn, 1 worker, asgi:app (async routes on the aio client)
+
+Usage:
+    python scripts/benchmark_concurrency.py
+    python scripts/benchmark_concurrency.py --concurrency 100 --latency 2.0
+    python scripts/benchmark_concurrency.py --mode native --route /ask
+
+Requirements:
+    - gunicorn and uvicorn (both in requirements.txt)
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import statistics
+import sys
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import ai_services  # noqa: E402
+import app as flask_module  # noqa: E402
+from google.genai import types  # noqa: E402
+
+
+def _fake_response(text: str) -> types.GenerateContentResponse:
+    return types.GenerateContentResponse(candidates=[
+        types.Candidate(content=types.Content(parts=[types.Part(text=text)]))
+    ])
+
+
+def install_fake_client(latency: float):
+    """Swap the Gemini client for one that only waits `latency` seconds per call."""
+    class _SyncModels:
+        def generate_content(self, **kwargs):
+            time.sleep(latency)
+            return _fake_response('benchmark answer')
+
+    class _AsyncModels:
+        async def generate_content(self, **kwargs):
+            await asyncio.sleep(latency)
+            return _fake_response('benchmark answer')
+
+    class _Aio:
+        models = _AsyncModels()
+
+    class _Client:
+        models = _SyncModels()
+        aio = _Aio()
+
+    class _Store:
+        name = 'fileSearchStores/benchmark'
+
+    fake = _Client()
+    ai_services.CLIENT = fake
+    flask_module.client = fake
+    flask_module._KB_INITIALIZED = True
+    ai_services.ensure_file_search_store = lambda: _Store()
+    # Every request must reach the model for the numbers to mean anything
+    ai_services.ANSWER_CACHE.enabled = False
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def _wait_for_port(port: int, timeout: float = 15.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f'Server on port {port} did not start')
+
+
+def start_sync_server(port: int, workers: int, threads: int):
+    """Run gunicorn with the (already patched) Flask app in a forked child process."""
+    from gunicorn.app.base import BaseApplication
+
+    class _App(BaseApplication):
+        def load_config(self):
+            self.cfg.set('bind', f'127.0.0.1:{port}')
+            self.cfg.set('workers', workers)
+            self.cfg.set('threads', threads)
+            self.cfg.set('timeout', 120)
+            self.cfg.set('loglevel', 'warning')
+
+        def load(self):
+            return flask_module.app
+
+    # The arbiter installs signal handlers, so it cannot run in a thread
+    pid = os.fork()
+    if pid == 0:  # pragma: no cover - child
+        _App().run()
+        os._exit(0)
+    _wait_for_port(port)
+    return pid
+
+
+def start_native_server(port: int):
+    """Run uvicorn with the native ASGI app in a background thread."""
+    import uvicorn
+    import asgi
+
+    server = uvicorn.Server(uvicorn.Config(asgi.native_app, host='127.0.0.1', port=port, log_level='warning'))
+    threading.Thread(target=server.run, daemon=True).start()
+    _wait_for_port(port)
+    return server
+
+
+def _post(url: str, payload: dict) -> float:
+    start = time.perf_counter()
+    req = urllib.request.Request(url, data=json.dumps(payload).encode(), headers={'Content-Type': 'application/json'})
+    with urllib.request.urlopen(req, timeout=600) as resp:
+        resp.read()
+    return time.perf_counter() - start
+
+
+def run_load(port: int, route: str, concurrency: int, latency: float) -> dict:
+    url = f'http://127.0.0.1:{port}{route}'
+    # Distinct questions so single-flight coalescing does not hide queueing
+    payloads = [{'chat': f'benchmark question {i}', 'question': f'benchmark question {i}'} for i in range(concurrency)]
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        durations = list(pool.map(lambda p: _post(url, p), payloads))
+    wall = time.perf_counter() - start
+    durations.sort()
+    return {
+        'requests': concurrency,
+        'wall_seconds': round(wall, 2),
+        'throughput_rps': round(concurrency / wall, 2),
+        'p50_seconds': round(statistics.median(durations), 2),
+        'p95_seconds': round(durations[int(0.95 * (len(durations) - 1))], 2),
+        # Requests the deployment kept in flight at once, on average
+        'effective_concurrency': round(concurrency * latency / wall, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare concurrent-request capacity of sync gunicorn and native ASGI')
+    parser.add_argument('--mode', choices=['sync', 'native', 'both'], default='both')
+    parser.add_argument('--route', default='/webhook', help='POST route to load (default: /webhook)')
+    parser.add_argument('--concurrency', type=int, default=50, help='Simultaneous requests (default: 50)')
+    parser.add_argument('--latency', type=float, default=1.0, help='Simulated model latency in seconds (default: 1.0)')
+    parser.add_argument('--sync-workers', type=int, default=2, help='gunicorn workers (default: 2, as in Procfile)')
+    parser.add_argument('--sync-threads', type=int, default=1, help='Threads per gunicorn worker (default: 1 = sync)')
+    args = parser.parse_args()
+
+    install_fake_client(args.latency)
+    results = {}
+
+    if args.mode in ('sync', 'both'):
+        port = _free_port()
+        pid = start_sync_server(port, args.sync_workers, args.sync_threads)
+        try:
+            kind = 'gthread' if args.sync_threads > 1 else 'sync'
+            results[f'gunicorn {args.sync_workers}x{args.sync_threads} ({kind})'] = run_load(port, args.route, args.concurrency, args.latency)
+        finally:
+            os.kill(pid, 15)
+            os.waitpid(pid, 0)
+
+    if args.mode in ('native', 'both'):
+        port = _free_port()
+        server = start_native_server(port)
+        try:
+            results['uvicorn 1 worker (native ASGI)'] = run_load(port, args.route, args.concurrency, args.latency)
+        finally:
+            server.should_exit = True
+
+    print(f"\nRoute {args.route}, {args.concurrency} concurrent requests, simulated model latency {args.latency}s\n")
+    for name, r in results.items():
+        print(f"{name}")
+        for k, v in r.items():
+            print(f"  {k:<22} {v}")
+        print()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Intent Matcher Benchmark: substring lists vs precompiled regex
+==============================================================
+
+Times the keyword routing of classify_query_type() / decide_make_infographic()
+per question, before (lower() + ``pattern in text`` over Python lists, with
+decide_make_infographic() looping keyword by keyword) and after
+(``intent_matcher.match_intents()``, one regex pass), and lists the sample
+questions the two route differently.
+
+Usage:
+    python scripts/benchmark_intents.py
+    python scripts/benchmark_intents.py --repeat 20000
+"""
+import argparse
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from intent_matcher import INFOGRAPHIC_INTENTS, VISUAL_INTENTS, match_intents  # noqa: E402
+
+SAMPLE_QUESTIONS = [
+    'What is the best time to plant sugarcane?',
+    'How to control red rot in sugarcane?',
+    'Show me the fertilizer schedule for ratoon crop',
+    'hello',
+    'Thank you so much!',
+    'Is this variety good for UP?',
+    'Which pesticide is safe for early shoot borer?',
+    'Co 0238 vs Co 86032 yield comparison',
+    'गन्ने में लाल सड़न रोग के लक्षण क्या हैं?',
+    'गन्ने की बुवाई का सही तरीका बताइए',
+    'urea kab dale aur kitna dale?',
+    'khet mein keet lag gaye hain, kya karein?',
+    'namaste, mera naam Ramesh hai',
+    'What chemicals are in this canvas bag of fertilizer?',
+    'My field has white grubs, which insecticide?',
+    'Explain drip irrigation benefits',
+    'Create a chart of water requirements by month',
+    'इस फोटो में क्या है?',
+    'this leaf has yellow stripes, what is it?',
+    'What is the history of sugarcane in India?',
+    'What are the diseases of sugarcane?',
+    'Comparing varieties for waterlogged fields',
+]
+
+# Previous keyword lists (ai_services before intent_matcher)
+_LEGACY_PLEASANTRY = [
+    'hello', 'hi', 'namaste', 'namaskar', 'good morning', 'good evening',
+    'thank you', 'thanks', 'dhanyawad', 'shukriya', 'bye', 'goodbye',
+    'how are you', 'what is your name', 'who are you', 'who made you'
+]
+_LEGACY_VISUAL = [
+    'show me', 'diagram', 'chart', 'infographic', 'picture', 'image', 'visual',
+    'steps', 'step by step', 'how to', 'how do i', 'schedule', 'calendar',
+    'process', 'procedure', 'symptoms', 'identify', 'comparison', 'compare'
+]
+_LEGACY_INFOGRAPHIC = [
+    'steps', 'step by step', 'how to', 'how do i', 'procedure', 'process',
+    'schedule', 'calendar', 'timeline', 'when to',
+    'symptoms', 'identify', 'signs of', 'disease', 'pest',
+    'compare', 'comparison', 'difference between', 'vs',
+    'diagram', 'chart', 'infographic', 'visual', 'show me'
+]
+
+
+def legacy_route(question: str):
+    """(classify_query_type keyword verdict, decide_make_infographic keyword verdict) as before."""
+    q = question.lower().strip()
+    if any(p in q for p in _LEGACY_PLEASANTRY):
+        fmt = 'text'
+    elif any(p in q for p in _LEGACY_VISUAL):
+        fmt = 'visual'
+    else:
+        fmt = 'llm'
+    make = None
+    if re.search(r'\bcreate\b', q, re.IGNORECASE):
+        make = 'detailed'
+    else:
+        for keyword in _LEGACY_INFOGRAPHIC:
+            if keyword in q:
+                if keyword in ['schedule', 'calendar', 'timeline', 'when to']:
+                    make = 'timeline'
+                elif keyword in ['compare', 'comparison', 'difference between', 'vs']:
+                    make = 'chart'
+                else:
+                    make = 'detailed'
+                break
+    return fmt, make
+
+
+def matcher_route(question: str):
+    """The same two verdicts from one match_intents() pass (mirrors ai_services)."""
+    intents = match_intents(question)
+    if intents.any(VISUAL_INTENTS):
+        fmt = 'visual'
+    elif 'pleasantry' in intents.intents and len(question.split()) <= 6:
+        fmt = 'text'
+    else:
+        fmt = 'llm'
+    if 'create' in intents.intents:
+        make = 'detailed'
+    elif intents.any(INFOGRAPHIC_INTENTS):
+        make = intents.style()
+    else:
+        make = None
+    return fmt, make
+
+
+def _time_per_question(fn, questions, repeat: int) -> float:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for q in questions:
+            fn(q)
+    return (time.perf_counter() - started) / (repeat * len(questions)) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare substring keyword routing with the precompiled intent matcher')
+    parser.add_argument('--repeat', type=int, default=5000, help='Passes over the sample questions (default: 5000)')
+    args = parser.parse_args()
+
+    legacy_us = _time_per_question(legacy_route, SAMPLE_QUESTIONS, args.repeat)
+    matcher_us = _time_per_question(matcher_route, SAMPLE_QUESTIONS, args.repeat)
+    print(f"\n{len(SAMPLE_QUESTIONS)} questions x {args.repeat} passes\n")
+    print(f"  {'substring lists':<22} {legacy_us:.2f} us/question")
+    print(f"  {'precompiled matcher':<22} {matcher_us:.2f} us/question")
+
+    print("\nRouting differences (format: llm = falls through to the LLM classifier; "
+          "infographic: style or None)\n")
+    for q in SAMPLE_QUESTIONS:
+        before, after = legacy_route(q), matcher_route(q)
+        if before != after:
+            print(f"  {q}\n    before {before}  after {after}")
+    print()
+
+
+if __name__ == '__main__':
+    main()
@@ -26,11 +26,14 @@
  * API Endpoints Used:
  * - POST /ask - RAG-powered Q&A
  * - POST /upload - Document upload
+ * - POST /analyze-image - Plant classification + crop disease analysis
  * - POST /scan-image - Crop disease analysis
  * - POST /classify-plant - Plant classification
- * - POST /generate-infographic - Async infographic generation
+ * - POST /generate-infographic - Queue an infographic job (followed via /infographic-jobs/<id>/events)
  * - POST /get-text-version - Text fallback for infographics
  *
+ * /ask is requested as Server-Sent Events so tokens render as they arrive.
+ *
  * @author Shashank Tamaskar
  * @version 2.0
  */
@@ -60,7 +63,7 @@ function addMessage(message, sender, imageData = null, options = {}) {
       // Create infographic container (when infographic is already generated)
       const infographicHtml = `
         <div class="infographic-container">
-          <img src="${options.infographicUrl}" class="infographic-image" alt="Infographic" onclick="window.open('${options.infographicUrl}', '_blank')">
+          <img ${infographicImgAttrs(options.infographicUrl)} class="infographic-image" alt="Infographic" onclick="window.open('${options.infographicUrl}', '_blank')">
           <div class="infographic-actions">
             <span class="infographic-lang">${options.infographicLanguage ? '🌐 ' + options.infographicLanguage : ''}</span>
           </div>
@@ -100,6 +103,77 @@ function addMessage(message, sender, imageData = null, options = {}) {
   }
 }
 
+// Read a Server-Sent Events response, rendering tokens into a live bot bubble.
+// Resolves with the payload of the final `done` event (same fields as the JSON API).
+async function readAnswerStream(res) {
+  const chatbox = document.getElementById("chatbox");
+  const msgDiv = document.createElement("div");
+  msgDiv.className = "msg bot streaming";
+  const bubble = document.createElement("div");
+  bubble.className = "msg-bubble";
+  msgDiv.appendChild(bubble);
+
+  let text = "";
+  let renderQueued = false;
+  const render = () => {
+    renderQueued = false;
+    bubble.innerHTML = marked.parse(text);
+    if (chatbox && chatbox.parentElement) {
+      chatbox.parentElement.scrollTop = chatbox.parentElement.scrollHeight;
+    }
+  };
+
+  const reader = res.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = "";
+  let final = null;
+
+  while (final === null) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+
+    // SSE frames are separated by a blank line
+    let sep;
+    while ((sep = buffer.indexOf("\n\n")) !== -1) {
+      const frame = buffer.slice(0, sep);
+      buffer = buffer.slice(sep + 2);
+      let event = "message";
+      let data = "";
+      frame.split("\n").forEach((line) => {
+        if (line.startsWith("event:")) event = line.slice(6).trim();
+        else if (line.startsWith("data:")) data += line.slice(5).trim();
+      });
+      if (!data) continue;
+      const payload = JSON.parse(data);
+
+      if (event === "token") {
+        if (!text) {
+          // First token: swap the spinner for the live bubble
+          hideLoading();
+          if (chatbox) chatbox.appendChild(msgDiv);
+        }
+        text += payload.text || "";
+        if (!renderQueued) {
+          renderQueued = true;
+          requestAnimationFrame(render);
+        }
+      } else if (event === "done") {
+        final = payload;
+      } else if (event === "error") {
+        msgDiv.remove();
+        throw new Error(payload.error || "Failed to get response");
+      }
+    }
+  }
+
+  msgDiv.remove();
+  if (final === null) {
+    throw new Error("Connection closed before the answer finished");
+  }
+  return final;
+}
+
 // Toggle text response visibility
 function toggleTextResponse(btn) {
   const container = btn.parentElement;
@@ -157,6 +231,58 @@ async function requestTextVersion(question, btn) {
   }
 }
 
+// <img> attributes for a generated infographic: `sizes` makes the browser send
+// the Sec-CH-Width client hint so /uploads can pick a right-sized WebP/JPEG
+// variant, and the tiny placeholder shows while the image loads.
+function infographicImgAttrs(url, extraStyle = '') {
+  return `src="${url}" sizes="(max-width: 600px) 100vw, 600px" loading="lazy" ` +
+    `style="background: #eef5ee url('${url}?variant=placeholder') center / cover no-repeat; ${extraStyle}"`;
+}
+
+// Queue an infographic job and wait for it to finish.
+// POST /generate-infographic returns 202 with a job id; the result is followed
+// over SSE when the async server advertises events_url, otherwise (and if the
+// stream drops) by polling status_url.
+// Resolves with the final job payload (`infographic_url` on success, `error` otherwise).
+async function requestInfographic(body) {
+  const response = await fetch('/generate-infographic', {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json' },
+    body: JSON.stringify(body)
+  });
+  const job = await response.json();
+  if (response.status !== 202) return job;
+  return waitForInfographicJob(job);
+}
+
+function waitForInfographicJob(job) {
+  const pollJob = async () => {
+    for (;;) {
+      await new Promise((resolve) => setTimeout(resolve, 2000));
+      const res = await fetch(job.status_url);
+      const data = await res.json();
+      if (!res.ok || data.state === 'succeeded' || data.state === 'failed') return data;
+    }
+  };
+  // Only the async server advertises events_url; under WSGI a stream would hold a request thread
+  if (typeof EventSource === 'undefined' || !job.events_url) return pollJob();
+
+  return new Promise((resolve, reject) => {
+    const source = new EventSource(job.events_url);
+    const finish = (event) => {
+      source.close();
+      resolve(JSON.parse(event.data));
+    };
+    source.addEventListener('done', finish);
+    source.addEventListener('error', (event) => {
+      source.close();
+      // A server `error` event carries data; a dropped connection does not
+      if (event.data) resolve(JSON.parse(event.data));
+      else pollJob().then(resolve, reject);
+    });
+  });
+}
+
 // Generate infographic on demand when user clicks the button
 async function generateInfographicOnDemand(question, btn) {
   if (!question) {
@@ -177,28 +303,21 @@ async function generateInfographicOnDemand(question, btn) {
   btn.innerHTML = `<span class="spinner" style="width: 14px; height: 14px; display: inline-block; margin-right: 6px;"></span> ${t('generatingInfographic') || 'Generating...'}`;
 
   try {
-    const response = await fetch('/generate-infographic', {
-      method: 'POST',
-      headers: { 'Content-Type': 'application/json' },
-      body: JSON.stringify({
-        question: question,
-        content: content,
-        language: getLanguage(),
-        force: true  // Force generation since user explicitly requested
-      })
+    const data = await requestInfographic({
+      question: question,
+      content: content,
+      language: getLanguage(),
+      force: true  // Force generation since user explicitly requested
     });
 
-    const data = await response.json();
-
-    if (response.ok && data.infographic_url) {
+    if (data.infographic_url) {
       // Replace the button container with the infographic
       const actionContainer = btn.closest('.infographic-generate-action');
       if (actionContainer) {
         const infographicHtml = `
           <div class="infographic-container" style="margin-top: 12px;">
-            <img src="${data.infographic_url}" class="infographic-image" alt="Infographic" 
-                 onclick="window.open('${data.infographic_url}', '_blank')" 
-                 style="max-width: 100%; border-radius: 8px; cursor: pointer;">
+            <img ${infographicImgAttrs(data.infographic_url, 'max-width: 100%; border-radius: 8px; cursor: pointer;')} class="infographic-image" alt="Infographic" 
+                 onclick="window.open('${data.infographic_url}', '_blank')">
             <div class="infographic-actions" style="margin-top: 8px; font-size: 12px; color: #666;">
               <span>🎨 ${t('infographicGenerated') || 'Infographic generated'}</span>
               ${data.infographic_language ? ' • 🌐 ' + data.infographic_language : ''}
@@ -253,26 +372,20 @@ async function generateInfographicAsync(question, content, lang) {
   bubble.appendChild(loadingDiv);
 
   try {
-    const response = await fetch('/generate-infographic', {
-      method: 'POST',
-      headers: { 'Content-Type': 'application/json' },
-      body: JSON.stringify({
-        question: question,
-        content: content,
-        language: lang
-      })
+    const data = await requestInfographic({
+      question: question,
+      content: content,
+      language: lang
     });
 
-    const data = await response.json();
-
     // Remove loading indicator
     loadingDiv.remove();
 
-    if (response.ok && data.infographic_url) {
+    if (data.infographic_url) {
       // Add infographic to the message
       const infographicHtml = `
         <div class="infographic-container" style="margin-top: 12px;">
-          <img src="${data.infographic_url}" class="infographic-image" alt="Infographic" onclick="window.open('${data.infographic_url}', '_blank')">
+          <img ${infographicImgAttrs(data.infographic_url)} class="infographic-image" alt="Infographic" onclick="window.open('${data.infographic_url}', '_blank')">
           <div class="infographic-actions">
             <button class="text-fallback-btn" onclick="requestTextVersion('${escapeHtml(question)}', this)" title="Show text version instead">
               📝 ${t('showTextVersion') || 'Show Text Version'}
@@ -1084,39 +1197,22 @@ async function handleSendMessage() {
   try {
     const lang = getLanguage();
 
-    // If image is attached, call both classification and scan endpoints in parallel,
-    // merge results and retry scan once if results are barren or low-confidence.
+    // If image is attached, classify and diagnose it with one /analyze-image call,
+    // then retry the analysis once if results are barren or low-confidence.
     if (hasImage) {
       try {
-        const fdClassify = new FormData();
-        fdClassify.append("image", attachedImageFile);
-        fdClassify.append("language", lang);
-
-        const fdScan = new FormData();
-        fdScan.append("file", attachedImageFile);
-        fdScan.append("language", lang);
-        if (question) fdScan.append("prompt", question);
+        const fdAnalyze = new FormData();
+        fdAnalyze.append("file", attachedImageFile);
+        fdAnalyze.append("language", lang);
+        if (question) fdAnalyze.append("prompt", question);
 
-        // Fire both requests in parallel
-        const classifyPromise = fetch("/classify-plant", {
+        const analyzeRes = await fetch("/analyze-image", {
           method: "POST",
-          body: fdClassify,
+          body: fdAnalyze,
         })
           .then(async (r) => ({ ok: r.ok, json: await safeJson(r) }))
           .catch((e) => ({ ok: false, json: { error: e.message } }));
 
-        const scanPromise = fetch("/scan-image", {
-          method: "POST",
-          body: fdScan,
-        })
-          .then(async (r) => ({ ok: r.ok, json: await safeJson(r) }))
-          .catch((e) => ({ ok: false, json: { error: e.message } }));
-
-        const [classRes, scanRes] = await Promise.all([
-          classifyPromise,
-          scanPromise,
-        ]);
-
         // Helper to format classification block
         function formatClassification(cdata) {
           try {
@@ -1176,8 +1272,9 @@ async function handleSendMessage() {
           return obj && obj.json ? obj.json : null;
         }
 
-        const classifyData = safeJsonResponseWrapper(classRes) || {};
-        const scanData = safeJsonResponseWrapper(scanRes) || {};
+        const analysisData = safeJsonResponseWrapper(analyzeRes) || {};
+        const classifyData = analysisData.classification || {};
+        const scanData = analysisData.scan || {};
 
         let finalMsg = "";
 
@@ -1223,11 +1320,11 @@ async function handleSendMessage() {
             "Re-analyze the image carefully for subtle early-stage disease or pest signs. If healthy, provide at least one preventive measure and confidence level. Do NOT invent conditions."
           );
           try {
-            const retryResp = await fetch("/scan-image", {
+            const retryResp = await fetch("/analyze-image", {
               method: "POST",
               body: retryFd,
             });
-            const retryJson = await safeJson(retryResp);
+            const retryJson = ((await safeJson(retryResp)) || {}).scan;
             if (retryResp.ok && retryJson) {
               // update finalMsg with retry details (append)
               finalMsg += "\n**Retry Analysis**\n\n" + formatScan(retryJson);
@@ -1268,19 +1365,23 @@ async function handleSendMessage() {
       }
     } else {
       // Regular text question
-      // sending question to /ask endpoint
+      // sending question to /ask endpoint; stream tokens via SSE when supported
+      const canStream = typeof ReadableStream !== "undefined" && typeof TextDecoder !== "undefined";
       const res = await fetch("/ask", {
         method: "POST",
         headers: {
           "Content-Type": "application/json",
+          Accept: canStream ? "text/event-stream" : "application/json",
         },
         body: JSON.stringify({
           question: question,
           language: lang,
+          stream: canStream,
         }),
       });
 
-      const data = await res.json();
+      const isStream = res.ok && res.body && (res.headers.get("Content-Type") || "").includes("text/event-stream");
+      const data = isStream ? await readAnswerStream(res) : await res.json();
       // response from /ask endpoint
 
       if (!res.ok) {
@@ -0,0 +1,238 @@
+"""
+Static Delivery - Fingerprinted, Revalidating and Precompressed Responses
+=========================================================================
+
+Serves the UI assets, uploads and generated infographics with an explicit
+caching policy so repeat visits cost (close to) zero bytes:
+
+    1. **Strong validators**: every response carries a content-hash ETag and
+       Last-Modified; conditional requests are answered with 304 and Range
+       requests with 206 (werkzeug's conditional send_file)
+    2. **Fingerprinted assets**: ``fingerprint_html()`` rewrites
+       ``/static/...`` references in index.html to ``?v=<content hash>``; a
+       request whose ``v`` matches the current hash is cached for a year as
+       immutable, anything else must revalidate
+    3. **Immutable outputs**: generated infographics are named by their
+       content hash, so they are immutable too
+    4. **Precompressed siblings**: when ``<file>.br`` / ``<file>.gz`` exists
+       and the client accepts that encoding, the sibling is sent with
+       Content-Encoding instead of compressing on every request; build them
+       with ``python static_delivery.py static/``
+
+Brotli siblings need the optional ``brotli`` package; gzip always works.
+"""
+# Standard library imports
+import argparse
+import gzip
+import hashlib
+import logging
+import mimetypes
+import os
+import re
+import threading
+from typing import Dict, Optional, Tuple
+
+# Third-party imports
+from flask import Response, request, send_file
+from werkzeug.exceptions import NotFound
+from werkzeug.security import safe_join
+
+try:
+    import brotli
+except ImportError:  # optional: only needed to build .br siblings
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+# ============================================================================
+# CONFIGURATION
+# ============================================================================
+
+IMMUTABLE = 'public, max-age=31536000, immutable'
+REVALIDATE = 'no-cache'
+# Text assets worth precompressing
+COMPRESSIBLE_EXTENSIONS = {'.js', '.css', '.html', '.svg', '.json', '.txt'}
+# Siblings in order of preference: (suffix, Content-Encoding)
+_ENCODINGS = (('.br', 'br'), ('.gz', 'gzip'))
+# Asset references rewritten by fingerprint_html()
+_STATIC_REF_RE = re.compile(r'''((?:src|href)=["'])(/static/[^"'?#]+)(?:\?[^"'#]*)?(["'])''')
+
+# path -> ((mtime_ns, size), sha256 hex)
+_DIGESTS: Dict[str, Tuple[Tuple[int, int], str]] = {}
+_DIGESTS_LOCK = threading.Lock()
+
+
+def file_digest(path: str) -> str:
+    """SHA-256 of a file's content, memoized on (mtime_ns, size)."""
+    st = os.stat(path)
+    signature = (st.st_mtime_ns, st.st_size)
+    with _DIGESTS_LOCK:
+        cached = _DIGESTS.get(path)
+    if cached and cached[0] == signature:
+        return cached[1]
+    h = hashlib.sha256()
+    with open(path, 'rb') as fh:
+        for block in iter(lambda: fh.read(1 << 20), b''):
+            h.update(block)
+    digest = h.hexdigest()
+    with _DIGESTS_LOCK:
+        _DIGESTS[path] = (signature, digest)
+    return digest
+
+
+def asset_version(path: str) -> str:
+    """Short content hash used as the ``?v=`` fingerprint of a static asset."""
+    return file_digest(path)[:12]
+
+
+def _accepted_sibling(path: str) -> Tuple[str, Optional[str]]:
+    """Pick a precompressed sibling the client accepts, if one is at least as new as the file."""
+    accept_encoding = request.headers.get('Accept-Encoding', '')
+    if not accept_encoding or os.path.splitext(path)[1] not in COMPRESSIBLE_EXTENSIONS:
+        return path, None
+    mtime = os.stat(path).st_mtime_ns
+    for suffix, encoding in _ENCODINGS:
+        if encoding in accept_encoding:
+            sibling = path + suffix
+            try:
+                if os.stat(sibling).st_mtime_ns >= mtime:
+                    return sibling, encoding
+            except FileNotFoundError:
+                continue
+    return path, None
+
+
+def send_static(directory: str, filename: str, cache_control: Optional[str] = None,
+                immutable: bool = False) -> Response:
+    """
+    Send a file with a strong ETag, Last-Modified, Range support and precompressed siblings.
+
+    Args:
+        directory: Base directory (the path is resolved safely inside it)
+        filename: Path relative to directory
+        cache_control: Cache-Control value (default: revalidate on every use)
+        immutable: Shorthand for cache_control=IMMUTABLE
+
+    Returns:
+        200, 206 or 304 response
+
+    Raises:
+        NotFound: if the file does not exist inside directory
+    """
+    path = safe_join(directory, filename)
+    if path is None or not os.path.isfile(path):
+        raise NotFound()
+    mimetype = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+    body_path, encoding = _accepted_sibling(path)
+    etag = file_digest(body_path)
+    response = send_file(os.path.abspath(body_path), mimetype=mimetype, etag=etag, conditional=True,
+                         last_modified=os.stat(path).st_mtime, max_age=None)
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    if os.path.splitext(path)[1] in COMPRESSIBLE_EXTENSIONS:
+        response.vary.add('Accept-Encoding')
+    response.headers['Cache-Control'] = IMMUTABLE if immutable else (cache_control or REVALIDATE)
+    return response
+
+
+def send_fingerprinted(directory: str, filename: str) -> Response:
+    """Send a static asset: immutable when requested with its current ``?v=`` hash, revalidated otherwise."""
+    path = safe_join(directory, filename)
+    if path is None or not os.path.isfile(path):
+        raise NotFound()
+    return send_static(directory, filename, immutable=request.args.get('v') == asset_version(path))
+
+
+# HTML path -> (mtime_ns, source html)
+_HTML_SOURCES: Dict[str, Tuple[int, str]] = {}
+
+
+def fingerprint_html(path: str, static_dir: str) -> Tuple[str, str]:
+    """
+    Rewrite ``/static/...`` references in an HTML file to content-hash URLs.
+
+    Args:
+        path: HTML file to rewrite
+        static_dir: Directory served under /static
+
+    Returns:
+        (html, etag); the source is re-read only when its mtime changes and
+        asset hashes are memoized, so this costs a few stat calls
+    """
+    mtime = os.stat(path).st_mtime_ns
+    cached = _HTML_SOURCES.get(path)
+    if cached and cached[0] == mtime:
+        html = cached[1]
+    else:
+        with open(path, 'r', encoding='utf-8') as fh:
+            html = fh.read()
+        _HTML_SOURCES[path] = (mtime, html)
+
+    def _rewrite(match):
+        asset = safe_join(static_dir, match.group(2)[len('/static/'):])
+        if asset is None or not os.path.isfile(asset):
+            return match.group(0)
+        return f'{match.group(1)}{match.group(2)}?v={asset_version(asset)}{match.group(3)}'
+
+    rewritten = _STATIC_REF_RE.sub(_rewrite, html)
+    return rewritten, hashlib.sha256(rewritten.encode('utf-8')).hexdigest()[:32]
+
+
+def send_html(path: str, static_dir: str) -> Response:
+    """Send an HTML page with fingerprinted asset URLs, revalidated via its ETag."""
+    html, etag = fingerprint_html(path, static_dir)
+    response = Response(html, mimetype='text/html')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = REVALIDATE
+    return response.make_conditional(request)
+
+
+# ============================================================================
+# PRECOMPRESSION (build step)
+# ============================================================================
+
+def precompress(directory: str) -> Dict[str, int]:
+    """
+    Write .gz (and .br when brotli is installed) siblings for text assets under directory.
+
+    Siblings that are not smaller than the original are not kept.
+
+    Returns:
+        Stats dict: files, written
+    """
+    stats = {'files': 0, 'written': 0}
+    for root, _, names in os.walk(directory):
+        for name in names:
+            if os.path.splitext(name)[1] not in COMPRESSIBLE_EXTENSIONS:
+                continue
+            path = os.path.join(root, name)
+            with open(path, 'rb') as fh:
+                data = fh.read()
+            stats['files'] += 1
+            encoders = [('.gz', lambda b: gzip.compress(b, compresslevel=9, mtime=0))]
+            if brotli is not None:
+                encoders.append(('.br', lambda b: brotli.compress(b, quality=11)))
+            for suffix, encode in encoders:
+                encoded = encode(data)
+                if len(encoded) >= len(data):
+                    continue
+                with open(path + suffix, 'wb') as fh:
+                    fh.write(encoded)
+                stats['written'] += 1
+                logger.info(f'🗜️ {path}{suffix}: {len(data)} -> {len(encoded)} bytes')
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Write precompressed siblings for static assets')
+    parser.add_argument('directory', nargs='?', default='static')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    stats = precompress(args.directory)
+    if brotli is None:
+        logger.info('ℹ️ brotli not installed: only .gz siblings were written')
+    logger.info(f"✅ {stats['written']} sibling(s) for {stats['files']} file(s)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+"""Unit tests for answer_cache.AnswerCache (no server or API key needed)."""
+import time
+
+import pytest
+
+from answer_cache import AnswerCache, content_words, normalize_question
+
+KB = 'store#1'
+
+
+@pytest.fixture
+def cache():
+    return AnswerCache(max_entries=100, ttl_seconds=3600, enabled=True)
+
+
+def test_exact_hit_ignores_case_and_punctuation(cache):
+    cache.put('When to apply urea?', 'english', KB, {'answer': 'A'})
+    hit = cache.get('when to apply Urea', 'english', KB)
+    assert hit['match'] == 'exact'
+    assert hit['value'] == {'answer': 'A'}
+
+
+def test_similar_hit_on_same_content_words(cache):
+    cache.put('what is the price of sugarcane in UP', 'english', KB, {'answer': 'UP'})
+    hit = cache.get('What is price of sugarcane in UP, please?', 'english', KB)
+    assert hit['match'] == 'similar'
+    assert hit['value'] == {'answer': 'UP'}
+
+
+@pytest.mark.parametrize('stored, asked', [
+    ('what is the price of sugarcane in UP', 'what is the price of sugarcane in Punjab'),
+    ('when to apply urea', 'how to apply urea'),
+    ('when to apply urea', 'when to apply potash'),
+    ('red rot symptoms in sugarcane', 'red rot control in sugarcane'),
+    ('is Co 0238 good for UP', 'is Co 0238 not good for UP'),
+    ('गन्ने में लाल सड़न रोग के लक्षण', 'गन्ने में कंडुआ रोग के लक्षण'),
+])
+def test_entity_near_misses_are_not_served(cache, stored, asked):
+    cache.put(stored, 'english', KB, {'answer': stored})
+    assert cache.get(asked, 'english', KB) is None
+
+
+def test_all_stopword_questions_only_match_exactly(cache):
+    cache.put('can you tell me', 'english', KB, {'answer': 'A'})
+    assert cache.get('could you tell me please', 'english', KB) is None
+
+
+def test_language_and_kb_version_partition(cache):
+    cache.put('when to apply urea', 'english', KB, {'answer': 'A'})
+    assert cache.get('when to apply urea', 'hindi', KB) is None
+    assert cache.get('when to apply urea', 'english', 'store#2') is None
+
+
+def test_ttl_expiry(cache):
+    cache.ttl_seconds = 0
+    cache.put('when to apply urea', 'english', KB, {'answer': 'A'})
+    time.sleep(0.01)
+    assert cache.get('when to apply urea please', 'english', KB) is None
+    assert cache.stats()['expired'] >= 1
+
+
+def test_lru_eviction_keeps_similar_index_consistent():
+    cache = AnswerCache(max_entries=2, ttl_seconds=3600, enabled=True)
+    cache.put('urea dose for sugarcane', 'english', KB, {'answer': 1})
+    cache.put('potash dose for sugarcane', 'english', KB, {'answer': 2})
+    cache.put('zinc dose for sugarcane', 'english', KB, {'answer': 3})
+    assert cache.stats()['size'] == 2
+    assert cache.get('the urea dose for sugarcane', 'english', KB) is None
+    assert cache.get('the zinc dose for sugarcane', 'english', KB)['value'] == {'answer': 3}
+
+
+def test_bypass_and_disabled(cache):
+    cache.put('when to apply urea', 'english', KB, {'answer': 'A'})
+    assert cache.get('when to apply urea', 'english', KB, bypass=True) is None
+    assert AnswerCache(enabled=False).get('when to apply urea', 'english', KB) is None
+
+
+def test_content_words_drop_stopwords_and_keep_order():
+    assert content_words(normalize_question('What is the price of sugarcane in UP?')) == \
+        ('what', 'price', 'sugarcane', 'up')
+    assert content_words(normalize_question('convert acre to hectare')) == ('convert', 'acre', 'to', 'hectare')
+
+
+@pytest.mark.parametrize('stored, asked', [
+    ('convert acre to hectare', 'convert hectare to acre'),
+    ('Is Co 0238 better than Co 86032?', 'Is Co 86032 better than Co 0238?'),
+    ('shift seedlings from nursery to field', 'shift seedlings from field to nursery'),
+    ('Co 0238 vs Co 86032', 'Co 0238 Co 86032'),
+])
+def test_reversed_direction_and_comparisons_are_not_served(cache, stored, asked):
+    cache.put(stored, 'english', KB, {'answer': stored})
+    assert cache.get(asked, 'english', KB) is None
+    assert cache.get(stored.upper(), 'english', KB)['match'] == 'exact'
+
+
+def test_retrieval_mode_partition(cache):
+    cache.put('when to apply urea', 'english', KB, {'answer': 'remote'}, retrieval='file_search')
+    assert cache.get('when to apply urea', 'english', KB, retrieval='local') is None
+    assert cache.get('when to apply the urea', 'english', KB, retrieval='local') is None
+    cache.put('when to apply urea', 'english', KB, {'answer': 'local'}, retrieval='local')
+    assert cache.get('when to apply urea', 'english', KB, retrieval='local')['value'] == {'answer': 'local'}
+    assert cache.get('when to apply the urea', 'english', KB,
+                     retrieval='file_search')['value'] == {'answer': 'remote'}
@@ -0,0 +1,122 @@
+"""The native ASGI routes share the Flask route logic and keep blocking work off the event loop."""
+import threading
+import types
+from io import BytesIO
+
+import pytest
+from PIL import Image
+from starlette.testclient import TestClient
+
+import ai_services
+import app as app_module
+import asgi
+
+
+@pytest.fixture
+def loop_threads(monkeypatch):
+    """Record the threads that run the blocking cache and store calls."""
+    seen = {}
+
+    def record(name, result):
+        def call(*args, **kwargs):
+            seen[name] = threading.current_thread()
+            return result
+        return call
+
+    monkeypatch.setattr(ai_services, 'CLIENT', object())
+    # Flask starts the knowledge base sync on the first request
+    monkeypatch.setattr(app_module, 'ensure_knowledge_base_initialized', lambda: None)
+    monkeypatch.setattr(ai_services, 'knowledge_base_version', record('kb_version', 'kb#1'))
+    monkeypatch.setattr(ai_services, 'cached_infographic', record('cached_infographic', None))
+    monkeypatch.setattr(ai_services, '_infographic_is_on_cooldown', record('cooldown', True))
+    monkeypatch.setattr(ai_services.SCAN_CACHE, 'get', record('scan_cache_get', {
+        'value': {'success': True, 'classification': {'classification': 'sugarcane'}, 'scan': {},
+                  'prompt_used': '', 'raw_text': '{}'},
+        'match': 'exact', 'distance': 0}))
+    monkeypatch.setattr(ai_services.ANSWER_CACHE, 'get', record('answer_cache_get', {
+        'value': {'response': 'cached answer', **app_module.ASK_METADATA}, 'match': 'exact', 'similarity': 1.0}))
+    return seen
+
+
+def _probe_app(route, loop_thread):
+    """The route under test, noting which thread runs the event loop (no startup hooks)."""
+    async def probe(request):
+        loop_thread['thread'] = threading.current_thread()
+        return await route(request)
+
+    return asgi.Starlette(routes=[asgi.Route('/probe', probe, methods=['POST'])])
+
+
+async def _prepared(data):
+    return types.SimpleNamespace(data=data, mime_type='image/jpeg', dhash=1)
+
+
+def _jpeg() -> bytes:
+    out = BytesIO()
+    Image.new('RGB', (32, 32), (40, 160, 60)).save(out, 'JPEG')
+    return out.getvalue()
+
+
+def test_ask_cache_hit_runs_off_the_loop(loop_threads):
+    loop_thread = {}
+    with TestClient(_probe_app(asgi.ask, loop_thread)) as http:
+        body = http.post('/probe', json={'question': 'when to apply urea'}).json()
+    assert body == {'response': 'cached answer', **app_module.ASK_METADATA, 'cached': True}
+    for name in ('kb_version', 'answer_cache_get'):
+        assert loop_threads[name] is not loop_thread['thread'], name
+
+
+def test_generate_infographic_runs_off_the_loop_and_matches_flask(loop_threads):
+    loop_thread = {}
+    body = {'question': 'red rot symptoms', 'content': 'answer', 'language': 'english'}
+    with TestClient(_probe_app(asgi.generate_infographic, loop_thread)) as http:
+        native = http.post('/probe', json=body)
+    flask = app_module.app.test_client().post('/generate-infographic', json=body)
+    assert native.status_code == flask.status_code == 429
+    assert native.json() == flask.get_json()
+    for name in ('cached_infographic', 'cooldown'):
+        assert loop_threads[name] is not loop_thread['thread'], name
+
+
+@pytest.mark.parametrize('route', ['analyze-image', 'scan-image'])
+def test_scan_cache_hit_runs_off_the_loop(loop_threads, monkeypatch, route):
+    loop_thread = {}
+    monkeypatch.setattr(asgi.image_preprocess, 'apreprocess_image', _prepared)
+    handler = {'analyze-image': asgi.analyze_image, 'scan-image': asgi.scan_image}[route]
+    with TestClient(_probe_app(handler, loop_thread)) as http:
+        scan = http.post('/probe', files={'file': ('leaf.jpg', _jpeg(), 'image/jpeg')}).json()
+    assert scan['raw_text'] == '{}'
+    for name in ('kb_version', 'scan_cache_get'):
+        assert loop_threads[name] is not loop_thread['thread'], name
+
+
+@pytest.mark.parametrize('no_cache, cache_control, expected', [
+    (True, None, True), (False, None, False), ('1', None, True), ('true', None, True),
+    ('', None, False), ('0', None, False), (False, 'no-cache', True), ('', 'max-age=0, no-cache', True),
+])
+def test_cache_bypass_parsing(no_cache, cache_control, expected):
+    assert app_module.cache_bypass_requested(no_cache, cache_control) is expected
+
+
+def test_ask_request_resolves_the_retrieval_mode(monkeypatch):
+    monkeypatch.setattr(ai_services, 'RETRIEVAL_MODE', 'file_search')
+    ask, error = app_module.parse_ask_request({'question': ' urea? ', 'retrieval': 'LOCAL'}, None)
+    assert error is None and ask.question == 'urea?' and ask.retrieval == 'local'
+    assert app_module.parse_ask_request({'question': 'urea?', 'retrieval': 'bogus'}, None)[0].retrieval == 'file_search'
+    assert app_module.parse_ask_request({'question': '  '}, None) == (None, 'Question cannot be empty')
+    assert app_module.parse_ask_request(None, None) == (None, 'JSON body required')
+
+
+@pytest.mark.parametrize('route', ['analyze-image', 'scan-image'])
+def test_scan_cache_hit_matches_flask(loop_threads, monkeypatch, route):
+    monkeypatch.setattr(asgi.image_preprocess, 'apreprocess_image', _prepared)
+    monkeypatch.setattr(app_module.image_preprocess, 'preprocess_image',
+                        lambda data: types.SimpleNamespace(data=data, mime_type='image/jpeg', dhash=1))
+    monkeypatch.setattr(app_module, 'client', object())
+    handler = {'analyze-image': asgi.analyze_image, 'scan-image': asgi.scan_image}[route]
+    with TestClient(_probe_app(handler, {})) as http:
+        native = http.post('/probe', files={'file': ('leaf.jpg', _jpeg(), 'image/jpeg')})
+    flask = app_module.app.test_client().post(f'/{route}', data={'file': (BytesIO(_jpeg()), 'leaf.jpg')},
+                                              content_type='multipart/form-data')
+    assert native.status_code == flask.status_code == 200
+    assert native.json() == flask.get_json()
@@ -0,0 +1,102 @@
+"""Unit tests for image_preprocess pool failure handling (no server or API key needed)."""
+import asyncio
+import concurrent.futures
+import warnings
+from concurrent.futures.process import BrokenProcessPool
+from io import BytesIO
+
+import pytest
+from PIL import Image
+
+import image_preprocess
+from image_preprocess import ImageTooLargeError, InvalidImageError, PreprocessUnavailableError
+
+
+def _jpeg(size=(64, 48)) -> bytes:
+    out = BytesIO()
+    Image.new('RGB', size, (40, 160, 60)).save(out, 'JPEG')
+    return out.getvalue()
+
+
+class _FakeExecutor:
+    """Runs prepare_image inline, or fails the way a dead or stuck pool does."""
+
+    def __init__(self, failure=None):
+        self.failure = failure
+        self.shut_down = False
+
+    def submit(self, fn, *args):
+        future = concurrent.futures.Future()
+        if self.failure is not None:
+            future.set_exception(self.failure)
+        elif fn is not None:
+            future.set_result(fn(*args))
+        return future
+
+    def shutdown(self, wait=True):
+        self.shut_down = True
+
+
+@pytest.fixture
+def pools(monkeypatch):
+    created = []
+
+    def install(*executors):
+        queue = list(executors)
+
+        def executor():
+            if image_preprocess._EXECUTOR is None:
+                image_preprocess._EXECUTOR = queue.pop(0)
+                created.append(image_preprocess._EXECUTOR)
+            return image_preprocess._EXECUTOR
+
+        monkeypatch.setattr(image_preprocess, '_EXECUTOR', None)
+        monkeypatch.setattr(image_preprocess, '_executor', executor)
+        return created
+
+    return install
+
+
+@pytest.mark.parametrize('run', [
+    image_preprocess.preprocess_image,
+    lambda data: asyncio.run(image_preprocess.apreprocess_image(data)),
+])
+def test_broken_pool_is_replaced_and_retried_once(pools, run):
+    broken = _FakeExecutor(BrokenProcessPool('worker died'))
+    created = pools(broken, _FakeExecutor())
+    prepared = run(_jpeg())
+    assert prepared.width == 64
+    assert broken.shut_down and len(created) == 2
+    assert image_preprocess._EXECUTOR is created[1]
+
+
+def test_second_crash_is_reported_as_unavailable(pools):
+    pools(_FakeExecutor(BrokenProcessPool('died')), _FakeExecutor(BrokenProcessPool('died again')))
+    with pytest.raises(PreprocessUnavailableError):
+        image_preprocess.preprocess_image(_jpeg())
+    assert image_preprocess._EXECUTOR is None  # the next request builds a fresh pool
+
+
+@pytest.mark.parametrize('run', [
+    image_preprocess.preprocess_image,
+    lambda data: asyncio.run(image_preprocess.apreprocess_image(data)),
+])
+def test_timeout_is_reported_as_unavailable(pools, monkeypatch, run):
+    monkeypatch.setattr(image_preprocess, 'TIMEOUT_SECONDS', 0.01)
+    stuck = _FakeExecutor()
+    stuck.submit = lambda fn, *args: concurrent.futures.Future()  # never completes
+    pools(stuck)
+    timeouts = image_preprocess.stats()['timeouts']
+    with pytest.raises(PreprocessUnavailableError):
+        run(_jpeg())
+    assert image_preprocess.stats()['timeouts'] == timeouts + 1
+
+
+def test_decompression_bomb_is_an_invalid_image(monkeypatch):
+    monkeypatch.setattr(Image, 'MAX_IMAGE_PIXELS', Image.MAX_IMAGE_PIXELS)
+    with warnings.catch_warnings():
+        image_preprocess._init_worker(1000)
+        with pytest.raises(ImageTooLargeError):
+            image_preprocess.prepare_image(_jpeg((64, 48)))
+        assert image_preprocess.prepare_image(_jpeg((20, 20))).width == 20
+    assert issubclass(ImageTooLargeError, InvalidImageError)
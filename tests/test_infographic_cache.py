@@ -0,0 +1,43 @@
+"""Infographic reuse through the content-addressed cache, with a fake model (no API key needed)."""
+import types
+
+import pytest
+
+import ai_services
+import image_variants
+
+PNG = b'\x89PNG\r\n\x1a\n'
+
+
+@pytest.fixture
+def fake_model(tmp_path, monkeypatch):
+    monkeypatch.setattr(ai_services, 'UPLOAD_FOLDER', str(tmp_path / 'uploads'))
+    monkeypatch.setattr(ai_services, 'DATA_FOLDER', str(tmp_path / 'data'))
+    monkeypatch.setattr(ai_services, '_INFOGRAPHIC_CACHE', None)
+    monkeypatch.setattr(ai_services, '_COOLDOWN_STORE', None)
+    monkeypatch.setattr(image_variants, 'schedule', lambda path: None)
+    calls = []
+
+    def generate_content(**kwargs):
+        calls.append(kwargs)
+        image = types.SimpleNamespace(data=PNG + str(len(calls)).encode(), mime_type='image/png')
+        return types.SimpleNamespace(parts=[types.SimpleNamespace(inline_data=image)])
+
+    monkeypatch.setattr(ai_services, 'CLIENT', types.SimpleNamespace(
+        models=types.SimpleNamespace(generate_content=generate_content)))
+    return calls
+
+
+def test_equivalent_request_reuses_the_cached_image(fake_model):
+    first = ai_services.generate_infographic_image('Apply urea in three splits', 'Urea schedule', force=True)
+    again = ai_services.generate_infographic_image('Apply urea in three splits', 'urea  schedule?')
+    assert first and again == first
+    assert len(fake_model) == 1
+
+
+def test_force_regenerates_and_replaces_the_cached_image(fake_model):
+    first = ai_services.generate_infographic_image('Apply urea in three splits', 'Urea schedule', force=True)
+    forced = ai_services.generate_infographic_image('Apply urea in three splits', 'Urea schedule', force=True)
+    assert len(fake_model) == 2
+    assert forced != first
+    assert ai_services.cached_infographic('Urea schedule', 'Apply urea in three splits') == forced
@@ -0,0 +1,48 @@
+"""Infographic job streams must not pin WSGI request threads (no server or API key needed)."""
+import os
+import time
+
+import pytest
+
+import app as app_module
+from infographic_jobs import InfographicJobQueue
+
+
+@pytest.fixture
+def jobs(tmp_path, monkeypatch):
+    queue = InfographicJobQueue(str(tmp_path / 'jobs.sqlite3'), workers=1, max_pending=5)
+    monkeypatch.setattr(app_module, 'JOBS', queue)
+    monkeypatch.setattr(app_module, 'WSGI_JOB_EVENTS_SECONDS', 0.2)
+    return queue
+
+
+def _insert(queue, job_id, state, image_path=None):
+    # Owned by a live foreign process, so this process's sweep leaves it alone
+    now = time.time()
+    queue._conn().execute(
+        'INSERT INTO jobs (id, dedupe_key, state, topic, content, language, force, owner_pid, owner, '
+        'image_path, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+        (job_id, job_id, state, 'topic', 'content', 'english', 0, os.getppid(), 'elsewhere', image_path, now, now),
+    )
+
+
+def test_wsgi_job_payload_does_not_advertise_a_stream(jobs):
+    _insert(jobs, 'queued-job', 'queued')
+    body = app_module.app.test_client().get('/infographic-jobs/queued-job').get_json()
+    assert body['status_url'] == '/infographic-jobs/queued-job'
+    assert 'events_url' not in body
+
+
+def test_wsgi_stream_of_an_unfinished_job_is_capped(jobs):
+    _insert(jobs, 'queued-job', 'queued')
+    started = time.monotonic()
+    body = app_module.app.test_client().get('/infographic-jobs/queued-job/events').get_data(as_text=True)
+    assert time.monotonic() - started < 2
+    assert body.startswith('event: status') and body.endswith('retry: 2000\n\n')
+    assert 'event: error' not in body  # the client reconnects instead of giving up
+
+
+def test_wsgi_stream_of_a_finished_job_ends_with_done(jobs):
+    _insert(jobs, 'done-job', 'succeeded', 'generated_infographics/x.png')
+    body = app_module.app.test_client().get('/infographic-jobs/done-job/events').get_data(as_text=True)
+    assert body.startswith('event: done')
@@ -0,0 +1,113 @@
+"""Unit tests for infographic_jobs.InfographicJobQueue recovery (no server or API key needed)."""
+import os
+import threading
+import time
+
+import pytest
+
+import ai_services
+import infographic_jobs
+from infographic_jobs import InfographicJobQueue, boot_token
+
+
+@pytest.fixture
+def queue(tmp_path, monkeypatch):
+    monkeypatch.setattr(ai_services, 'generate_infographic_image', lambda **kwargs: 'infographic_test.png')
+    monkeypatch.setattr(ai_services, '_infographic_is_on_cooldown', lambda topic: False)
+    return InfographicJobQueue(str(tmp_path / 'jobs.sqlite3'), workers=1, max_pending=5)
+
+
+def _insert(queue, job_id, state, owner_pid, owner, updated_at=None):
+    now = time.time()
+    queue._conn().execute(
+        'INSERT INTO jobs (id, dedupe_key, state, topic, content, language, force, owner_pid, owner, '
+        'created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+        (job_id, job_id, state, 'topic', 'content', 'english', 0, owner_pid, owner, now,
+         now if updated_at is None else updated_at),
+    )
+
+
+def _finish(queue, job_id):
+    return list(queue.watch(job_id, timeout=5))[-1]
+
+
+@pytest.mark.parametrize('state', ['queued', 'running'])
+def test_job_of_earlier_process_with_our_pid_is_adopted(queue, state):
+    # A restarted container reuses pids: same pid, different boot token
+    _insert(queue, 'reused-pid', state, os.getpid(), 'token-of-previous-boot')
+    assert queue.sweep() == 1
+    assert _finish(queue, 'reused-pid')['state'] == 'succeeded'
+
+
+def test_job_from_database_without_owner_tokens_is_adopted(queue):
+    _insert(queue, 'legacy', 'queued', os.getpid(), None)
+    assert queue.sweep() == 1
+    assert _finish(queue, 'legacy')['state'] == 'succeeded'
+
+
+def test_live_foreign_owner_is_left_alone_until_stale(queue):
+    _insert(queue, 'live', 'running', os.getppid(), 'token-of-parent')
+    assert queue.sweep() == 0
+    queue._conn().execute('UPDATE jobs SET updated_at = ? WHERE id = ?',
+                          (time.time() - infographic_jobs.STALE_SECONDS - 1, 'live'))
+    assert queue.sweep() == 1
+    assert _finish(queue, 'live')['state'] == 'succeeded'
+
+
+def test_own_jobs_are_not_adopted(queue):
+    _insert(queue, 'mine', 'running', os.getpid(), boot_token())
+    assert queue.sweep() == 0
+
+
+def test_submit_dedupes_and_runs(queue, monkeypatch):
+    release = threading.Event()
+
+    def generate_infographic_image(**kwargs):
+        release.wait(5)
+        return 'infographic_test.png'
+
+    monkeypatch.setattr(ai_services, 'generate_infographic_image', generate_infographic_image)
+    job = queue.submit('topic', 'content', 'english')
+    again = queue.submit('topic', 'content', 'english')
+    release.set()
+    assert again['deduped'] and again['id'] == job['id']
+    assert _finish(queue, job['id'])['infographic_url'] == '/uploads/infographic_test.png'
+
+
+def test_running_job_heartbeat_keeps_it_from_going_stale(queue, monkeypatch):
+    monkeypatch.setattr(infographic_jobs, 'HEARTBEAT_SECONDS', 0.01)
+    release = threading.Event()
+    monkeypatch.setattr(ai_services, 'generate_infographic_image',
+                        lambda **kwargs: release.wait(5) and 'infographic_test.png')
+    job = queue.submit('topic', 'content', 'english')
+    old = time.time() - infographic_jobs.STALE_SECONDS - 1
+    queue._conn().execute('UPDATE jobs SET updated_at = ? WHERE id = ?', (old, job['id']))
+    deadline = time.monotonic() + 5
+    while queue._conn().execute('SELECT updated_at FROM jobs WHERE id = ?', (job['id'],)).fetchone()[0] == old:
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+    release.set()
+    assert _finish(queue, job['id'])['state'] == 'succeeded'
+
+
+def test_result_of_a_job_taken_over_is_discarded(queue, monkeypatch):
+    started, release = threading.Event(), threading.Event()
+
+    def generate_infographic_image(**kwargs):
+        started.set()
+        release.wait(5)
+        return 'infographic_slow.png'
+
+    monkeypatch.setattr(ai_services, 'generate_infographic_image', generate_infographic_image)
+    job = queue.submit('topic', 'content', 'english')
+    assert started.wait(5)
+    # Another process adopted the job and finished it first
+    queue._conn().execute(
+        "UPDATE jobs SET state = 'succeeded', owner = 'token-of-adopter', image_path = 'infographic_fast.png', "
+        'finished_at = ? WHERE id = ?', (time.time(), job['id']))
+    release.set()
+    deadline = time.monotonic() + 5
+    while queue.stats()['superseded'] != 1:
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+    assert queue.get(job['id'])['infographic_url'] == '/uploads/infographic_fast.png'
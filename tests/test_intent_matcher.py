@@ -0,0 +1,78 @@
+"""Keyword routing table for intent_matcher and ai_services.classify_query_type (no API key needed)."""
+import pytest
+
+import ai_services
+from intent_matcher import match_intents
+
+
+def route(question: str) -> str:
+    """'visual' / 'text' from the keyword checks, or 'llm' when the question falls through to the classifier."""
+    result = ai_services.classify_query_type(question)
+    return 'llm' if result['reason'].startswith('AI unavailable') else result['format']
+
+
+@pytest.fixture(autouse=True)
+def no_client(monkeypatch):
+    monkeypatch.setattr(ai_services, 'CLIENT', None)
+
+
+@pytest.mark.parametrize('question, expected', [
+    # Plurals and other inflections route like their base word
+    ('what are the diseases of sugarcane', 'visual'),
+    ('show pests in wheat', 'visual'),
+    ('give me charts', 'visual'),
+    ('diagrams please', 'visual'),
+    ('identifying red rot', 'visual'),
+    ('comparing varieties', 'visual'),
+    ('fertilizer schedules for ratoon', 'visual'),
+    ('photos of smut', 'visual'),
+    ('red rot symptom', 'visual'),
+    # Whole words only
+    ('is this variety good for UP?', 'llm'),
+    ('what is the history of sugarcane in India?', 'llm'),
+    ('which pesticide is safe for early shoot borer?', 'llm'),
+    ('what chemicals are in this canvas bag of fertilizer?', 'llm'),
+    ('Co 0238 vs Co 86032 yield', 'visual'),
+    # Greetings
+    ('hi', 'text'),
+    ('hello, thank you!', 'text'),
+    ('hi, what is the best time to plant sugarcane in Bihar this year?', 'llm'),
+    ('namaste', 'text'),
+    # Hinglish and Hindi
+    ('urea kab dale aur kitna dale?', 'visual'),
+    ('khet mein keet lag gaye hain, kya karein?', 'visual'),
+    ('गन्ने में लाल सड़न रोग के लक्षण क्या हैं?', 'visual'),
+    ('गन्ने की बुवाई का सही तरीका बताइए', 'visual'),
+    ('explain drip irrigation benefits', 'llm'),
+])
+def test_keyword_routing(question, expected):
+    assert route(question) == expected
+
+
+@pytest.mark.parametrize('text, intent', [
+    ('diseases', 'symptoms'),
+    ('pests', 'symptoms'),
+    ('identified', 'symptoms'),
+    ('charts', 'visual_request'),
+    ('processes', 'steps'),
+    ('schedules', 'schedule'),
+    ('comparisons', 'compare'),
+    ('created', 'create'),
+])
+def test_inflections_map_to_the_base_intent(text, intent):
+    assert match_intents(f'the {text} here').intents == {intent}
+
+
+@pytest.mark.parametrize('text', ['his', 'this', 'history', 'canvas', 'pesticide', 'hid', 'rogue', 'chartered'])
+def test_no_match_inside_other_words(text):
+    assert not match_intents(text).intents
+
+
+@pytest.mark.parametrize('question, style', [
+    ('fertilizer schedule and disease symptoms', 'timeline'),
+    ('compare Co 0238 and Co 86032', 'chart'),
+    ('how to plant sugarcane', 'detailed'),
+])
+def test_infographic_style(question, style):
+    decision = ai_services.decide_make_infographic('', question)
+    assert decision['make'] and decision['style'] == style
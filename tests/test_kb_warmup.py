@@ -0,0 +1,111 @@
+"""Unit tests for kb_warmup.KnowledgeBaseWarmup with a stubbed sync (no server or API key needed)."""
+import json
+import time
+import types
+
+import pytest
+
+import ai_services
+import kb_warmup
+
+
+@pytest.fixture
+def warmup_env(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(kb_warmup, 'RETRY_INTERVAL_SECONDS', 0.01)
+    monkeypatch.setattr(ai_services, 'CLIENT', object())
+    monkeypatch.setattr(ai_services, 'RETRIEVAL_MODE', 'file_search')
+    monkeypatch.setattr(ai_services, 'ensure_file_search_store', lambda: types.SimpleNamespace(name='store'))
+    monkeypatch.setattr(ai_services, 'knowledge_base_files', lambda *a: [])
+    monkeypatch.setattr(ai_services.REFERENCE_IMAGES, 'preload', lambda: None)
+    results = []
+
+    def initialize_knowledge_base(progress=None):
+        return results.pop(0)
+
+    monkeypatch.setattr(ai_services, 'initialize_knowledge_base', initialize_knowledge_base)
+    return results
+
+
+def _wait(warmup, predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not predicate(warmup.status()):
+        assert time.monotonic() < deadline, warmup.status()
+        time.sleep(0.01)
+
+
+def test_partial_sync_is_not_ready_and_is_retried(warmup_env):
+    warmup_env.extend([
+        {'total': 12, 'uploaded': 4, 'failed': 8},
+        {'total': 12, 'uploaded': 12, 'failed': 0},
+    ])
+    warmup = kb_warmup.KnowledgeBaseWarmup()
+    warmup.start()
+    _wait(warmup, lambda s: s['ready'])
+    assert not warmup_env  # both attempts ran
+    with open(kb_warmup.STATUS_PATH, encoding='utf-8') as fh:
+        assert json.load(fh)['state'] == 'ready'
+
+
+def test_all_failed_sync_reports_failed(warmup_env, monkeypatch):
+    monkeypatch.setattr(kb_warmup, 'RETRY_INTERVAL_SECONDS', 60)
+    warmup_env.append({'total': 12, 'uploaded': 0, 'failed': 12})
+    warmup = kb_warmup.KnowledgeBaseWarmup()
+    warmup.start()
+    _wait(warmup, lambda s: s['state'] == 'failed')
+    assert not warmup.ready
+    with open(kb_warmup.STATUS_PATH, encoding='utf-8') as fh:
+        assert json.load(fh)['state'] == 'failed'
+
+
+def test_partial_status_from_a_previous_boot_is_not_up_to_date(warmup_env):
+    fingerprint = kb_warmup.knowledge_base_fingerprint('store')
+    kb_warmup._write_status({'state': 'partial', 'fingerprint': fingerprint, 'total': 12, 'done': 12,
+                             'failed': 12, 'updated_at': time.time() - 60})
+    warmup_env.append({'total': 12, 'uploaded': 12, 'failed': 0})
+    warmup = kb_warmup.KnowledgeBaseWarmup()
+    warmup.start()
+    _wait(warmup, lambda s: s['ready'])
+    assert warmup.status()['role'] == 'leader'
+    assert not warmup_env
+
+
+def test_ready_status_for_the_same_fingerprint_skips_the_sync(warmup_env):
+    fingerprint = kb_warmup.knowledge_base_fingerprint('store')
+    kb_warmup._write_status({'state': 'ready', 'fingerprint': fingerprint, 'total': 12, 'done': 12,
+                             'failed': 0, 'updated_at': time.time() - 60})
+    warmup = kb_warmup.KnowledgeBaseWarmup()
+    warmup.start()
+    _wait(warmup, lambda s: s['ready'])
+    assert warmup.status()['role'] == 'follower'
+
+
+def test_error_before_the_sync_is_retried(warmup_env, monkeypatch):
+    calls = []
+
+    def ensure_file_search_store():
+        calls.append(1)
+        if len(calls) == 1:
+            raise ConnectionError('transient')
+        return types.SimpleNamespace(name='store')
+
+    monkeypatch.setattr(ai_services, 'ensure_file_search_store', ensure_file_search_store)
+    warmup_env.append({'total': 12, 'uploaded': 12, 'failed': 0, 'failed_files': []})
+    warmup = kb_warmup.KnowledgeBaseWarmup()
+    warmup.start()
+    _wait(warmup, lambda s: s['ready'])
+    assert warmup.status()['attempts'] == 2 and warmup.status()['error'] is None
+
+
+def test_files_that_keep_failing_become_warnings(warmup_env, monkeypatch):
+    monkeypatch.setattr(kb_warmup, 'MAX_SYNC_ATTEMPTS', 3)
+    warmup_env.extend({'total': 12, 'uploaded': 11, 'failed': 1, 'failed_files': ['knowledge_base/bad.pdf']}
+                      for _ in range(3))
+    warmup = kb_warmup.KnowledgeBaseWarmup()
+    warmup.start()
+    _wait(warmup, lambda s: s['ready'])
+    status = warmup.status()
+    assert status['attempts'] == 3 and not warmup_env
+    assert status['warnings'] == ['knowledge_base/bad.pdf: failed to upload after 3 attempts']
+    with open(kb_warmup.STATUS_PATH, encoding='utf-8') as fh:
+        assert json.load(fh)['state'] == 'partial'  # the next boot tries the file again
@@ -0,0 +1,73 @@
+"""Unit tests for scan_cache (BK-tree, ScanCache) and the hash from image_preprocess (no API key needed)."""
+import random
+from io import BytesIO
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from image_preprocess import prepare_image
+from scan_cache import BKTree, ScanCache, hamming
+
+
+def _photo(seed: int, size=(800, 600)) -> Image.Image:
+    rng = np.random.default_rng(seed)
+    small = rng.integers(0, 256, (6, 8, 3), dtype=np.uint8)
+    return Image.fromarray(small).resize(size, Image.BICUBIC)
+
+
+def _encode(img: Image.Image, fmt='JPEG', **params) -> bytes:
+    out = BytesIO()
+    img.save(out, fmt, **params)
+    return out.getvalue()
+
+
+def test_bk_tree_search_matches_brute_force():
+    rng = random.Random(7)
+    values = [rng.getrandbits(64) for _ in range(500)]
+    values += [v ^ (1 << rng.randrange(64)) for v in values[:100]]  # near duplicates
+    tree = BKTree()
+    for entry_id, value in enumerate(values):
+        tree.add(value, entry_id)
+    for entry_id in range(0, len(values), 5):
+        tree.remove(values[entry_id], entry_id)
+    live = {i: v for i, v in enumerate(values) if i % 5}
+    for query in values[:50] + [rng.getrandbits(64) for _ in range(20)]:
+        found = {i for _, ids in tree.search(query, 6) for i in ids}
+        assert found == {i for i, v in live.items() if hamming(query, v) <= 6}
+
+
+def test_prepared_hash_tolerates_reencoding_and_resizing():
+    photo = _photo(1)
+    original = prepare_image(_encode(photo, quality=95))
+    reencoded = prepare_image(_encode(photo.resize((400, 300)), quality=60))
+    as_png = prepare_image(_encode(photo, 'PNG'))
+    other = prepare_image(_encode(_photo(2), quality=95))
+    assert hamming(original.dhash, reencoded.dhash) <= 6
+    assert hamming(original.dhash, as_png.dhash) <= 6
+    assert hamming(original.dhash, other.dhash) > 6
+
+
+@pytest.fixture
+def cache():
+    return ScanCache(max_entries=3, ttl_seconds=3600, max_distance=6, enabled=True)
+
+
+def test_similar_hit_within_partition_only(cache):
+    cache.put(0b1011, 'what is this', 'english', 'kb1', {'answer': 1})
+    assert cache.get(0b1011, 'What is this?', 'english', 'kb1')['match'] == 'exact'
+    hit = cache.get(0b1000, 'what is this', 'english', 'kb1')
+    assert hit['match'] == 'similar' and hit['distance'] == 2
+    assert cache.get(0b1011, 'what is this', 'hindi', 'kb1') is None
+    assert cache.get(0b1011, 'what is this', 'english', 'kb2') is None
+    assert cache.get(0b1011, 'is it red rot', 'english', 'kb1') is None
+
+
+def test_lru_eviction_and_far_hashes(cache):
+    hashes = [0xFFFF << (16 * i) for i in range(4)]  # pairwise 32 bits apart
+    for i, image_hash in enumerate(hashes):
+        cache.put(image_hash, '', 'english', 'kb', {'answer': i})
+    assert cache.stats()['size'] == 3
+    assert cache.get(hashes[0], '', 'english', 'kb') is None  # evicted
+    assert cache.get(hashes[3], '', 'english', 'kb')['value'] == {'answer': 3}
+    assert cache.get(0x5555 << 8, '', 'english', 'kb') is None
@@ -0,0 +1,54 @@
+"""The /uploads route must only serve generated infographics and user documents."""
+import pytest
+
+import app as app_module
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    (tmp_path / 'generated_infographics').mkdir()
+    (tmp_path / 'generated_infographics' / 'infographic_english_abc.png').write_bytes(b'\x89PNG\r\n\x1a\n')
+    (tmp_path / 'guide.pdf').write_bytes(b'%PDF-1.4')
+    for name in ('infographic_jobs.sqlite3', 'upload_manifest.sqlite3-wal', '.retention.lock'):
+        (tmp_path / name).write_bytes(b'private')
+    monkeypatch.setitem(app_module.app.config, 'UPLOAD_FOLDER', str(tmp_path))
+    monkeypatch.setattr(app_module, 'ensure_knowledge_base_initialized', lambda: None)
+    return app_module.app.test_client()
+
+
+@pytest.fixture
+def touched(monkeypatch):
+    paths = []
+    monkeypatch.setattr(app_module.RETENTION, 'touch', paths.append)
+    return paths
+
+
+@pytest.mark.parametrize('path', [
+    '/uploads/infographic_jobs.sqlite3',
+    '/uploads/upload_manifest.sqlite3-wal',
+    '/uploads/.retention.lock',
+])
+def test_state_files_are_not_served(client, path):
+    assert client.get(path).status_code == 404
+
+
+def test_documents_and_infographics_are_served(client):
+    assert client.get('/uploads/guide.pdf').status_code == 200
+    assert client.get('/uploads/generated_infographics/infographic_english_abc.png?original=1').status_code == 200
+
+
+@pytest.mark.parametrize('path', [
+    '/uploads/generated_infographics/../infographic_jobs.sqlite3',
+    '/uploads/generated_infographics/./../.retention.lock',
+])
+def test_paths_are_checked_after_normalizing(client, path):
+    assert client.get(path).status_code == 404
+
+
+def test_only_served_images_are_touched(client, touched):
+    assert client.get('/uploads/generated_infographics/missing.png').status_code == 404
+    assert client.get('/uploads/generated_infographics/missing.png?original=1').status_code == 404
+    assert touched == []
+    assert client.get('/uploads/generated_infographics/./infographic_english_abc.png').status_code == 200
+    assert client.get('/uploads/generated_infographics/infographic_english_abc.png?original=1').status_code == 200
+    assert touched == ['generated_infographics/infographic_english_abc.png'] * 2
@@ -0,0 +1,200 @@
+"""Unit tests for RAG request coalescing in ai_services (no server or API key needed)."""
+import asyncio
+import gc
+import threading
+import types
+
+import pytest
+
+import ai_services
+from ai_services import _SingleFlight
+
+
+class _Boom(RuntimeError):
+    pass
+
+
+def _followers(flight, key, fn, count, timeout=5):
+    """Start `count` threads calling flight.do(key, ...) and collect what each got."""
+    outcomes = []
+    lock = threading.Lock()
+
+    def _run():
+        try:
+            got = flight.do(key, fn, timeout)
+        except BaseException as e:  # noqa: BLE001 - the exception is the outcome
+            got = e
+        with lock:
+            outcomes.append(got)
+
+    threads = [threading.Thread(target=_run) for _ in range(count)]
+    for t in threads:
+        t.start()
+    return threads, outcomes
+
+
+def _wait_for_followers(flight, count):
+    tick = threading.Event()
+    for _ in range(500):
+        if flight.stats()['followers'] >= count:
+            return
+        tick.wait(0.01)
+    raise AssertionError('followers never joined the flight')
+
+
+# ---------------------------------------------------------------------------
+# Threaded path (_SingleFlight)
+# ---------------------------------------------------------------------------
+
+def test_followers_share_the_leaders_result():
+    flight, release, calls = _SingleFlight(), threading.Event(), []
+
+    def fn():
+        calls.append(1)
+        release.wait(5)
+        return 'answer'
+
+    threads, outcomes = _followers(flight, 'k', fn, 4)
+    _wait_for_followers(flight, 3)
+    release.set()
+    for t in threads:
+        t.join(5)
+    assert outcomes == ['answer'] * 4
+    assert len(calls) == 1
+    assert flight.stats() == {'leaders': 1, 'followers': 3, 'timeouts': 0, 'errors': 0, 'in_flight': 0}
+
+
+def test_followers_get_the_leaders_exception_and_key_is_cleared():
+    flight, release = _SingleFlight(), threading.Event()
+
+    def fn():
+        release.wait(5)
+        raise _Boom('upstream failed')
+
+    threads, outcomes = _followers(flight, 'k', fn, 3)
+    _wait_for_followers(flight, 2)
+    release.set()
+    for t in threads:
+        t.join(5)
+    assert len(outcomes) == 3 and all(isinstance(o, _Boom) for o in outcomes)
+    assert flight.stats()['errors'] == 1
+    assert flight.stats()['in_flight'] == 0
+    # The failure is not remembered: the next call runs the function again
+    assert flight.do('k', lambda: 'recovered', 5) == 'recovered'
+
+
+def test_follower_times_out_without_disturbing_the_leader():
+    flight, release = _SingleFlight(), threading.Event()
+    leader, leader_out = _followers(flight, 'k', lambda: release.wait(5) and 'answer', 1)
+    for _ in range(500):
+        if flight.stats()['in_flight']:
+            break
+        release.wait(0.01)
+    with pytest.raises(TimeoutError):
+        flight.do('k', lambda: 'not called', 0.05)
+    release.set()
+    leader[0].join(5)
+    assert leader_out == ['answer']
+    assert flight.stats()['timeouts'] == 1
+    assert flight.stats()['in_flight'] == 0
+
+
+# ---------------------------------------------------------------------------
+# Async path (agenerate_rag_answer)
+# ---------------------------------------------------------------------------
+
+@pytest.fixture
+def fake_client(monkeypatch):
+    """Stub the Gemini async client; tests set .release / .error and read .calls."""
+    state = types.SimpleNamespace(calls=0, release=None, error=None)
+
+    async def generate_content(model, contents, config):
+        state.calls += 1
+        await state.release.wait()
+        if state.error is not None:
+            raise state.error
+        return f'answer to {contents}'
+
+    client = types.SimpleNamespace(aio=types.SimpleNamespace(models=types.SimpleNamespace(
+        generate_content=generate_content)))
+    monkeypatch.setattr(ai_services, 'CLIENT', client)
+    monkeypatch.setattr(ai_services, '_resolve_rag_request',
+                        lambda question, contents, retrieval: (contents, 'store', None))
+    monkeypatch.setattr(ai_services, '_ASYNC_RAG_FLIGHTS', {})
+    return state
+
+
+def _ask(question='when to apply urea'):
+    return ai_services.agenerate_rag_answer(question, 'ctx')
+
+
+def test_async_waiters_share_one_call(fake_client):
+    async def scenario():
+        fake_client.release = asyncio.Event()
+        waiters = [asyncio.ensure_future(_ask()) for _ in range(4)]
+        while fake_client.calls == 0:
+            await asyncio.sleep(0)
+        fake_client.release.set()
+        return await asyncio.gather(*waiters)
+
+    assert asyncio.run(scenario()) == ['answer to ctx'] * 4
+    assert fake_client.calls == 1
+    assert ai_services._ASYNC_RAG_FLIGHTS == {}
+
+
+def test_async_waiters_get_the_exception_and_key_is_cleared(fake_client):
+    async def scenario():
+        fake_client.release = asyncio.Event()
+        fake_client.error = _Boom('upstream failed')
+        waiters = [asyncio.ensure_future(_ask()) for _ in range(3)]
+        while fake_client.calls == 0:
+            await asyncio.sleep(0)
+        fake_client.release.set()
+        outcomes = await asyncio.gather(*waiters, return_exceptions=True)
+        assert ai_services._ASYNC_RAG_FLIGHTS == {}
+        fake_client.error = None
+        return outcomes, await _ask()
+
+    outcomes, retry = asyncio.run(scenario())
+    assert all(isinstance(o, _Boom) for o in outcomes)
+    assert retry == 'answer to ctx'
+    assert fake_client.calls == 2
+
+
+def test_async_timeout_leaves_the_shared_call_running(fake_client, monkeypatch):
+    monkeypatch.setattr(ai_services, 'SINGLE_FLIGHT_TIMEOUT_SECONDS', 0.05)
+
+    async def scenario():
+        fake_client.release = asyncio.Event()
+        with pytest.raises(asyncio.TimeoutError):
+            await _ask()
+        (task,) = ai_services._ASYNC_RAG_FLIGHTS.values()
+        assert not task.done()
+        fake_client.release.set()
+        return await task
+
+    assert asyncio.run(scenario()) == 'answer to ctx'
+    assert fake_client.calls == 1
+
+
+def test_async_failure_after_all_waiters_timed_out_is_retrieved(fake_client, monkeypatch):
+    monkeypatch.setattr(ai_services, 'SINGLE_FLIGHT_TIMEOUT_SECONDS', 0.05)
+    unretrieved = []
+
+    async def scenario():
+        asyncio.get_running_loop().set_exception_handler(lambda loop, context: unretrieved.append(context))
+        fake_client.release = asyncio.Event()
+        fake_client.error = _Boom('upstream failed')
+        with pytest.raises(asyncio.TimeoutError):
+            await _ask()
+        (task,) = ai_services._ASYNC_RAG_FLIGHTS.values()
+        fake_client.release.set()
+        while not task.done():
+            await asyncio.sleep(0)
+        await asyncio.sleep(0)
+        assert ai_services._ASYNC_RAG_FLIGHTS == {}
+        del task
+        gc.collect()
+
+    asyncio.run(scenario())
+    assert unretrieved == []
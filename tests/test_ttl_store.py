@@ -0,0 +1,45 @@
+"""Unit tests for the process-shared TTL store behind infographic cooldowns."""
+import time
+
+import pytest
+
+import ttl_store
+from ttl_store import TTLStore
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / 'cooldown.sqlite3')
+
+
+def test_set_is_visible_locally_before_flush(db_path):
+    store = TTLStore(db_path, ttl_seconds=60)
+    store.set('user-1')
+    assert store.contains('user-1')
+    assert not store.contains('user-2')
+    assert store.stats()['pending_writes'] == 1
+
+
+def test_flushed_keys_reach_other_workers(db_path):
+    writer, reader = TTLStore(db_path, ttl_seconds=60), TTLStore(db_path, ttl_seconds=60)
+    assert not reader.contains('user-1')
+    writer.set('user-1')
+    writer.flush()
+    reader._last_refresh = 0.0  # next check refreshes as if REFRESH_SECONDS had passed
+    assert reader.contains('user-1')
+
+
+def test_expired_keys_are_gone_everywhere(db_path, monkeypatch):
+    monkeypatch.setattr(ttl_store, 'PURGE_SECONDS', 0.0)
+    store = TTLStore(db_path, ttl_seconds=60)
+    store.set('short', ttl_seconds=0.05)
+    store.set('long')
+    store.flush()
+    time.sleep(0.1)
+    assert not store.contains('short')
+    assert store.contains('long')
+    store.flush()  # purges expired rows
+    fresh = TTLStore(db_path, ttl_seconds=60)
+    assert not fresh.contains('short') and fresh.contains('long')
+    rows = fresh._conn().execute('SELECT key FROM entries').fetchall()
+    assert rows == [('long',)]
@@ -0,0 +1,50 @@
+"""Unit tests for upload_manifest.UploadManifest (no server or API key needed)."""
+import json
+import os
+
+from upload_manifest import UploadManifest
+
+
+def test_content_version_is_shared_across_instances(tmp_path):
+    db_path = str(tmp_path / 'manifest.sqlite3')
+    writer, reader = UploadManifest(db_path), UploadManifest(db_path)
+    before = reader.content_version('store')
+
+    assert writer.claim('h1', 'store', 'a.pdf', 10, 1)
+    writer.mark_uploaded('h1', 'store', 'a.pdf', 10, 1)
+    # Buffered records already count for the process that wrote them
+    assert writer.content_version('store') != before
+    writer.flush()
+
+    after = reader.content_version('store')
+    assert after != before
+    assert after == writer.content_version('store')
+    assert reader.content_version('other-store') == UploadManifest(db_path).content_version('other-store')
+
+
+def test_failed_uploads_do_not_change_content_version(tmp_path):
+    manifest = UploadManifest(str(tmp_path / 'manifest.sqlite3'))
+    before = manifest.content_version('store')
+    assert manifest.claim('h1', 'store', 'a.pdf', 10, 1)
+    manifest.mark_failed('h1', 'store', 'a.pdf', 10, 1, 'boom')
+    manifest.flush()
+    assert manifest.content_version('store') == before
+
+
+def test_legacy_entries_resolve_against_the_uploads_folder(tmp_path, monkeypatch):
+    uploads = tmp_path / 'uploads'
+    uploads.mkdir()
+    (uploads / 'guide.pdf').write_bytes(b'%PDF')
+    legacy = uploads / 'upload_cache.json'
+    legacy.write_text(json.dumps({
+        'h1': {'filename': 'guide.pdf', 'store_name': 'store', 'uploaded': True, 'timestamp': 1},
+        'h2': {'filename': 'gone.pdf', 'store_name': 'store', 'uploaded': True, 'timestamp': 1},
+    }))
+    monkeypatch.chdir(tmp_path)  # a basename must not resolve against the CWD
+    manifest = UploadManifest(str(tmp_path / 'data' / 'manifest.sqlite3'), legacy_cache_path=str(legacy))
+
+    assert manifest.is_uploaded('h1', 'store') and manifest.is_uploaded('h2', 'store')
+    assert manifest.lookup('h1', 'store')['path'] == str(uploads / 'guide.pdf')
+    assert manifest.lookup('h2', 'store')['path'] is None
+    assert manifest.referenced_paths() == {os.path.abspath(uploads / 'guide.pdf')}
+    assert not legacy.exists()
@@ -0,0 +1,93 @@
+"""Unit tests for the uploads disk-budget collector (no API key needed)."""
+import os
+
+import pytest
+
+import ai_services
+import uploads_retention
+from uploads_retention import GENERATED_DIR, UploadsRetention
+
+
+@pytest.fixture
+def folders(tmp_path, monkeypatch):
+    root, state = tmp_path / 'uploads', tmp_path / 'data'
+    (root / GENERATED_DIR).mkdir(parents=True)
+    monkeypatch.setattr(UploadsRetention, '_protected_paths', lambda self: set())
+    return root, state
+
+
+def _image(root, name, size, mtime):
+    path = root / GENERATED_DIR / name
+    path.write_bytes(b'x' * size)
+    os.utime(path, (mtime, mtime))
+    return path
+
+
+def test_state_stays_out_of_the_served_folder(folders):
+    root, state = folders
+    retention = UploadsRetention(str(root), str(state), budget_bytes=1 << 30, min_free_bytes=0)
+    retention.touch(f'{GENERATED_DIR}/a.png')
+    retention.run_once()
+    assert sorted(os.listdir(root)) == [GENERATED_DIR]
+    assert uploads_retention.DB_NAME in os.listdir(state)
+
+
+def test_evicts_least_recently_used_until_under_budget(folders):
+    root, state = folders
+    old = _image(root, 'old.png', 1000, 1_000)
+    served = _image(root, 'served.png', 1000, 2_000)
+    new = _image(root, 'new.png', 1000, 3_000)
+    retention = UploadsRetention(str(root), str(state), budget_bytes=2000, min_free_bytes=0)
+    retention.touch(f'{GENERATED_DIR}/served.png')
+    summary = retention.run_once()
+    assert summary['evicted_files'] == 1 and not summary['over_budget']
+    assert not old.exists() and served.exists() and new.exists()
+
+
+def test_protected_images_are_kept(folders, monkeypatch):
+    root, state = folders
+    kept = _image(root, 'kept.png', 1000, 1_000)
+    other = _image(root, 'other.png', 1000, 2_000)
+    monkeypatch.setattr(UploadsRetention, '_protected_paths', lambda self: {os.path.abspath(kept)})
+    summary = UploadsRetention(str(root), str(state), budget_bytes=0, min_free_bytes=0).run_once()
+    assert kept.exists() and not other.exists()
+    assert summary['over_budget'] and summary['protected_bytes'] == 1000
+
+
+def test_user_documents_do_not_count_against_the_budget(folders):
+    root, state = folders
+    (root / 'guide.pdf').write_bytes(b'x' * 5000)
+    image = _image(root, 'image.png', 1000, 1_000)
+    summary = UploadsRetention(str(root), str(state), budget_bytes=2000, min_free_bytes=0).run_once()
+    assert image.exists()
+    assert summary['evicted_files'] == 0 and not summary['over_budget']
+    assert summary['usage_bytes'] == 6000 and summary['generated_bytes'] == 1000
+
+
+def _free_space(monkeypatch, free):
+    usage = uploads_retention.shutil.disk_usage('.')
+    monkeypatch.setattr(uploads_retention.shutil, 'disk_usage', lambda path: usage._replace(free=free))
+
+
+def test_free_space_shortfall_images_cannot_cover_evicts_nothing(folders, monkeypatch):
+    root, state = folders
+    images = [_image(root, f'{i}.png', 1000, 1_000 + i) for i in range(3)]
+    _free_space(monkeypatch, 0)
+    summary = UploadsRetention(str(root), str(state), budget_bytes=1 << 30, min_free_bytes=10_000).run_once()
+    assert all(image.exists() for image in images)
+    assert summary['evicted_files'] == 0 and not summary['over_budget']
+
+
+def test_free_space_shortfall_images_can_cover_evicts_lru(folders, monkeypatch):
+    root, state = folders
+    old = _image(root, 'old.png', 1000, 1_000)
+    new = _image(root, 'new.png', 1000, 2_000)
+    _free_space(monkeypatch, 9_500)
+    summary = UploadsRetention(str(root), str(state), budget_bytes=1 << 30, min_free_bytes=10_000).run_once()
+    assert not old.exists() and new.exists()
+    assert summary['evicted_files'] == 1 and not summary['over_budget']
+
+
+def test_module_collector_uses_the_data_folder():
+    assert os.path.abspath(uploads_retention.RETENTION.root) == os.path.abspath(ai_services.UPLOAD_FOLDER)
+    assert os.path.abspath(uploads_retention.RETENTION.state_dir) == os.path.abspath(ai_services.DATA_FOLDER)
@@ -0,0 +1,188 @@
+"""
+TTL Store - Shared Expiring Keys with In-Process Read Cache
+===========================================================
+
+A small key -> expiry store shared by all gunicorn workers through SQLite
+(WAL mode), used for infographic cooldowns. It replaces a JSON map that was
+re-read and rewritten on every check, raced between workers and never
+dropped old entries.
+
+Design:
+    1. **Reads** are dictionary lookups in a per-process cache. The cache
+       pulls rows written by other workers incrementally (by write time) at
+       most every REFRESH_SECONDS, so cross-worker staleness is bounded and a
+       check costs microseconds
+    2. **Writes** update the cache immediately and are persisted in batches
+       (every BATCH_SIZE keys, or FLUSH_SECONDS after the first buffered
+       write, and at exit)
+    3. **Expiry**: expired keys are dropped from the cache on refresh and
+       deleted from SQLite at most every PURGE_SECONDS, so the database stays
+       bounded by the number of live keys
+
+Usage:
+    store = TTLStore(ai_services.state_path('infographic_cooldown.sqlite3'), ttl_seconds=86400)
+    if not store.contains(key):
+        store.set(key)
+"""
+# Standard library imports
+import atexit
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# ============================================================================
+# CONFIGURATION
+# ============================================================================
+
+REFRESH_SECONDS = 2.0
+FLUSH_SECONDS = 2.0
+BATCH_SIZE = 64
+PURGE_SECONDS = 60.0
+# Re-read a little behind the last seen write time so rows committed by
+# another worker while we refreshed are not skipped
+_SYNC_OVERLAP_SECONDS = 5.0
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key        TEXT PRIMARY KEY,
+    expires_at REAL NOT NULL,
+    written_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_by_expiry ON entries (expires_at);
+CREATE INDEX IF NOT EXISTS entries_by_write ON entries (written_at);
+"""
+
+_UPSERT = """
+INSERT INTO entries (key, expires_at, written_at) VALUES (?, ?, ?)
+ON CONFLICT (key) DO UPDATE SET expires_at = excluded.expires_at, written_at = excluded.written_at
+"""
+
+
+class TTLStore:
+    """Thread-safe, process-shared set of keys that expire after a TTL."""
+
+    def __init__(self, db_path: str, ttl_seconds: float):
+        self.db_path = db_path
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._cache: Dict[str, float] = {}
+        self._pending: Dict[str, float] = {}
+        self._last_refresh = 0.0
+        self._last_purge = 0.0
+        # Rows written at or after this time (wall clock) are pulled on refresh
+        self._synced_until = 0.0
+        self._stats = {'checks': 0, 'hits': 0, 'sets': 0, 'refreshes': 0, 'flushes': 0, 'purged': 0}
+
+        os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+        self._conn().executescript(_SCHEMA)
+        atexit.register(self.flush)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=10, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    # ------------------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------------------
+    def contains(self, key: str) -> bool:
+        """True if `key` was set (by any worker) and has not expired."""
+        now = time.time()
+        if time.monotonic() - self._last_refresh >= REFRESH_SECONDS:
+            self._refresh(now)
+        with self._lock:
+            self._stats['checks'] += 1
+            expires_at = self._cache.get(key)
+            if expires_at is None:
+                return False
+            if expires_at <= now:
+                del self._cache[key]
+                return False
+            self._stats['hits'] += 1
+            return True
+
+    def set(self, key: str, ttl_seconds: Optional[float] = None):
+        """Set `key` to expire after ttl_seconds (default: the store TTL)."""
+        expires_at = time.time() + (self.ttl_seconds if ttl_seconds is None else ttl_seconds)
+        with self._lock:
+            self._cache[key] = expires_at
+            first_pending = not self._pending
+            self._pending[key] = expires_at
+            self._stats['sets'] += 1
+            due = len(self._pending) >= BATCH_SIZE
+        if due:
+            self.flush()
+        elif first_pending:
+            # Bound how long a write stays invisible to other workers
+            timer = threading.Timer(FLUSH_SECONDS, self.flush)
+            timer.daemon = True
+            timer.start()
+
+    def flush(self):
+        """Persist buffered keys in one transaction and purge expired rows if due."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        now = time.time()
+        purge = time.monotonic() - self._last_purge >= PURGE_SECONDS
+        if not pending and not purge:
+            return
+        conn = self._conn()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            conn.executemany(_UPSERT, [(k, exp, now) for k, exp in pending.items()])
+            purged = conn.execute('DELETE FROM entries WHERE expires_at <= ?', (now,)).rowcount if purge else 0
+            conn.execute('COMMIT')
+        except Exception as e:
+            try:
+                conn.execute('ROLLBACK')
+            except sqlite3.Error:
+                pass
+            with self._lock:
+                self._pending = {**pending, **self._pending}
+            logger.warning(f'⚠️ Failed to persist TTL store {self.db_path}: {e}')
+            return
+        with self._lock:
+            self._stats['flushes'] += 1
+            if purge:
+                self._last_purge = time.monotonic()
+                self._stats['purged'] += purged
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats['cached_keys'] = len(self._cache)
+            stats['pending_writes'] = len(self._pending)
+        return stats
+
+    # ------------------------------------------------------------------
+    # Internals
+    # ------------------------------------------------------------------
+    def _refresh(self, now: float):
+        """Pull rows written by any worker since the last refresh; drop expired cache entries."""
+        self._last_refresh = time.monotonic()
+        try:
+            rows = self._conn().execute(
+                'SELECT key, expires_at, written_at FROM entries WHERE written_at >= ? AND expires_at > ?',
+                (self._synced_until - _SYNC_OVERLAP_SECONDS, now),
+            ).fetchall()
+        except sqlite3.Error as e:
+            logger.debug(f'TTL store refresh failed: {e}')
+            return
+        with self._lock:
+            for key, expires_at, written_at in rows:
+                if expires_at > self._cache.get(key, 0.0):
+                    self._cache[key] = expires_at
+                self._synced_until = max(self._synced_until, written_at)
+            for key in [k for k, exp in self._cache.items() if exp <= now]:
+                del self._cache[key]
+            self._stats['refreshes'] += 1
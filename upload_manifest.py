@@ -0,0 +1,344 @@
+"""
+Upload Manifest - Transactional Record of File Search Uploads
+=============================================================
+
+Replaces ``uploads/upload_cache.json``, which was rewritten whole by every
+upload thread and lost entries under concurrency, with an embedded SQLite
+database in WAL mode. Readers never block writers, and every gunicorn worker
+sees the same state.
+
+One row per (file hash, store name) holds:
+    path, size, mtime_ns, state ('uploading' | 'uploaded' | 'failed'),
+    remote document name, upload operation name, last error, owner pid and
+    update time.
+
+A second table maps each local path to its last seen stat signature
+(inode, size, mtime_ns) and content hash. ``match_signature()`` uses it to
+skip hashing files that have not changed since they were uploaded, so a
+boot-time sync costs O(changed files) rather than O(total bytes).
+
+Write paths:
+    1. **claim()** commits immediately inside ``BEGIN IMMEDIATE`` so two
+       workers cannot both start uploading the same file; a claim left behind
+       by a crashed worker expires after CLAIM_TTL_SECONDS
+    2. **mark_uploaded() / mark_failed() / record_signature()** are buffered and committed in
+       batches (every BATCH_SIZE records or FLUSH_INTERVAL_SECONDS, and on
+       ``flush()``), so a boot-time sync of many files costs a few commits
+
+A legacy ``upload_cache.json`` (by default next to the database) is imported
+once, so an existing deployment does not re-upload its knowledge base.
+
+Configuration (environment variables):
+    - UPLOAD_MANIFEST_BATCH_SIZE: records per batched commit (default 32)
+    - UPLOAD_MANIFEST_FLUSH_SECONDS: max age of buffered records (default 2)
+"""
+# Standard library imports
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+# ============================================================================
+# CONFIGURATION
+# ============================================================================
+
+MANIFEST_NAME = 'upload_manifest.sqlite3'
+LEGACY_CACHE_NAME = 'upload_cache.json'
+BATCH_SIZE = int(os.getenv('UPLOAD_MANIFEST_BATCH_SIZE', '32'))
+FLUSH_INTERVAL_SECONDS = float(os.getenv('UPLOAD_MANIFEST_FLUSH_SECONDS', '2'))
+# An 'uploading' claim older than this is considered abandoned
+CLAIM_TTL_SECONDS = 900
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS uploads (
+    file_hash      TEXT NOT NULL,
+    store_name     TEXT NOT NULL,
+    path           TEXT,
+    size           INTEGER,
+    mtime_ns       INTEGER,
+    state          TEXT NOT NULL,
+    document_name  TEXT,
+    operation_name TEXT,
+    error          TEXT,
+    owner_pid      INTEGER,
+    updated_at     REAL NOT NULL,
+    PRIMARY KEY (file_hash, store_name)
+);
+CREATE TABLE IF NOT EXISTS signatures (
+    path       TEXT PRIMARY KEY,
+    inode      INTEGER NOT NULL,
+    size       INTEGER NOT NULL,
+    mtime_ns   INTEGER NOT NULL,
+    file_hash  TEXT NOT NULL
+);
+"""
+
+_INSERT = """
+INSERT INTO uploads (file_hash, store_name, path, size, mtime_ns, state, document_name,
+                     operation_name, error, owner_pid, updated_at)
+VALUES (:file_hash, :store_name, :path, :size, :mtime_ns, :state, :document_name,
+        :operation_name, :error, :owner_pid, :updated_at)
+"""
+
+_UPSERT = _INSERT + """ON CONFLICT (file_hash, store_name) DO UPDATE SET
+    path = excluded.path, size = excluded.size, mtime_ns = excluded.mtime_ns,
+    state = excluded.state, document_name = excluded.document_name,
+    operation_name = excluded.operation_name, error = excluded.error,
+    owner_pid = excluded.owner_pid, updated_at = excluded.updated_at
+"""
+
+_UPSERT_SIGNATURE = """
+INSERT INTO signatures (path, inode, size, mtime_ns, file_hash)
+VALUES (:path, :inode, :size, :mtime_ns, :file_hash)
+ON CONFLICT (path) DO UPDATE SET
+    inode = excluded.inode, size = excluded.size, mtime_ns = excluded.mtime_ns, file_hash = excluded.file_hash
+"""
+
+
+class UploadManifest:
+    """
+    SQLite (WAL) manifest of uploads, safe across threads and processes.
+
+    Each thread gets its own connection; buffered completion records are
+    shared and flushed by whichever thread fills the batch.
+    """
+
+    def __init__(self, db_path: str, batch_size: int = BATCH_SIZE,
+                 flush_interval: float = FLUSH_INTERVAL_SECONDS, legacy_cache_path: Optional[str] = None):
+        self.db_path = db_path
+        self.legacy_cache_path = legacy_cache_path or os.path.join(os.path.dirname(db_path), LEGACY_CACHE_NAME)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._local = threading.local()
+        self._pending: List[Dict[str, Any]] = []
+        self._pending_signatures: Dict[str, Dict[str, Any]] = {}
+        self._pending_lock = threading.Lock()
+        self._oldest_pending = 0.0
+
+        os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+        conn = self._conn()
+        conn.executescript(_SCHEMA)
+        self._import_legacy_cache(conn)
+
+    # ------------------------------------------------------------------
+    # Connections
+    # ------------------------------------------------------------------
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            # Autocommit mode; transactions are opened explicitly
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def _import_legacy_cache(self, conn: sqlite3.Connection):
+        legacy_path = self.legacy_cache_path
+        try:
+            with open(legacy_path, 'r', encoding='utf-8') as fh:
+                cache = json.load(fh)
+        except FileNotFoundError:
+            return
+        except Exception as e:
+            logger.warning(f'⚠️ Could not import legacy upload cache: {e}')
+            return
+        rows = [{
+            'file_hash': file_hash, 'store_name': entry.get('store_name') or '',
+            'path': self._legacy_path(legacy_path, entry.get('filename')),
+            'size': None, 'mtime_ns': None, 'state': 'uploaded', 'document_name': None,
+            'operation_name': None, 'error': None, 'owner_pid': None,
+            'updated_at': float(entry.get('timestamp') or time.time()),
+        } for file_hash, entry in cache.items() if isinstance(entry, dict) and entry.get('uploaded')]
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.executemany(_INSERT + 'ON CONFLICT DO NOTHING', rows)
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        try:
+            os.replace(legacy_path, legacy_path + '.imported')
+        except FileNotFoundError:
+            pass  # another worker imported it concurrently
+        logger.info(f'📒 Imported {len(rows)} entries from legacy {LEGACY_CACHE_NAME}')
+
+    @staticmethod
+    def _legacy_path(legacy_cache_path: str, filename: Optional[str]) -> Optional[str]:
+        """
+        Local path of a legacy entry, whose 'filename' is only a basename.
+
+        Uploads were saved next to the legacy cache (the uploads folder); a name
+        not found there is stored as NULL rather than resolved against the CWD.
+        """
+        if not filename:
+            return None
+        path = os.path.join(os.path.dirname(legacy_cache_path), os.path.basename(filename))
+        return path if os.path.isfile(path) else None
+
+    # ------------------------------------------------------------------
+    # Reads
+    # ------------------------------------------------------------------
+    def lookup(self, file_hash: str, store_name: str) -> Optional[Dict[str, Any]]:
+        """Return the record for a file hash in a store (buffered writes included)."""
+        with self._pending_lock:
+            for record in reversed(self._pending):
+                if record['file_hash'] == file_hash and record['store_name'] == store_name:
+                    return dict(record)
+        row = self._conn().execute(
+            'SELECT * FROM uploads WHERE file_hash = ? AND store_name = ?', (file_hash, store_name)
+        ).fetchone()
+        return dict(row) if row else None
+
+    def match_signature(self, store_name: str, path: str, st: os.stat_result) -> Optional[str]:
+        """
+        Return the content hash of `path` if its stat signature is unchanged
+        and that content is uploaded to the store, else None.
+
+        A match means the file does not need to be hashed (or uploaded) again.
+        """
+        row = self._conn().execute(
+            'SELECT s.file_hash FROM signatures s JOIN uploads u ON u.file_hash = s.file_hash '
+            'WHERE s.path = ? AND s.inode = ? AND s.size = ? AND s.mtime_ns = ? '
+            'AND u.store_name = ? AND u.state = ?',
+            (path, st.st_ino, st.st_size, st.st_mtime_ns, store_name, 'uploaded'),
+        ).fetchone()
+        return row['file_hash'] if row else None
+
+    def is_uploaded(self, file_hash: str, store_name: str) -> bool:
+        record = self.lookup(file_hash, store_name)
+        return bool(record and record['state'] == 'uploaded')
+
+    def content_version(self, store_name: str) -> str:
+        """
+        Version of a store's uploaded contents, shared by every process.
+
+        Changes whenever a file finishes uploading (by any worker): it is the
+        count and latest update time of the store's 'uploaded' records,
+        including this process's buffered ones.
+        """
+        row = self._conn().execute(
+            'SELECT COUNT(*), MAX(updated_at) FROM uploads WHERE store_name = ? AND state = ?',
+            (store_name, 'uploaded'),
+        ).fetchone()
+        with self._pending_lock:
+            pending = [r['updated_at'] for r in self._pending
+                       if r['store_name'] == store_name and r['state'] == 'uploaded']
+        latest = max([row[1] or 0.0, *pending])
+        return f'{row[0] + len(pending)}:{latest:.6f}'
+
+    def referenced_paths(self) -> Set[str]:
+        """Absolute paths of every local file the manifest refers to (including buffered writes)."""
+        rows = self._conn().execute(
+            'SELECT path FROM uploads WHERE path IS NOT NULL UNION SELECT path FROM signatures').fetchall()
+        paths = {row[0] for row in rows}
+        with self._pending_lock:
+            paths.update(r['path'] for r in self._pending if r.get('path'))
+            paths.update(self._pending_signatures)
+        return {os.path.abspath(p) for p in paths}
+
+    def stats(self) -> Dict[str, Any]:
+        """Record counts per state plus the number of buffered writes."""
+        rows = self._conn().execute('SELECT state, COUNT(*) FROM uploads GROUP BY state').fetchall()
+        with self._pending_lock:
+            pending = len(self._pending) + len(self._pending_signatures)
+        return {'states': {state: count for state, count in rows}, 'pending_writes': pending}
+
+    # ------------------------------------------------------------------
+    # Writes
+    # ------------------------------------------------------------------
+    def claim(self, file_hash: str, store_name: str, path: str, size: int, mtime_ns: int) -> bool:
+        """
+        Atomically claim a file for upload.
+
+        Returns:
+            True if this process should upload it; False if it is already
+            uploaded or another live claim exists
+        """
+        if self.is_uploaded(file_hash, store_name):
+            return False
+        now = time.time()
+        conn = self._conn()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute(
+                'SELECT state, owner_pid, updated_at FROM uploads WHERE file_hash = ? AND store_name = ?',
+                (file_hash, store_name),
+            ).fetchone()
+            if row is not None and (row['state'] == 'uploaded' or (
+                    row['state'] == 'uploading' and row['owner_pid'] != os.getpid()
+                    and now - row['updated_at'] < CLAIM_TTL_SECONDS)):
+                conn.execute('COMMIT')
+                return False
+            conn.execute(_UPSERT, self._record(file_hash, store_name, path, size, mtime_ns, 'uploading', now=now))
+            conn.execute('COMMIT')
+            return True
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    def mark_uploaded(self, file_hash: str, store_name: str, path: str, size: int, mtime_ns: int,
+                      document_name: Optional[str] = None, operation_name: Optional[str] = None):
+        """Record a finished upload (buffered; see flush())."""
+        self._buffer(self._record(file_hash, store_name, path, size, mtime_ns, 'uploaded',
+                                  document_name=document_name, operation_name=operation_name))
+
+    def mark_failed(self, file_hash: str, store_name: str, path: str, size: int, mtime_ns: int, error: str):
+        """Record a failed upload so the claim is released (buffered; see flush())."""
+        self._buffer(self._record(file_hash, store_name, path, size, mtime_ns, 'failed', error=error[:500]))
+
+    def record_signature(self, path: str, st: os.stat_result, file_hash: str):
+        """Remember the stat signature and content hash of a local path (buffered; see flush())."""
+        signature = {'path': path, 'inode': st.st_ino, 'size': st.st_size,
+                     'mtime_ns': st.st_mtime_ns, 'file_hash': file_hash}
+        self._buffer(signature=signature)
+
+    def flush(self):
+        """Commit all buffered records in one transaction."""
+        with self._pending_lock:
+            batch, self._pending = self._pending, []
+            signatures, self._pending_signatures = self._pending_signatures, {}
+        if not batch and not signatures:
+            return
+        conn = self._conn()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.executemany(_UPSERT, batch)
+            conn.executemany(_UPSERT_SIGNATURE, list(signatures.values()))
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            with self._pending_lock:
+                self._pending[:0] = batch
+                self._pending_signatures = {**signatures, **self._pending_signatures}
+            raise
+
+    def _buffer(self, record: Optional[Dict[str, Any]] = None, signature: Optional[Dict[str, Any]] = None):
+        with self._pending_lock:
+            if not self._pending and not self._pending_signatures:
+                self._oldest_pending = time.monotonic()
+            if record is not None:
+                self._pending.append(record)
+            if signature is not None:
+                self._pending_signatures[signature['path']] = signature
+            due = (len(self._pending) + len(self._pending_signatures) >= self.batch_size
+                   or time.monotonic() - self._oldest_pending >= self.flush_interval)
+        if due:
+            self.flush()
+
+    @staticmethod
+    def _record(file_hash: str, store_name: str, path: str, size: int, mtime_ns: int, state: str,
+                document_name: Optional[str] = None, operation_name: Optional[str] = None,
+                error: Optional[str] = None, now: Optional[float] = None) -> Dict[str, Any]:
+        return {
+            'file_hash': file_hash, 'store_name': store_name, 'path': path, 'size': size,
+            'mtime_ns': mtime_ns, 'state': state, 'document_name': document_name,
+            'operation_name': operation_name, 'error': error, 'owner_pid': os.getpid(),
+            'updated_at': now or time.time(),
+        }
@@ -0,0 +1,303 @@
+"""
+Uploads Retention - Disk Budget for the uploads/ Folder
+=======================================================
+
+``uploads/`` collects user documents and a stream of generated infographics
+(plus their responsive variants) that nothing used to delete. This module
+keeps the folder inside a disk budget by evicting generated images least
+recently used first, in the background.
+
+Rules:
+    1. **Budget**: a pass starts evicting once the generated images
+       (originals plus variants) exceed UPLOADS_DISK_BUDGET_MB, or the
+       filesystem has less than UPLOADS_MIN_FREE_MB free, and stops as soon
+       as both are satisfied. User documents never count against the budget;
+       a free-space shortfall that the evictable images could not cover
+       (the disk is filled by something else) only logs a warning
+    2. **Candidates**: only generated infographics are evicted, each together
+       with its variants; user documents, databases and anything else stay
+    3. **Protected**: files referenced by the upload manifest or the
+       infographic cache index are never evicted
+    4. **LRU**: last access is recorded when /uploads serves a file
+       (``touch()``, persisted each pass); files never served count from their
+       modification time
+    5. **Incremental**: at most UPLOADS_GC_BATCH files go per pass; a pass
+       that leaves the folder over budget schedules the next one quickly
+    6. **One collector**: passes run under a non-blocking flock, so only one
+       gunicorn worker collects at a time
+
+Configuration (environment variables):
+    - UPLOADS_DISK_BUDGET_MB (default 1024)
+    - UPLOADS_MIN_FREE_MB (default 200)
+    - UPLOADS_GC_INTERVAL_SECONDS (default 300)
+    - UPLOADS_GC_BATCH (default 200)
+"""
+# Standard library imports
+import logging
+import os
+import shutil
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+
+# Local application imports
+import ai_services
+import image_variants
+
+logger = logging.getLogger(__name__)
+
+# ============================================================================
+# CONFIGURATION
+# ============================================================================
+
+BUDGET_BYTES = int(float(os.getenv('UPLOADS_DISK_BUDGET_MB', '1024')) * 1024 * 1024)
+MIN_FREE_BYTES = int(float(os.getenv('UPLOADS_MIN_FREE_MB', '200')) * 1024 * 1024)
+INTERVAL_SECONDS = float(os.getenv('UPLOADS_GC_INTERVAL_SECONDS', '300'))
+BATCH_SIZE = int(os.getenv('UPLOADS_GC_BATCH', '200'))
+# Delay before the next pass when one batch was not enough
+CATCH_UP_SECONDS = 5.0
+
+GENERATED_DIR = 'generated_infographics'
+DB_NAME = 'retention.sqlite3'
+LOCK_NAME = '.retention.lock'
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS access (
+    path        TEXT PRIMARY KEY,
+    last_access REAL NOT NULL
+);
+"""
+
+
+class UploadsRetention:
+    """Background LRU collector for generated images in the uploads folder."""
+
+    def __init__(self, root: str, state_dir: str, budget_bytes: int = BUDGET_BYTES,
+                 min_free_bytes: int = MIN_FREE_BYTES, batch_size: int = BATCH_SIZE):
+        self.root = root
+        # Access times and the collector lock live outside the served folder
+        self.state_dir = state_dir
+        self.budget_bytes = budget_bytes
+        self.min_free_bytes = min_free_bytes
+        self.batch_size = batch_size
+        self._lock = threading.Lock()
+        self._touched: Dict[str, float] = {}
+        self._thread: Optional[threading.Thread] = None
+        self._local = threading.local()
+        self._stats: Dict[str, Any] = {
+            'passes': 0, 'evicted_files': 0, 'evicted_bytes': 0, 'last_pass_at': None,
+            'last_pass_ms': None, 'usage_bytes': None, 'generated_bytes': None, 'free_bytes': None,
+            'protected_bytes': None,
+            'over_budget': False, 'collector': False,
+        }
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            os.makedirs(self.state_dir, exist_ok=True)
+            conn = sqlite3.connect(os.path.join(self.state_dir, DB_NAME), timeout=10, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.executescript(_SCHEMA)
+            self._local.conn = conn
+        return conn
+
+    # ------------------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------------------
+    def touch(self, relative_path: str):
+        """Record that a file under root was served (kept in memory until the next pass)."""
+        with self._lock:
+            self._touched[relative_path] = time.time()
+
+    def start(self) -> bool:
+        """Start the background collector once per process; returns False if already started."""
+        with self._lock:
+            if self._thread is not None:
+                return False
+            self._thread = threading.Thread(target=self._loop, name='uploads-retention', daemon=True)
+            self._thread.start()
+            return True
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats['pending_touches'] = len(self._touched)
+        stats['budget_bytes'] = self.budget_bytes
+        stats['min_free_bytes'] = self.min_free_bytes
+        return stats
+
+    def run_once(self) -> Dict[str, Any]:
+        """
+        Run one collection pass if no other process is collecting.
+
+        Returns:
+            Pass summary: total and generated-image usage, free space, evicted
+            files/bytes and whether the images are still over budget (empty if another process holds the lock)
+        """
+        os.makedirs(self.root, exist_ok=True)
+        os.makedirs(self.state_dir, exist_ok=True)
+        with open(os.path.join(self.state_dir, LOCK_NAME), 'a') as lock_fh:
+            if not self._try_lock(lock_fh):
+                self._flush_touches()
+                with self._lock:
+                    self._stats['collector'] = False
+                return {}
+            return self._collect()
+
+    # ------------------------------------------------------------------
+    # Internals
+    # ------------------------------------------------------------------
+    @staticmethod
+    def _try_lock(fh) -> bool:
+        if fcntl is None:
+            return True
+        try:
+            fcntl.flock(fh, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return True
+        except BlockingIOError:
+            return False
+
+    def _loop(self):
+        delay = 0.0
+        while True:
+            time.sleep(delay)
+            try:
+                summary = self.run_once()
+                delay = CATCH_UP_SECONDS if summary.get('over_budget') and summary.get('evicted_files') \
+                    else INTERVAL_SECONDS
+            except Exception as e:
+                logger.warning(f'⚠️ Uploads retention pass failed: {e}')
+                delay = INTERVAL_SECONDS
+
+    def _flush_touches(self):
+        with self._lock:
+            touched, self._touched = self._touched, {}
+        if not touched:
+            return
+        try:
+            self._conn().executemany(
+                'INSERT INTO access (path, last_access) VALUES (?, ?) '
+                'ON CONFLICT (path) DO UPDATE SET last_access = MAX(last_access, excluded.last_access)',
+                list(touched.items()),
+            )
+        except sqlite3.Error as e:
+            with self._lock:
+                for path, ts in touched.items():
+                    self._touched.setdefault(path, ts)
+            logger.debug(f'Retention access flush failed: {e}')
+
+    def _protected_paths(self) -> Set[str]:
+        protected = set(ai_services.get_upload_manifest().referenced_paths())
+        protected.update(ai_services._infographic_cache().referenced_paths())
+        return protected
+
+    def _scan(self) -> Tuple[int, List[Tuple[str, List[str], int, float]]]:
+        """Total bytes under root, and generated images as (original, [original + variants], bytes, mtime)."""
+        usage = 0
+        originals: Dict[str, os.stat_result] = {}
+        for dirpath, _, names in os.walk(self.root):
+            in_generated = os.path.relpath(dirpath, self.root).split(os.sep)[0] == GENERATED_DIR
+            for name in names:
+                path = os.path.join(dirpath, name)
+                try:
+                    st = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                usage += st.st_size
+                if in_generated and not image_variants.is_variant_file(name):
+                    originals[path] = st
+        units = []
+        for original, st in originals.items():
+            files, size = [original], st.st_size
+            for variant in image_variants.variant_paths(original):
+                try:
+                    size += os.stat(variant).st_size
+                    files.append(variant)
+                except FileNotFoundError:
+                    pass
+            units.append((original, files, size, st.st_mtime))
+        return usage, units
+
+    def _relative(self, path: str) -> str:
+        return os.path.relpath(path, self.root).replace(os.sep, '/')
+
+    def _collect(self) -> Dict[str, Any]:
+        started = time.perf_counter()
+        self._flush_touches()
+        usage, units = self._scan()
+        free = shutil.disk_usage(self.root).free
+        generated = sum(unit[2] for unit in units)
+        budget_need = max(generated - self.budget_bytes, 0)
+        free_need = max(self.min_free_bytes - free, 0)
+
+        # Forget access times of images that are gone (evicted elsewhere or deleted)
+        conn = self._conn()
+        last_access = dict(conn.execute('SELECT path, last_access FROM access').fetchall())
+        gone = set(last_access) - {self._relative(unit[0]) for unit in units}
+        if gone:
+            conn.executemany('DELETE FROM access WHERE path = ?', [(p,) for p in gone])
+
+        evicted_files, evicted_bytes, protected_bytes, need = 0, 0, 0, 0
+        if budget_need or free_need:
+            protected = self._protected_paths()
+            candidates = []
+            for unit in units:
+                if os.path.abspath(unit[0]) in protected:
+                    protected_bytes += unit[2]
+                else:
+                    candidates.append(unit)
+            evictable = generated - protected_bytes
+            if free_need > evictable:
+                # Deleting every image would not free enough; the disk is filled by something else
+                logger.warning(f'⚠️ Only {free // 1024} KB free on disk, but generated images could '
+                               f'free at most {evictable // 1024} KB; not evicting for free space')
+                free_need = 0
+            need = max(budget_need, free_need)
+            candidates.sort(key=lambda unit: max(last_access.get(self._relative(unit[0]), 0.0), unit[3]))
+
+            for original, files, size, _ in candidates:
+                if need <= 0 or evicted_files >= self.batch_size:
+                    break
+                for path in files:
+                    try:
+                        os.remove(path)
+                    except FileNotFoundError:
+                        pass
+                conn.execute('DELETE FROM access WHERE path = ?', (self._relative(original),))
+                evicted_files += 1
+                evicted_bytes += size
+                need -= size
+            if evicted_files:
+                logger.info(f'🧹 Uploads retention evicted {evicted_files} generated image(s), '
+                            f'{evicted_bytes // 1024} KB')
+            if need > 0 and evicted_files < self.batch_size:
+                logger.warning(f'⚠️ uploads/ still {need // 1024} KB over budget '
+                               f'({protected_bytes // 1024} KB of generated images are protected)')
+
+        summary = {
+            'usage_bytes': usage - evicted_bytes, 'generated_bytes': generated - evicted_bytes,
+            'free_bytes': free + evicted_bytes,
+            'evicted_files': evicted_files, 'evicted_bytes': evicted_bytes,
+            'protected_bytes': protected_bytes, 'over_budget': need > 0,
+        }
+        with self._lock:
+            self._stats['passes'] += 1
+            self._stats['evicted_files'] += evicted_files
+            self._stats['evicted_bytes'] += evicted_bytes
+            self._stats.update(
+                last_pass_at=time.time(), last_pass_ms=round((time.perf_counter() - started) * 1000, 1),
+                usage_bytes=summary['usage_bytes'], generated_bytes=summary['generated_bytes'],
+                free_bytes=summary['free_bytes'],
+                protected_bytes=protected_bytes, over_budget=summary['over_budget'], collector=True,
+            )
+        return summary
+
+
+RETENTION = UploadsRetention(ai_services.UPLOAD_FOLDER, os.path.dirname(ai_services.state_path(DB_NAME)))